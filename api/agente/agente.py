@@ -1,11 +1,21 @@
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
 
+from repositories.cache import repository_cache
 from schemas.agent import AnalyticsSummary, LeadAnalyzeRequest, LeadAnalyzeResponse
-from services.agent.history import resolve_history_key
-from services.agent.lead_agent import LeadAgentService
+from services.agent.cache import response_cache
+from services.agent.history import history_store, resolve_history_key
+from services.agent.rules import rule_stats
+from services.agent.semantic import semantic_matcher
+from services.agent.runtime import ClientDisconnected, cancel_on_disconnect
+from core.config import settings
+from services.agent.lead_agent import LeadAgentService, get_lead_batcher
 from services.analytics import AnalyticsService
+from services.lead_matches import lead_matches
+from services.reverse_match import outreach_queue
+from services.interaction_queue import interaction_writer
+from services.idempotency import IDEMPOTENCY_HEADER, REPLAYED_HEADER, idempotency_store, resolve_key
 
 router = APIRouter(prefix="/api", tags=["lead-agent", "analytics"])
 
@@ -15,25 +25,72 @@ def _history_key_from_request(lead: LeadAnalyzeRequest) -> Optional[str]:
     return resolve_history_key(lead.usuario_id, lead.contacto, lead.nombre)
 
 
-def _run_analysis(lead: LeadAnalyzeRequest) -> LeadAnalyzeResponse:
+async def _run_analysis(
+    lead: LeadAnalyzeRequest, request: Request, response: Response, idempotency_key: Optional[str]
+) -> LeadAnalyzeResponse:
     history_key = _history_key_from_request(lead)
     service = LeadAgentService()
-    result = service.analyze_and_persist(lead, history_key=history_key)
+    # reentregas del mismo webhook reutilizan la respuesta en vez de repetir LLM + persistencia
+    dedup_key = resolve_key(
+        "agent-analyze",
+        idempotency_key,
+        channel=lead.canal,
+        contact=lead.contacto or lead.usuario_id,
+        message=lead.mensaje,
+        tenant=lead.agency_id,
+    )
+    # si el cliente se desconecta se cancela la llamada al LLM y no se persiste nada
+    result, replayed = await cancel_on_disconnect(
+        idempotency_store.run(
+            dedup_key, lambda: service.analyze_and_persist_async(lead, history_key=history_key)
+        ),
+        request.is_disconnected,
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
     return LeadAnalyzeResponse(**result)
 
 
 @router.post("/agent/analyze", response_model=LeadAnalyzeResponse)
-async def analyze_lead(lead: LeadAnalyzeRequest) -> LeadAnalyzeResponse:
+async def analyze_lead(
+    lead: LeadAnalyzeRequest,
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+) -> LeadAnalyzeResponse:
     try:
-        return _run_analysis(lead)
+        return await _run_analysis(lead, request, response, idempotency_key)
+    except ClientDisconnected:
+        return Response(status_code=499)
     except Exception as exc:  # Defensive: unexpected runtime issues.
         raise HTTPException(status_code=500, detail="Error interno del agente") from exc
 
 
 @router.post("/lead/analyze", response_model=LeadAnalyzeResponse)
-async def analyze_lead_legacy(lead: LeadAnalyzeRequest) -> LeadAnalyzeResponse:
+async def analyze_lead_legacy(
+    lead: LeadAnalyzeRequest,
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+) -> LeadAnalyzeResponse:
     # Alias para compatibilidad con el path previo.
-    return await analyze_lead(lead)
+    return await analyze_lead(lead, request, response, idempotency_key)
+
+
+@router.get("/agent/metrics")
+async def agent_metrics() -> dict:
+    return {
+        "llm_cache": response_cache.stats(),
+        "rule_classifier": rule_stats.snapshot(),
+        "history": history_store.stats(),
+        "idempotency": idempotency_store.stats(),
+        "interaction_queue": interaction_writer.stats(),
+        "llm_batching": get_lead_batcher().stats() if settings.llm_batch_enabled else None,
+        "semantic_matcher": semantic_matcher.stats(),
+        "lead_matches": lead_matches.stats(),
+        "outreach": outreach_queue.stats(),
+        "repository_cache": repository_cache.stats(),
+    }
 
 
 @router.get("/analytics/leads/summary", response_model=AnalyticsSummary)
@@ -1,6 +1,10 @@
-from fastapi import APIRouter
+import asyncio
+
+from fastapi import APIRouter, Header, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from services.conversational_service import ConversationalAgentService
+from services.idempotency import IDEMPOTENCY_HEADER, REPLAYED_HEADER, idempotency_store, resolve_key
 
 router = APIRouter(prefix="/api/chatbot", tags=["chatbot"])
 
@@ -9,7 +13,30 @@ class ChatRequest(BaseModel):
     contact_key: str | None = None
 
 @router.post("/")
-def chat(req: ChatRequest):
+async def chat(
+    req: ChatRequest,
+    response: Response,
+    idempotency_key: str | None = Header(None, alias=IDEMPOTENCY_HEADER),
+):
     agent = ConversationalAgentService()
-    result = agent.get_reply(req.message, contact_key=req.contact_key)
+    dedup_key = resolve_key(
+        "chatbot", idempotency_key, channel="chatbot", contact=req.contact_key, message=req.message
+    )
+    result, replayed = await idempotency_store.run(
+        dedup_key, lambda: asyncio.to_thread(agent.get_reply, req.message, contact_key=req.contact_key)
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
     return result
+
+
+@router.post("/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Variante streaming (NDJSON): el primer token llega sin esperar la persistencia del lead.
+    """
+    agent = ConversationalAgentService()
+    return StreamingResponse(
+        agent.stream_reply(req.message, contact_key=req.contact_key),
+        media_type="application/x-ndjson",
+    )
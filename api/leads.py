@@ -1,10 +1,19 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, File, Form, Query, UploadFile, status
 
 from core.security import get_current_user
 from schemas.interaction import LeadInteractionCreate, LeadInteractionRead
-from schemas.lead import LeadCreate, LeadRead, LeadUpdate
+from schemas.lead import (
+    LeadCreate,
+    LeadImportReport,
+    LeadOutreachItem,
+    LeadOutreachUpdate,
+    LeadPropertyMatch,
+    LeadRead,
+    LeadUpdate,
+)
+from services.lead_import import LeadImportService
 from services.lead_service import LeadService
 
 router = APIRouter(prefix="/api/leads", tags=["leads"])
@@ -22,12 +31,51 @@ def create_lead(lead_in: LeadCreate, current_user=Depends(get_current_user)):
     return service.create_lead(lead_in, current_user)
 
 
+@router.post("/import", response_model=LeadImportReport)
+def import_leads(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    agency_id: Optional[int] = Form(None),
+    current_user=Depends(get_current_user),
+):
+    """
+    Importa leads desde CSV (con encabezado) o NDJSON; reporta errores por fila.
+    """
+    service = LeadImportService()
+    return service.import_leads(file, current_user, agency_id=agency_id, fmt=format)
+
+
+@router.get("/outreach", response_model=List[LeadOutreachItem])
+def list_outreach(limit: int = Query(50, ge=1, le=500), current_user=Depends(get_current_user)):
+    """
+    Leads a contactar por propiedades nuevas que coinciden con sus preferencias.
+    """
+    service = LeadService()
+    return service.list_outreach(current_user, limit)
+
+
+@router.patch("/outreach/{outreach_id}", status_code=status.HTTP_204_NO_CONTENT)
+def update_outreach(outreach_id: int, update: LeadOutreachUpdate, current_user=Depends(get_current_user)):
+    service = LeadService()
+    service.update_outreach(outreach_id, update.status, current_user)
+    return None
+
+
 @router.get("/{lead_id}", response_model=LeadRead)
 def get_lead(lead_id: int, current_user=Depends(get_current_user)):
     service = LeadService()
     return service.get_lead(lead_id, current_user)
 
 
+@router.get("/{lead_id}/matches", response_model=List[LeadPropertyMatch])
+def get_lead_matches(lead_id: int, limit: int = Query(10, ge=1, le=50), current_user=Depends(get_current_user)):
+    """
+    Mejores propiedades para el lead según la tabla de matches precalculada.
+    """
+    service = LeadService()
+    return service.get_lead_matches(lead_id, current_user, limit)
+
+
 @router.put("/{lead_id}", response_model=LeadRead)
 def update_lead(lead_id: int, lead_in: LeadUpdate, current_user=Depends(get_current_user)):
     service = LeadService()
@@ -1,10 +1,19 @@
-from typing import List
+from typing import List, Literal
 
-from fastapi import APIRouter, Depends, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File, Form
 
-from core.security import get_current_user
-from schemas.property import PropertyCreate, PropertyRead, PropertyUpdate
+from core.domain import UserRole
+from core.security import get_current_user, require_roles
+from schemas.property import (
+    PropertyCreate,
+    PropertyImportReport,
+    PropertyLeadMatch,
+    PropertyRead,
+    PropertySearchResponse,
+    PropertyUpdate,
+)
 from services.property_service import PropertyService
+from services.publish_outbox import publish_outbox, publish_worker
 
 router = APIRouter(prefix="/api/properties", tags=["properties"])
 
@@ -33,6 +42,45 @@ def list_properties(
     )
 
 
+@router.get("/search", response_model=PropertySearchResponse)
+def search_properties(
+    q: str = "",
+    property_type: str | None = None,
+    location: str | None = None,
+    status_filter: str | None = Query(None, alias="status"),
+    min_price: float | None = None,
+    max_price: float | None = None,
+    bedrooms: int | None = None,
+    bathrooms: int | None = None,
+    parking: bool | None = None,
+    sort: Literal["relevance", "price_asc", "price_desc", "newest"] = "relevance",
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    agency_id: int | None = None,
+    current_user=Depends(get_current_user),
+):
+    """
+    Búsqueda con ranking por texto (sin tildes, prefijo en el último término), filtros, facetas y paginación.
+    """
+    service = PropertyService()
+    return service.search_properties(
+        current_user,
+        query=q,
+        agency_id=agency_id,
+        property_type=property_type,
+        location=location,
+        status=status_filter,
+        min_price=min_price,
+        max_price=max_price,
+        bedrooms=bedrooms,
+        bathrooms=bathrooms,
+        parking=parking,
+        sort=sort,
+        offset=offset,
+        limit=limit,
+    )
+
+
 @router.post("", response_model=PropertyRead, status_code=status.HTTP_201_CREATED)
 def create_property(property_in: PropertyCreate, current_user=Depends(get_current_user)):
     service = PropertyService()
@@ -72,12 +120,53 @@ def create_property_with_media(
     )
 
 
+@router.post("/import", response_model=PropertyImportReport)
+def import_properties(
+    manifest: UploadFile = File(...),
+    media: UploadFile | None = File(None),
+    job_id: str | None = Form(None),
+    agency_id: int | None = Form(None),
+    current_user=Depends(get_current_user),
+):
+    """
+    Importa propiedades desde un manifiesto (CSV/NDJSON/JSON) y un zip de fotos.
+    Reenviar el mismo `job_id` reanuda desde el último lote confirmado.
+    """
+    service = PropertyService()
+    return service.import_properties(manifest, media, job_id=job_id, agency_id=agency_id, current_user=current_user)
+
+
+@router.get("/publish-queue")
+def publish_queue_status(limit: int = 50, current_user=Depends(require_roles(UserRole.superadmin))):
+    """
+    Estado del outbox de publicación social y últimos jobs en dead-letter.
+    """
+    return {"stats": publish_worker.stats(), "dead_letters": publish_outbox.dead_letters(limit)}
+
+
+@router.post("/publish-queue/{job_id}/retry", status_code=status.HTTP_202_ACCEPTED)
+def retry_publish_job(job_id: int, current_user=Depends(require_roles(UserRole.superadmin))):
+    if not publish_outbox.requeue(job_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job no encontrado en dead-letter")
+    publish_worker.notify()
+    return {"job_id": job_id, "status": "pending"}
+
+
 @router.get("/{property_id}", response_model=PropertyRead)
 def get_property(property_id: int, current_user=Depends(get_current_user)):
     service = PropertyService()
     return service.get_property(property_id, current_user)
 
 
+@router.get("/{property_id}/hot-leads", response_model=List[PropertyLeadMatch])
+def hot_leads(property_id: int, limit: int = Query(10, ge=1, le=50), current_user=Depends(get_current_user)):
+    """
+    Leads abiertos con mayor afinidad a la propiedad (tabla de matches precalculada).
+    """
+    service = PropertyService()
+    return service.get_hot_leads(property_id, current_user, limit)
+
+
 @router.put("/{property_id}", response_model=PropertyRead)
 def update_property(property_id: int, property_in: PropertyUpdate, current_user=Depends(get_current_user)):
     service = PropertyService()
@@ -15,6 +15,85 @@ class Settings(BaseSettings):
     llm_model: str = Field("gpt-4o-mini", env="LLM_MODEL")
     llm_temperature: float = Field(0.2, env="LLM_TEMPERATURE")
     n8n_webhook_url: str | None = Field(None, env="N8N_WEBHOOK_URL")
+    llm_cache_enabled: bool = Field(True, env="LLM_CACHE_ENABLED")
+    llm_cache_max_entries: int = Field(2048, env="LLM_CACHE_MAX_ENTRIES")
+    llm_cache_ttl_seconds: int = Field(60 * 60 * 6, env="LLM_CACHE_TTL_SECONDS")
+    llm_cache_path: str | None = Field(None, env="LLM_CACHE_PATH")
+    llm_timeout_seconds: float = Field(30.0, env="LLM_TIMEOUT_SECONDS")
+    llm_max_concurrency: int = Field(8, env="LLM_MAX_CONCURRENCY")
+    gemini_max_concurrency: int = Field(8, env="GEMINI_MAX_CONCURRENCY")
+    llm_batch_enabled: bool = Field(False, env="LLM_BATCH_ENABLED")
+    llm_batch_window_ms: int = Field(40, env="LLM_BATCH_WINDOW_MS")
+    llm_batch_max_items: int = Field(8, env="LLM_BATCH_MAX_ITEMS")
+    history_backend: str = Field("memory", env="HISTORY_BACKEND")
+    history_sqlite_path: str | None = Field(None, env="HISTORY_SQLITE_PATH")
+    history_ttl_seconds: int = Field(60 * 60 * 24, env="HISTORY_TTL_SECONDS")
+    history_max_keys: int = Field(10_000, env="HISTORY_MAX_KEYS")
+    history_lock_shards: int = Field(16, env="HISTORY_LOCK_SHARDS")
+    history_prompt_max_tokens: int = Field(600, env="HISTORY_PROMPT_MAX_TOKENS")
+    history_keep_last_turns: int = Field(4, env="HISTORY_KEEP_LAST_TURNS")
+    idempotency_ttl_seconds: int = Field(120, env="IDEMPOTENCY_TTL_SECONDS")
+    idempotency_max_entries: int = Field(10_000, env="IDEMPOTENCY_MAX_ENTRIES")
+    interaction_queue_enabled: bool = Field(True, env="INTERACTION_QUEUE_ENABLED")
+    interaction_batch_size: int = Field(50, env="INTERACTION_BATCH_SIZE")
+    interaction_flush_seconds: float = Field(1.0, env="INTERACTION_FLUSH_SECONDS")
+    interaction_max_pending: int = Field(10_000, env="INTERACTION_MAX_PENDING")
+    interaction_spill_path: str | None = Field(None, env="INTERACTION_SPILL_PATH")
+    notes_max_entries: int = Field(20, env="NOTES_MAX_ENTRIES")
+    notes_max_chars: int = Field(4000, env="NOTES_MAX_CHARS")
+    lead_import_batch_size: int = Field(500, env="LEAD_IMPORT_BATCH_SIZE")
+    lead_import_max_errors: int = Field(200, env="LEAD_IMPORT_MAX_ERRORS")
+    property_import_batch_size: int = Field(50, env="PROPERTY_IMPORT_BATCH_SIZE")
+    property_import_max_errors: int = Field(200, env="PROPERTY_IMPORT_MAX_ERRORS")
+    media_upload_workers: int = Field(4, env="MEDIA_UPLOAD_WORKERS")
+    media_resumable_threshold_bytes: int = Field(6 * 1024 * 1024, env="MEDIA_RESUMABLE_THRESHOLD_BYTES")
+    media_chunk_bytes: int = Field(6 * 1024 * 1024, env="MEDIA_CHUNK_BYTES")
+    media_upload_retries: int = Field(3, env="MEDIA_UPLOAD_RETRIES")
+    media_upload_timeout_seconds: float = Field(60.0, env="MEDIA_UPLOAD_TIMEOUT_SECONDS")
+    media_derivatives_enabled: bool = Field(True, env="MEDIA_DERIVATIVES_ENABLED")
+    media_derivative_workers: int = Field(2, env="MEDIA_DERIVATIVE_WORKERS")
+    media_derivative_timeout_seconds: float = Field(30.0, env="MEDIA_DERIVATIVE_TIMEOUT_SECONDS")
+    media_thumb_max_px: int = Field(320, env="MEDIA_THUMB_MAX_PX")
+    media_thumb_quality: int = Field(70, env="MEDIA_THUMB_QUALITY")
+    media_web_max_px: int = Field(1280, env="MEDIA_WEB_MAX_PX")
+    media_web_quality: int = Field(80, env="MEDIA_WEB_QUALITY")
+    media_index_path: str | None = Field(None, env="MEDIA_INDEX_PATH")
+    media_index_max_entries: int = Field(100_000, env="MEDIA_INDEX_MAX_ENTRIES")
+    publish_outbox_path: str | None = Field(None, env="PUBLISH_OUTBOX_PATH")
+    publish_batch_enabled: bool = Field(False, env="PUBLISH_BATCH_ENABLED")
+    publish_batch_size: int = Field(20, env="PUBLISH_BATCH_SIZE")
+    publish_max_attempts: int = Field(8, env="PUBLISH_MAX_ATTEMPTS")
+    publish_backoff_base_seconds: float = Field(5.0, env="PUBLISH_BACKOFF_BASE_SECONDS")
+    publish_backoff_max_seconds: float = Field(900.0, env="PUBLISH_BACKOFF_MAX_SECONDS")
+    publish_poll_seconds: float = Field(2.0, env="PUBLISH_POLL_SECONDS")
+    publish_timeout_seconds: float = Field(10.0, env="PUBLISH_TIMEOUT_SECONDS")
+    publish_lease_seconds: float = Field(60.0, env="PUBLISH_LEASE_SECONDS")
+    publish_retention_seconds: int = Field(7 * 24 * 60 * 60, env="PUBLISH_RETENTION_SECONDS")
+    search_index_ttl_seconds: int = Field(300, env="SEARCH_INDEX_TTL_SECONDS")
+    search_price_bands: list[float] = Field(
+        [100_000_000, 200_000_000, 350_000_000, 500_000_000, 800_000_000], env="SEARCH_PRICE_BANDS"
+    )
+    recommendation_ranker: str = Field("rules", env="RECOMMENDATION_RANKER")
+    semantic_dim: int = Field(512, env="SEMANTIC_DIM")
+    semantic_candidates: int = Field(50, env="SEMANTIC_CANDIDATES")
+    semantic_weight: float = Field(0.5, env="SEMANTIC_WEIGHT")
+    semantic_index_ttl_seconds: int = Field(600, env="SEMANTIC_INDEX_TTL_SECONDS")
+    semantic_lsh_bits: int = Field(0, env="SEMANTIC_LSH_BITS")
+    semantic_lsh_tables: int = Field(4, env="SEMANTIC_LSH_TABLES")
+    lead_matches_path: str | None = Field(None, env="LEAD_MATCHES_PATH")
+    lead_matches_k: int = Field(10, env="LEAD_MATCHES_K")
+    lead_matches_ttl_seconds: int = Field(900, env="LEAD_MATCHES_TTL_SECONDS")
+    outreach_queue_path: str | None = Field(None, env="OUTREACH_QUEUE_PATH")
+    outreach_min_score: float = Field(55.0, env="OUTREACH_MIN_SCORE")
+    outreach_max_per_property: int = Field(200, env="OUTREACH_MAX_PER_PROPERTY")
+    repo_cache_enabled: bool = Field(True, env="REPO_CACHE_ENABLED")
+    repo_cache_negative_ttl_seconds: float = Field(5, env="REPO_CACHE_NEGATIVE_TTL_SECONDS")
+    repo_cache_max_entries: int = Field(10_000, env="REPO_CACHE_MAX_ENTRIES")
+    agency_cache_ttl_seconds: float = Field(300, env="AGENCY_CACHE_TTL_SECONDS")
+    user_cache_ttl_seconds: float = Field(60, env="USER_CACHE_TTL_SECONDS")
+    import_checkpoint_dir: str | None = Field(None, env="IMPORT_CHECKPOINT_DIR")
+    rule_classifier_enabled: bool = Field(True, env="RULE_CLASSIFIER_ENABLED")
+    rule_classifier_min_confidence: float = Field(0.85, env="RULE_CLASSIFIER_MIN_CONFIDENCE")
 
     model_config = SettingsConfigDict(
         env_file=".env",
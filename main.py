@@ -6,6 +6,9 @@ from api.agente import agente as lead_agent
 
 from core.config import settings
 from core.middleware import TokenAuthMiddleware
+from services import media_derivatives
+from services.interaction_queue import interaction_writer
+from services.publish_outbox import publish_worker
 
 app = FastAPI(title=settings.project_name, debug=settings.debug)
 
@@ -28,6 +31,28 @@ app.include_router(conversacional.router)
 app.include_router(lead_agent.router)
 
 
+@app.on_event("startup")
+def start_background_writers():
+    if settings.interaction_queue_enabled:
+        interaction_writer.start()
+
+
+@app.on_event("startup")
+async def start_publish_worker():
+    publish_worker.start()
+
+
+@app.on_event("shutdown")
+async def stop_publish_worker():
+    await publish_worker.stop()
+
+
+@app.on_event("shutdown")
+def flush_background_writers():
+    interaction_writer.stop()
+    media_derivatives.shutdown()
+
+
 @app.get("/health")
 def healthcheck():
     return {"status": "ok"}
@@ -1,13 +1,17 @@
 from typing import Any, Dict, List, Optional
 
+from core.config import settings
 from repositories.base import BaseRepository
+from repositories.cache import cached_read, invalidates
 
 
 class AgencyRepository(BaseRepository):
+    @cached_read("agencies", ttl_seconds=settings.agency_cache_ttl_seconds)
     def get(self, agency_id: int) -> Optional[Dict[str, Any]]:
         resp = self.supabase.table("agencies").select("*").eq("id", agency_id).execute()
         return resp.data[0] if resp.data else None
 
+    @cached_read("agencies", ttl_seconds=settings.agency_cache_ttl_seconds)
     def get_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         resp = self.supabase.table("agencies").select("*").eq("name", name).execute()
         return resp.data[0] if resp.data else None
@@ -16,6 +20,7 @@ class AgencyRepository(BaseRepository):
         resp = self.supabase.table("agencies").select("*").execute()
         return resp.data or []
 
+    @invalidates("agencies")
     def create(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         resp = self.supabase.table("agencies").insert(payload).execute()
         return resp.data[0]
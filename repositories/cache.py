@@ -0,0 +1,189 @@
+"""
+In-process read-through cache for repository lookups on rarely-changing tables.
+`@cached_read("users", ttl_seconds=...)` guarda el resultado del método por
+(tabla, método, argumentos); los `None` también se guardan, con un TTL más corto
+(`REPO_CACHE_NEGATIVE_TTL_SECONDS`), para que un email inexistente no consulte
+Supabase en cada intento. `@invalidates("users")` vacía la tabla tras una
+escritura en este proceso; cambios hechos por otros procesos o por SQL directo se
+ven cuando vence el TTL. Cada lectura devuelve una copia: los llamadores mutan las
+filas (p. ej. `user["role"]`).
+"""
+
+from __future__ import annotations
+
+import functools
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from core.config import settings
+
+F = TypeVar("F", bound=Callable[..., Any])
+CacheEntry = Tuple[float, Any]
+
+_MISSING = object()
+
+
+def _copy(value: Any) -> Any:
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return [dict(item) if isinstance(item, dict) else item for item in value]
+    return value
+
+
+class TableCache:
+    """
+    TTL + LRU entries for one table, with separate counters for negative (None) results.
+    """
+
+    def __init__(self, table: str, *, ttl_seconds: float, negative_ttl_seconds: float, max_entries: int) -> None:
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._lock = Lock()
+        self._generation = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    if entry[1] is None:
+                        self.negative_hits += 1
+                    return _copy(entry[1])
+                del self._entries[key]
+            self.misses += 1
+            return _MISSING
+
+    def generation(self) -> int:
+        return self._generation
+
+    def set(self, key: Hashable, value: Any, generation: int) -> None:
+        ttl = self.negative_ttl_seconds if value is None else self.ttl_seconds
+        if ttl <= 0:
+            return
+        with self._lock:
+            # una escritura invalidó la tabla mientras se leía: el valor ya puede estar viejo
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, _copy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "negative_ttl_seconds": self.negative_ttl_seconds,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class RepositoryCache:
+    def __init__(self, *, enabled: bool = True, negative_ttl_seconds: float = 5, max_entries: int = 10_000) -> None:
+        self.enabled = enabled
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self._tables: Dict[str, TableCache] = {}
+        self._lock = Lock()
+
+    def table(self, name: str, ttl_seconds: Optional[float] = None) -> TableCache:
+        cache = self._tables.get(name)
+        if cache is None:
+            with self._lock:
+                cache = self._tables.get(name)
+                if cache is None:
+                    cache = TableCache(
+                        name,
+                        ttl_seconds=ttl_seconds if ttl_seconds is not None else 60,
+                        negative_ttl_seconds=self.negative_ttl_seconds,
+                        max_entries=self.max_entries,
+                    )
+                    self._tables[name] = cache
+        return cache
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        for table, cache in list(self._tables.items()):
+            if name is None or table == name:
+                cache.invalidate()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "tables": {name: cache.stats() for name, cache in self._tables.items()}}
+
+
+repository_cache = RepositoryCache(
+    enabled=settings.repo_cache_enabled,
+    negative_ttl_seconds=settings.repo_cache_negative_ttl_seconds,
+    max_entries=settings.repo_cache_max_entries,
+)
+
+
+def cached_read(table: str, *, ttl_seconds: float) -> Callable[[F], F]:
+    """
+    Read-through cache for a repository method whose result depends only on its arguments.
+    """
+    cache = repository_cache.table(table, ttl_seconds)
+
+    def decorator(method: F) -> F:
+        @functools.wraps(method)
+        def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+            if not repository_cache.enabled:
+                return method(self, *args, **kwargs)
+            key = (method.__name__, args, tuple(sorted(kwargs.items())))
+            value = cache.get(key)
+            if value is not _MISSING:
+                return value
+            generation = cache.generation()
+            value = method(self, *args, **kwargs)
+            cache.set(key, value, generation)
+            return value
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def invalidates(table: str) -> Callable[[F], F]:
+    """
+    Drop every cached read of `table` after the write succeeds (and also if it fails midway).
+    """
+
+    def decorator(method: F) -> F:
+        @functools.wraps(method)
+        def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                repository_cache.table(table).invalidate()
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
@@ -8,6 +8,12 @@ class LeadInteractionRepository(BaseRepository):
         resp = self.supabase.table("lead_interactions").insert(payload).execute()
         return resp.data[0]
 
+    def create_many(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        resp = self.supabase.table("lead_interactions").insert(rows).execute()
+        return resp.data or []
+
     def list_by_lead(self, lead_id: int) -> List[Dict[str, Any]]:
         resp = (
             self.supabase.table("lead_interactions")
@@ -23,6 +29,7 @@ class LeadInteractionRepository(BaseRepository):
         *,
         lead_ids: Optional[List[int]] = None,
         channel: Optional[str] = None,
+        exclude_channel: Optional[str] = None,
         from_date: Optional[str] = None,
         to_date: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
@@ -33,6 +40,9 @@ class LeadInteractionRepository(BaseRepository):
             query = query.in_("lead_id", lead_ids)
         if channel:
             query = query.eq("channel", channel)
+        if exclude_channel:
+            # neq solo no devuelve las filas con channel null
+            query = query.or_(f"channel.is.null,channel.neq.{exclude_channel}")
         if from_date:
             query = query.gte("created_at", from_date)
         if to_date:
@@ -1,6 +1,30 @@
-from typing import Any, Dict, List, Optional
+import re
+from typing import Any, Dict, List, Optional, Tuple
 
 from repositories.base import BaseRepository
+from repositories.records import LEAD_RECORD_COLUMNS, LeadRecord
+
+
+def normalize_contact(phone: Optional[str], email: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Canonical form used as upsert key: phone as digits (keeps a leading +), email lowercased.
+    """
+    norm_phone = None
+    if phone:
+        digits = re.sub(r"[^\d+]", "", phone.strip())
+        norm_phone = (digits[0] + digits[1:].replace("+", "")) if digits else None
+    norm_email = email.strip().lower() if email and email.strip() else None
+    return norm_phone, norm_email
+
+
+def is_unique_violation(exc: Exception) -> bool:
+    # postgrest.APIError expone el SQLSTATE en `code`
+    return getattr(exc, "code", None) == "23505" or "duplicate key" in str(exc).lower()
+
+
+def _quoted(value: Any) -> str:
+    # PostgREST: los valores con . , : ( ) dentro de or=() deben ir entre comillas
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
 
 
 class LeadRepository(BaseRepository):
@@ -22,6 +46,18 @@ class LeadRepository(BaseRepository):
         resp = query.execute()
         return resp.data or []
 
+    def list_records(self, agency_id: Optional[int], user_id: Optional[int] = None) -> List[LeadRecord]:
+        """
+        Leads as compact records with their matching criteria already decoded.
+        """
+        query = self.supabase.table("leads").select(LEAD_RECORD_COLUMNS).order("created_at", desc=True)
+        if agency_id is not None:
+            query = query.eq("agency_id", agency_id)
+        if user_id is not None:
+            query = query.eq("user_id", user_id)
+        resp = query.execute()
+        return [LeadRecord.from_row(row) for row in resp.data or []]
+
     def list_filtered(
         self,
         *,
@@ -47,6 +83,45 @@ class LeadRepository(BaseRepository):
         resp = query.execute()
         return resp.data or []
 
+    def list_legacy_preferences(
+        self, *, after_id: int = 0, limit: int = 500, agency_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Leads whose preferences still live as JSON inside notes, in id order (keyset pagination).
+        """
+        query = (
+            self.supabase.table("leads")
+            .select("id, notes")
+            .is_("preferences", "null")
+            .like("notes", "{%")
+            .gt("id", after_id)
+            .order("id")
+            .limit(limit)
+        )
+        if agency_id is not None:
+            query = query.eq("agency_id", agency_id)
+        resp = query.execute()
+        return resp.data or []
+
+    def list_agent_notes(
+        self, *, after_id: int = 0, limit: int = 500, agency_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Leads with agent-written entries in notes, in id order (keyset pagination).
+        """
+        query = (
+            self.supabase.table("leads")
+            .select("id, notes")
+            .like("notes", "%Agente -> %")
+            .gt("id", after_id)
+            .order("id")
+            .limit(limit)
+        )
+        if agency_id is not None:
+            query = query.eq("agency_id", agency_id)
+        resp = query.execute()
+        return resp.data or []
+
     def find_by_phone(self, phone: str, agency_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
         query = self.supabase.table("leads").select("*").eq("phone", phone)
         if agency_id is not None:
@@ -68,10 +143,126 @@ class LeadRepository(BaseRepository):
         resp = query.limit(1).execute()
         return resp.data[0] if resp.data else None
 
+    def list_contacts(
+        self, *, after_id: int = 0, limit: int = 500, agency_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Leads with a phone or email, in id order (keyset pagination).
+        """
+        query = (
+            self.supabase.table("leads")
+            .select("id, agency_id, phone, email, created_at")
+            .or_("phone.not.is.null,email.not.is.null")
+            .gt("id", after_id)
+            .order("id")
+            .limit(limit)
+        )
+        if agency_id is not None:
+            query = query.eq("agency_id", agency_id)
+        resp = query.execute()
+        return resp.data or []
+
+    def find_by_contact(
+        self,
+        *,
+        user_id: Optional[int] = None,
+        phone: Optional[str] = None,
+        email: Optional[str] = None,
+        agency_id: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        One round-trip lookup by user, phone or email (in that priority order).
+        """
+        phone, email = normalize_contact(phone, email)
+        conditions = []
+        if user_id:
+            conditions.append(f"user_id.eq.{int(user_id)}")
+        if phone:
+            conditions.append(f"phone.eq.{_quoted(phone)}")
+        if email:
+            conditions.append(f"email.eq.{_quoted(email)}")
+        if not conditions:
+            return None
+        query = self.supabase.table("leads").select("*").or_(",".join(conditions))
+        if agency_id is not None:
+            query = query.eq("agency_id", agency_id)
+        resp = query.limit(len(conditions)).execute()
+        rows = resp.data or []
+        for field, value in (("user_id", user_id), ("phone", phone), ("email", email)):
+            if not value:
+                continue
+            for row in rows:
+                if row.get(field) == value:
+                    return row
+        return rows[0] if rows else None
+
+    def upsert_by_contact(self, payload: Dict[str, Any], existing_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Atomic create-or-update in a single statement.
+        With a known id the row is updated by primary key; otherwise the conflict target is
+        (agency_id, phone) or (agency_id, email), so two concurrent messages from the same
+        contact converge on one lead. Requires the unique indexes documented in the README.
+        """
+        data = dict(payload)
+        phone, email = normalize_contact(data.get("phone"), data.get("email"))
+        if phone:
+            data["phone"] = phone
+        if email:
+            data["email"] = email
+
+        if existing_id is not None:
+            data["id"] = existing_id
+            conflict = "id"
+        elif data.get("agency_id") is None:
+            return self._create_unassigned(data, phone, email)
+        elif phone:
+            conflict = "agency_id,phone"
+        elif email:
+            conflict = "agency_id,email"
+        else:
+            return self.create(data)
+
+        resp = self.supabase.table("leads").upsert(data, on_conflict=conflict).execute()
+        return resp.data[0]
+
+    def _create_unassigned(
+        self, data: Dict[str, Any], phone: Optional[str], email: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Leads without agency: (agency_id, phone) never conflicts on NULL, so uniqueness comes from
+        the partial indexes documented in the README, which on_conflict cannot target.
+        Insert and, if another request won the race, update that row instead.
+        """
+        try:
+            return self.create(data)
+        except Exception as exc:
+            if not is_unique_violation(exc) or not (phone or email):
+                raise
+            conditions = [f"phone.eq.{_quoted(phone)}"] if phone else []
+            if email:
+                conditions.append(f"email.eq.{_quoted(email)}")
+            resp = (
+                self.supabase.table("leads")
+                .select("id")
+                .is_("agency_id", "null")
+                .or_(",".join(conditions))
+                .limit(1)
+                .execute()
+            )
+            if not resp.data:
+                raise
+            return self.update(resp.data[0]["id"], data)
+
     def create(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         resp = self.supabase.table("leads").insert(payload).execute()
         return resp.data[0]
 
+    def create_many(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        resp = self.supabase.table("leads").insert(rows).execute()
+        return resp.data or []
+
     def update(self, lead_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
         resp = self.supabase.table("leads").update(payload).eq("id", lead_id).execute()
         return resp.data[0]
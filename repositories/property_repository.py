@@ -1,6 +1,7 @@
 from typing import Any, Dict, List, Optional
 
 from repositories.base import BaseRepository
+from repositories.records import PROPERTY_RECORD_COLUMNS, PropertyRecord
 
 
 class PropertyRepository(BaseRepository):
@@ -14,6 +15,16 @@ class PropertyRepository(BaseRepository):
         resp = query.execute()
         return resp.data or []
 
+    def list_records(self, agency_id: Optional[int] = None) -> List[PropertyRecord]:
+        """
+        Catalog as compact records (only the columns used for scoring/matching).
+        """
+        query = self.supabase.table("properties").select(PROPERTY_RECORD_COLUMNS).order("created_at", desc=True)
+        if agency_id is not None:
+            query = query.eq("agency_id", agency_id)
+        resp = query.execute()
+        return [PropertyRecord.from_row(row) for row in resp.data or []]
+
     def get(self, property_id: int, agency_id: Optional[int]) -> Optional[Dict[str, Any]]:
         query = self.supabase.table("properties").select("*").eq("id", property_id)
         if agency_id is not None:
@@ -56,6 +67,24 @@ class PropertyRepository(BaseRepository):
         resp = self.supabase.table("properties").insert(payload).execute()
         return resp.data[0]
 
+    def create_many(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+        resp = self.supabase.table("properties").insert(rows).execute()
+        return resp.data or []
+
+    def find_by_titles(self, agency_id: int, titles: List[str]) -> List[Dict[str, Any]]:
+        if not titles:
+            return []
+        resp = (
+            self.supabase.table("properties")
+            .select("*")
+            .eq("agency_id", agency_id)
+            .in_("title", list(dict.fromkeys(titles)))
+            .execute()
+        )
+        return resp.data or []
+
     def update(self, property_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
         resp = self.supabase.table("properties").update(payload).eq("id", property_id).execute()
         return resp.data[0]
@@ -0,0 +1,141 @@
+"""
+Compact in-memory records for cached catalogs.
+Las filas de supabase-py son dicts con todas las columnas; en cachés de larga vida
+(lead_matches, cálculo de intención) se guardan como dataclasses con `__slots__`,
+decodificadas una sola vez en el repositorio (números ya convertidos, preferencias
+del lead ya resueltas). `get`/`[]` se mantienen para que `score_property` y
+`calculate_intent_score` acepten tanto filas como records.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Optional, Tuple
+
+from utils.scoring import lead_criteria
+
+Row = Dict[str, Any]
+
+
+def _float(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class _RowAccess:
+    __slots__ = ()
+    summary_fields: Tuple[str, ...] = ()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def to_dict(self) -> Row:
+        return {name: getattr(self, name) for name in self.summary_fields}
+
+
+@dataclass(slots=True)
+class PropertyRecord(_RowAccess):
+    id: Any
+    title: Optional[str] = None
+    price: Optional[float] = None
+    location: Optional[str] = None
+    area: Optional[str] = None
+    property_type: Optional[str] = None
+    bedrooms: Optional[int] = None
+    bathrooms: Optional[int] = None
+    parking: Optional[bool] = None
+    status: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: Row) -> "PropertyRecord":
+        parking = row.get("parking")
+        return cls(
+            id=row["id"],
+            title=row.get("title"),
+            price=_float(row.get("price")),
+            location=row.get("location"),
+            area=row.get("area"),
+            property_type=row.get("property_type"),
+            bedrooms=_int(row.get("bedrooms")),
+            bathrooms=_int(row.get("bathrooms")),
+            parking=bool(parking) if parking is not None else None,
+            status=row.get("status"),
+        )
+
+
+@dataclass(slots=True)
+class LeadRecord(_RowAccess):
+    """
+    Lead summary plus its matching criteria (budget/zone from columns, the rest from preferences).
+    """
+
+    id: Any
+    full_name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    preferred_area: Optional[str] = None
+    budget: Optional[float] = None
+    urgency: Optional[str] = None
+    category: Optional[str] = None
+    intent_score: Optional[float] = None
+    status: Optional[str] = None
+    wanted_type: Optional[str] = None
+    wanted_bedrooms: Optional[int] = None
+    wanted_bathrooms: Optional[int] = None
+    wanted_parking: Optional[bool] = None
+
+    @classmethod
+    def from_row(cls, row: Row) -> "LeadRecord":
+        criteria = lead_criteria(row)
+        return cls(
+            id=row["id"],
+            full_name=row.get("full_name"),
+            email=row.get("email"),
+            phone=row.get("phone"),
+            preferred_area=row.get("preferred_area"),
+            budget=criteria["budget"],
+            urgency=row.get("urgency"),
+            category=row.get("category"),
+            intent_score=_float(row.get("intent_score")),
+            status=row.get("status"),
+            wanted_type=criteria["tipo"],
+            wanted_bedrooms=criteria["bedrooms"],
+            wanted_bathrooms=criteria["bathrooms"],
+            wanted_parking=criteria["parking"],
+        )
+
+    def criteria(self) -> Dict[str, Any]:
+        """
+        score_property keyword arguments (same as utils.scoring.lead_criteria on the row).
+        """
+        return {
+            "budget": self.budget,
+            "zona": self.preferred_area,
+            "tipo": self.wanted_type,
+            "bedrooms": self.wanted_bedrooms,
+            "bathrooms": self.wanted_bathrooms,
+            "parking": self.wanted_parking,
+        }
+
+
+PropertyRecord.summary_fields = tuple(field.name for field in fields(PropertyRecord))
+LeadRecord.summary_fields = tuple(field.name for field in fields(LeadRecord) if not field.name.startswith("wanted_"))
+
+# columnas que hay que pedir a Supabase para decodificar cada record
+PROPERTY_RECORD_COLUMNS = ",".join(("agency_id", *PropertyRecord.summary_fields))
+LEAD_RECORD_COLUMNS = ",".join(("agency_id", *LeadRecord.summary_fields, "preferences", "notes", "updated_at"))
@@ -0,0 +1,103 @@
+"""
+Memory footprint of cached properties: raw rows vs summary dicts vs slotted records.
+Las filas se generan como JSON y se decodifican como lo haría supabase-py. Dicts
+resumen y records reutilizan las cadenas de esas filas, así que para ellos se mide
+el costo del contenedor (más los números convertidos):
+
+    python -m repositories.records_bench --records 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from repositories.records import PropertyRecord
+from utils.scoring import calculate_intent_score
+
+Row = Dict[str, Any]
+
+ZONES = ["Centro", "Norte", "Sur", "Chapinero", "El Poblado", "Laureles", "Cabecera", "Versalles"]
+TYPES = ["apartamento", "casa", "apartaestudio", "local", "finca", "oficina"]
+
+
+def build_rows(size: int, rng: random.Random) -> List[Row]:
+    rows = []
+    for pid in range(1, size + 1):
+        zone = rng.choice(ZONES)
+        kind = rng.choice(TYPES)
+        rows.append(
+            {
+                "id": pid,
+                "agency_id": rng.randint(1, 50),
+                "title": f"{kind.capitalize()} en {zone} #{pid}",
+                "description": f"{kind} remodelado en {zone}, cerca a transporte #{pid}",
+                "price": rng.randrange(80, 900) * 1_000_000,
+                "area": zone,
+                "location": f"{zone}, Ciudad",
+                "property_type": kind,
+                "bedrooms": rng.randint(1, 5),
+                "bathrooms": rng.randint(1, 3),
+                "parking": rng.random() < 0.5,
+                "status": "available",
+                "photos": [f"https://cdn.example.com/{pid}/1.jpg"],
+                "photo_variants": None,
+                "created_at": "2024-05-01T12:00:00+00:00",
+            }
+        )
+    # mismo camino que la respuesta de PostgREST
+    return json.loads(json.dumps(rows))
+
+
+def measure(build: Callable[[], Any]) -> Dict[str, Any]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    value = build()
+    elapsed = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"value": value, "bytes": size, "seconds": elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    payload = json.dumps(build_rows(args.records, rng))
+    summary_fields = PropertyRecord.summary_fields
+
+    rows = measure(lambda: json.loads(payload))
+    source = rows["value"]
+    results = {
+        "rows": rows,
+        "summary_dicts": measure(lambda: [{field: row.get(field) for field in summary_fields} for row in source]),
+        "records": measure(lambda: [PropertyRecord.from_row(row) for row in source]),
+    }
+    for name, result in results.items():
+        print(
+            name,
+            {
+                "records": args.records,
+                "mb": round(result["bytes"] / 1e6, 2),
+                "bytes_per_record": round(result["bytes"] / args.records, 1),
+                "build_seconds": round(result["seconds"], 3),
+            },
+        )
+
+    # lectura en el loop caliente: calculate_intent_score sobre todo el catálogo
+    for name in ("summary_dicts", "records"):
+        catalog = results[name]["value"]
+        started = time.perf_counter()
+        calculate_intent_score("Chapinero", 350_000_000, "alta", catalog)
+        print("intent_score", {"catalog": name, "seconds": round(time.perf_counter() - started, 3)})
+
+
+if __name__ == "__main__":
+    main()
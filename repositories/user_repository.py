@@ -1,17 +1,22 @@
 from typing import Any, Dict, List, Optional
 
+from core.config import settings
 from repositories.base import BaseRepository
+from repositories.cache import cached_read, invalidates
 
 
 class UserRepository(BaseRepository):
+    @invalidates("users")
     def create(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         resp = self.supabase.table("users").insert(payload).execute()
         return resp.data[0]
 
+    @cached_read("users", ttl_seconds=settings.user_cache_ttl_seconds)
     def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         resp = self.supabase.table("users").select("*").eq("email", email).execute()
         return resp.data[0] if resp.data else None
 
+    @cached_read("users", ttl_seconds=settings.user_cache_ttl_seconds)
     def get(self, user_id: int) -> Optional[Dict[str, Any]]:
         resp = self.supabase.table("users").select("*").eq("id", user_id).execute()
         return resp.data[0] if resp.data else None
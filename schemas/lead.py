@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
@@ -7,6 +7,15 @@ from core.domain import LeadCategory, LeadUrgency
 from schemas.interaction import LeadInteractionRead
 
 
+class LeadPreferences(BaseModel):
+    tipo_propiedad: Optional[str] = None
+    habitaciones: Optional[int] = None
+    banos: Optional[int] = None
+    garaje: Optional[bool] = None
+    property_id: Optional[int] = None
+    property_title: Optional[str] = None
+
+
 class LeadBase(BaseModel):
     full_name: str
     email: Optional[EmailStr] = None
@@ -17,6 +26,7 @@ class LeadBase(BaseModel):
     notes: Optional[str] = None
     post_id: Optional[str] = None
     agency_id: Optional[int] = None
+    preferences: Optional[LeadPreferences] = None
 
 
 class LeadCreate(LeadBase):
@@ -34,6 +44,7 @@ class LeadUpdate(BaseModel):
     status: Optional[str] = None
     category: Optional[LeadCategory] = None
     post_id: Optional[str] = None
+    preferences: Optional[LeadPreferences] = None
 
 
 class LeadRead(LeadBase):
@@ -43,9 +54,49 @@ class LeadRead(LeadBase):
     intent_score: float
     category: LeadCategory
     status: str
-    preferences: Optional[dict] = None
     created_at: datetime
     updated_at: datetime
     interactions: List[LeadInteractionRead] = Field(default_factory=list)
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class LeadPropertyMatch(BaseModel):
+    id: int
+    score: float
+    title: Optional[str] = None
+    price: Optional[float] = None
+    location: Optional[str] = None
+    area: Optional[str] = None
+    property_type: Optional[str] = None
+    bedrooms: Optional[int] = None
+    bathrooms: Optional[int] = None
+    parking: Optional[bool] = None
+    status: Optional[str] = None
+
+
+class LeadOutreachItem(BaseModel):
+    id: int
+    agency_id: int
+    lead_id: int
+    property_id: int
+    score: float
+    status: str
+    created_at: float
+
+
+class LeadOutreachUpdate(BaseModel):
+    status: Literal["contacted", "dismissed"]
+
+
+class LeadImportError(BaseModel):
+    row: int
+    error: str
+
+
+class LeadImportReport(BaseModel):
+    processed: int
+    imported: int
+    failed: int
+    errors: List[LeadImportError] = Field(default_factory=list)
+    errors_truncated: bool = False
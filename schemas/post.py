@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 
 from pydantic import BaseModel, ConfigDict, Field
@@ -18,6 +18,7 @@ class PostUpdateMetadata(BaseModel):
 class PostRead(PostBase):
     id: UUID
     photos: List[str] = Field(default_factory=list)
+    photo_variants: Optional[List[Optional[Dict[str, str]]]] = None
     videos: List[str] = Field(default_factory=list)
     company_id: int
     created_at: datetime
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 from pydantic import BaseModel, ConfigDict
 
@@ -17,6 +17,8 @@ class PropertyBase(BaseModel):
     status: str = "available"
     agency_id: Optional[int] = None
     photos: Optional[List[str]] = None
+    # alineado con `photos`: {"thumb": url, "web": url} o None si no hay variantes
+    photo_variants: Optional[List[Optional[Dict[str, str]]]] = None
 
 
 class PropertyCreate(PropertyBase):
@@ -35,6 +37,7 @@ class PropertyUpdate(BaseModel):
     parking: Optional[bool] = None
     status: Optional[str] = None
     photos: Optional[List[str]] = None
+    photo_variants: Optional[List[Optional[Dict[str, str]]]] = None
 
 
 class PropertyRead(PropertyBase):
@@ -42,3 +45,40 @@ class PropertyRead(PropertyBase):
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class PropertyImportError(BaseModel):
+    row: int
+    error: str
+
+
+class PropertyImportReport(BaseModel):
+    job_id: str
+    resumed_from_row: int = 0
+    imported: int
+    failed: int
+    errors: List[PropertyImportError] = []
+    completed: bool
+
+
+class PropertyLeadMatch(BaseModel):
+    id: int
+    score: float
+    full_name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    preferred_area: Optional[str] = None
+    budget: Optional[float] = None
+    urgency: Optional[str] = None
+    category: Optional[str] = None
+    intent_score: Optional[float] = None
+    status: Optional[str] = None
+
+
+class PropertySearchResponse(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    items: List[PropertyRead]
+    facets: Dict[str, Dict[str, int]]
+    took_ms: float
@@ -0,0 +1,141 @@
+"""
+Opt-in micro-batcher for lead classification.
+Mensajes que llegan dentro de una ventana corta se envían al LLM en un solo
+prompt que devuelve un arreglo JSON; cada resultado vuelve a su request.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Protocol, Tuple
+
+from services.agent.prompts import BATCH_ITEM_TEMPLATE, BATCH_PROMPT
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending(Protocol):
+    prompt: str
+    history_text: str
+
+
+_Waiter = Tuple[str, _Pending, "asyncio.Future[Optional[Dict[str, Any]]]"]
+
+
+def _parse_json_array(content: str) -> Optional[List[Any]]:
+    cleaned = content.strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned.strip("`")
+    start = cleaned.find("[")
+    end = cleaned.rfind("]")
+    if start == -1 or end <= start:
+        return None
+    try:
+        parsed = json.loads(cleaned[start : end + 1])
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, list) else None
+
+
+def _build_batch_prompt(items: List[_Waiter]) -> str:
+    rendered = "".join(
+        BATCH_ITEM_TEMPLATE.replace("{index}", str(index))
+        .replace("{historial}", pending.history_text)
+        .replace("{mensaje}", message)
+        for index, (message, pending, _) in enumerate(items, start=1)
+    )
+    return BATCH_PROMPT.replace("{items}", rendered)
+
+
+def _split_results(parsed: Optional[List[Any]], size: int) -> List[Optional[Dict[str, Any]]]:
+    """
+    Map the array back to request order, using "item" when present and position otherwise.
+    Anything missing or malformed becomes None (the caller falls back to DEFAULT_RESPONSE).
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * size
+    if not parsed:
+        return results
+    for position, entry in enumerate(parsed):
+        if not isinstance(entry, dict):
+            continue
+        index = entry.get("item")
+        slot = int(index) - 1 if isinstance(index, (int, float)) or str(index).isdigit() else position
+        if 0 <= slot < size and results[slot] is None:
+            results[slot] = entry
+    return results
+
+
+class LeadBatcher:
+    """
+    Collects up to `max_items` messages or waits `window_ms`, whichever comes first.
+    Must be used from a single event loop (one instance per worker).
+    """
+
+    def __init__(
+        self,
+        *,
+        invoke: Callable[[str], Awaitable[str]],
+        parse_single: Callable[[str], Dict[str, Any]],
+        window_ms: int = 40,
+        max_items: int = 8,
+    ) -> None:
+        self._invoke = invoke
+        self._parse_single = parse_single
+        self.window = max(window_ms, 0) / 1000
+        self.max_items = max(1, max_items)
+        self._queue: List[_Waiter] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, message: str, pending: _Pending) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[Optional[Dict[str, Any]]]" = loop.create_future()
+        self._queue.append((message, pending, future))
+        if len(self._queue) >= self.max_items:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush_now)
+        return await future
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "queued": len(self._queue),
+        }
+
+    def _flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queue = self._queue, []
+        # los requests cancelados ya no esperan respuesta
+        batch = [item for item in batch if not item[2].done()]
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[_Waiter]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            if len(batch) == 1:
+                _, pending, _ = batch[0]
+                results: List[Optional[Dict[str, Any]]] = [self._parse_single(await self._invoke(pending.prompt))]
+            else:
+                content = await self._invoke(_build_batch_prompt(batch))
+                results = _split_results(_parse_json_array(content), len(batch))
+        except Exception as exc:
+            logger.warning("LLM batch of %s items failed: %s", len(batch), exc)
+            results = [None] * len(batch)
+
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
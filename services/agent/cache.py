@@ -0,0 +1,207 @@
+"""
+Content-addressed cache for normalized lead agent results.
+Repeated messages (reintentos de WhatsApp, webhooks duplicados, textos de campañas)
+reuse the previous LLM answer instead of paying another round-trip.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CacheEntry = Tuple[float, Dict[str, Any]]
+
+
+def normalize_message(message: str) -> str:
+    """
+    Collapse case and whitespace so trivial variations share the same key.
+    """
+    return " ".join((message or "").lower().split())
+
+
+def prompt_fingerprint(prompt_template: str) -> str:
+    return hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()[:16]
+
+
+def make_cache_key(
+    *,
+    model: str,
+    temperature: float,
+    prompt_hash: str,
+    history_text: str,
+    message: str,
+) -> str:
+    raw = json.dumps(
+        [model, round(float(temperature), 4), prompt_hash, history_text, normalize_message(message)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _SQLiteTier:
+    """
+    Optional on-disk tier shared by every worker that points to the same file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, expires_at REAL, payload TEXT)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, payload FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        return float(row[0]), json.loads(row[1])
+
+    def set(self, key: str, expires_at: float, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, expires_at, payload) VALUES (?, ?, ?)",
+                (key, expires_at, json.dumps(value, ensure_ascii=False)),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache: in-memory LRU in front of an optional SQLite file.
+    Values are the normalized agent payloads, never the raw LLM text.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = 2048,
+        ttl_seconds: int = 6 * 60 * 60,
+        path: Optional[str] = None,
+        enabled: bool = True,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = Lock()
+        self._disk: Optional[_SQLiteTier] = None
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        if enabled and path:
+            try:
+                self._disk = _SQLiteTier(path)
+            except sqlite3.Error as exc:
+                logger.warning("LLM cache disk tier disabled (%s): %s", path, exc)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._hits += 1
+                    return dict(entry[1])
+                self._memory.pop(key, None)
+
+        if self._disk is not None:
+            try:
+                stored = self._disk.get(key)
+            except sqlite3.Error as exc:
+                logger.warning("LLM cache disk read failed: %s", exc)
+                stored = None
+            if stored is not None:
+                if stored[0] > now:
+                    with self._lock:
+                        self._store_memory(key, stored)
+                        self._hits += 1
+                        self._disk_hits += 1
+                    return dict(stored[1])
+                self._safe_disk_delete(key)
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        entry = (time.time() + self.ttl_seconds, dict(value))
+        with self._lock:
+            self._store_memory(key, entry)
+        if self._disk is not None:
+            try:
+                self._disk.set(key, entry[0], entry[1])
+            except sqlite3.Error as exc:
+                logger.warning("LLM cache disk write failed: %s", exc)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._hits = self._disk_hits = self._misses = 0
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_tier": self._disk.path if self._disk else None,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _store_memory(self, key: str, entry: CacheEntry) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _safe_disk_delete(self, key: str) -> None:
+        try:
+            self._disk.delete(key)  # type: ignore[union-attr]
+        except sqlite3.Error:
+            pass
+
+
+response_cache = LLMResponseCache(
+    max_entries=settings.llm_cache_max_entries,
+    ttl_seconds=settings.llm_cache_ttl_seconds,
+    path=settings.llm_cache_path,
+    enabled=settings.llm_cache_enabled,
+)
@@ -1,15 +1,32 @@
 """
-In-memory conversation history for the lead agent.
+Conversation history for the lead agent.
 Helps keep per-user context so the LLM does not re-ask for data.
+El almacenamiento es intercambiable (memoria o SQLite compartido entre workers).
 """
 
 from __future__ import annotations
 
-from collections import defaultdict, deque
-from threading import Lock
-from typing import Deque, Dict, List, Optional, Tuple
+import logging
+from typing import Any, Dict, List, Optional, Tuple
 
-ChatTurn = Tuple[str, str]
+from core.config import settings
+from services.agent.history_backends import (
+    Facts,
+    HistoryBackend,
+    InMemoryHistoryBackend,
+    SQLiteHistoryBackend,
+    Turns,
+)
+
+logger = logging.getLogger(__name__)
+
+FACT_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ("presupuesto", "presupuesto"),
+    ("zona", "zona"),
+    ("tipo_propiedad", "tipo"),
+    ("urgencia", "urgencia"),
+    ("intencion_real", "intencion"),
+)
 
 
 def _clean_key(key: Optional[str]) -> Optional[str]:
@@ -20,10 +37,9 @@ def _clean_key(key: Optional[str]) -> Optional[str]:
 
 
 class ConversationHistory:
-    def __init__(self, max_messages: int = 20) -> None:
+    def __init__(self, max_messages: int = 20, backend: Optional[HistoryBackend] = None) -> None:
         self.max_messages = max_messages
-        self._store: Dict[str, Deque[ChatTurn]] = defaultdict(deque)
-        self._lock = Lock()
+        self.backend = backend or InMemoryHistoryBackend()
 
     def append(self, key: Optional[str], role: str, message: str) -> None:
         """
@@ -39,28 +55,72 @@ class ConversationHistory:
         if not content:
             return
 
-        with self._lock:
-            turns = self._store[cleaned_key]
-            turns.append((normalized_role, content))
-            while len(turns) > self.max_messages:
-                turns.popleft()
+        self.backend.append(cleaned_key, (normalized_role, content), self.max_messages)
 
-    def get(self, key: Optional[str]) -> List[ChatTurn]:
+    def get(self, key: Optional[str]) -> Turns:
+        """
+        Return an immutable snapshot of the turns; callers must not mutate it.
+        """
         cleaned_key = _clean_key(key)
         if not cleaned_key:
-            return []
-        with self._lock:
-            return list(self._store.get(cleaned_key, ()))
+            return ()
+        return self.backend.get(cleaned_key)
 
     def clear(self, key: Optional[str]) -> None:
         cleaned_key = _clean_key(key)
         if not cleaned_key:
             return
-        with self._lock:
-            self._store.pop(cleaned_key, None)
+        self.backend.clear(cleaned_key)
+
+    def get_facts(self, key: Optional[str]) -> Facts:
+        cleaned_key = _clean_key(key)
+        if not cleaned_key:
+            return {}
+        return self.backend.get_facts(cleaned_key)
+
+    def update_facts(self, key: Optional[str], result: Dict[str, Any]) -> None:
+        """
+        Carry forward the known facts: new non-null values replace the previous ones.
+        """
+        cleaned_key = _clean_key(key)
+        if not cleaned_key:
+            return
+        self.backend.update_facts(cleaned_key, lambda previous: merge_facts(previous, result))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"max_messages": self.max_messages, **self.backend.stats()}
+
+
+def merge_facts(previous: Optional[Facts], result: Dict[str, Any]) -> Facts:
+    merged: Facts = dict(previous or {})
+    for field, _ in FACT_FIELDS:
+        value = result.get(field)
+        if value not in (None, ""):
+            merged[field] = value
+    return merged
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap approximation (~4 characters per token) good enough for budgeting.
+    """
+    return (len(text) + 3) // 4
+
+
+def _format_facts(facts: Facts) -> Optional[str]:
+    parts = [f"{label}: {facts[field]}" for field, label in FACT_FIELDS if facts.get(field) not in (None, "")]
+    if not parts:
+        return None
+    return "Datos conocidos -> " + ", ".join(parts)
 
 
-def format_history(turns: List[ChatTurn]) -> str:
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[: max(max_chars - 3, 0)].rstrip() + "..."
+
+
+def format_history(turns: Turns) -> str:
     """
     Render the history as plain text to be injected in the prompt.
     """
@@ -74,6 +134,44 @@ def format_history(turns: List[ChatTurn]) -> str:
     return "\n".join(lines)
 
 
+def render_history(
+    turns: Turns,
+    facts: Optional[Facts] = None,
+    *,
+    max_tokens: int = 600,
+    keep_last: int = 4,
+) -> str:
+    """
+    Token-budgeted rendering: older turns collapse into a single "known facts" line
+    and only the last `keep_last` raw turns are kept, trimmed to fit `max_tokens`.
+    """
+    facts_line = _format_facts(facts or {})
+    if not turns and not facts_line:
+        return "Sin historial previo."
+
+    header = "Contexto recopilado del usuario (no repitas preguntas ya respondidas):"
+    fixed = [header] + ([facts_line] if facts_line else [])
+    recent = list(turns[-keep_last:]) if keep_last > 0 else []
+    if len(turns) > len(recent):
+        fixed.append(f"({len(turns) - len(recent)} mensajes anteriores resumidos en los datos conocidos)")
+
+    budget = max_tokens - estimate_tokens("\n".join(fixed))
+    lines: List[str] = []
+    # newest first so the most recent turns survive the budget
+    for role, content in reversed(recent):
+        speaker = "Usuario" if role == "user" else "Agente"
+        line = f"{speaker}: {content}"
+        cost = estimate_tokens(line) + 1
+        if cost > budget:
+            if budget > 8:
+                lines.append(_truncate(line, budget * 4))
+            break
+        lines.append(line)
+        budget -= cost
+
+    return "\n".join(fixed + list(reversed(lines)))
+
+
 def resolve_history_key(*identifiers: Optional[str]) -> Optional[str]:
     """
     Choose the first non-empty identifier to use as history key.
@@ -88,4 +186,17 @@ def resolve_history_key(*identifiers: Optional[str]) -> Optional[str]:
     return None
 
 
-history_store = ConversationHistory(max_messages=20)
+def build_history_backend() -> HistoryBackend:
+    if settings.history_backend == "sqlite" and settings.history_sqlite_path:
+        try:
+            return SQLiteHistoryBackend(settings.history_sqlite_path, ttl_seconds=settings.history_ttl_seconds)
+        except Exception as exc:
+            logger.warning("SQLite history backend unavailable, using memory: %s", exc)
+    return InMemoryHistoryBackend(
+        max_keys=settings.history_max_keys,
+        ttl_seconds=settings.history_ttl_seconds,
+        shards=settings.history_lock_shards,
+    )
+
+
+history_store = ConversationHistory(max_messages=20, backend=build_history_backend())
@@ -0,0 +1,286 @@
+"""
+Storage backends for the lead agent conversation history.
+Todos exponen la misma API; `ConversationHistory` elige uno según la configuración.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+ChatTurn = Tuple[str, str]
+Turns = Sequence[ChatTurn]
+Facts = Dict[str, Any]
+FactsUpdater = Callable[[Facts], Facts]
+
+
+class HistoryBackend(ABC):
+    name = "base"
+
+    @abstractmethod
+    def append(self, key: str, turn: ChatTurn, max_messages: int) -> None: ...
+
+    @abstractmethod
+    def get(self, key: str) -> Turns: ...
+
+    @abstractmethod
+    def clear(self, key: str) -> None: ...
+
+    @abstractmethod
+    def get_facts(self, key: str) -> Facts: ...
+
+    @abstractmethod
+    def update_facts(self, key: str, updater: FactsUpdater) -> None: ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]: ...
+
+
+class _Conversation:
+    """
+    Writers replace `turns`/`facts` with new immutable values under the shard lock;
+    readers grab the current reference without locking.
+    """
+
+    __slots__ = ("turns", "facts", "touched_at")
+
+    def __init__(self, now: float) -> None:
+        self.turns: Tuple[ChatTurn, ...] = ()
+        self.facts: Facts = {}
+        self.touched_at = now
+
+
+class _Shard:
+    __slots__ = ("lock", "entries", "evictions", "expirations")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+
+class InMemoryHistoryBackend(HistoryBackend):
+    """
+    Process-local LRU with TTL. Keys are hashed to independent shards, each with
+    its own lock, so concurrent conversations do not contend on a single mutex.
+    Reads are lock-free: they return the immutable tuple snapshot published by the
+    last writer (recency is refreshed by writes, which every analyzed message does).
+    """
+
+    name = "memory"
+
+    def __init__(self, *, max_keys: int = 10_000, ttl_seconds: int = 6 * 60 * 60, shards: int = 16) -> None:
+        self.max_keys = max(1, max_keys)
+        self.ttl_seconds = ttl_seconds
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+        self._per_shard = max(1, self.max_keys // len(self._shards))
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _expired(self, conversation: _Conversation, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - conversation.touched_at > self.ttl_seconds
+
+    def _live(self, shard: _Shard, key: str, now: float) -> Optional[_Conversation]:
+        conversation = shard.entries.get(key)
+        if conversation is not None and self._expired(conversation, now):
+            del shard.entries[key]
+            shard.expirations += 1
+            return None
+        return conversation
+
+    def _touch(self, shard: _Shard, key: str, now: float) -> _Conversation:
+        conversation = self._live(shard, key, now)
+        if conversation is None:
+            conversation = _Conversation(now)
+            shard.entries[key] = conversation
+        conversation.touched_at = now
+        shard.entries.move_to_end(key)
+        while len(shard.entries) > self._per_shard:
+            _, oldest = next(iter(shard.entries.items()))
+            shard.entries.popitem(last=False)
+            if self._expired(oldest, now):
+                shard.expirations += 1
+            else:
+                shard.evictions += 1
+        return conversation
+
+    def append(self, key: str, turn: ChatTurn, max_messages: int) -> None:
+        shard = self._shard(key)
+        now = time.monotonic()
+        with shard.lock:
+            conversation = self._touch(shard, key, now)
+            turns = conversation.turns + (turn,)
+            conversation.turns = turns[-max_messages:] if len(turns) > max_messages else turns
+
+    def _peek(self, key: str) -> Optional[_Conversation]:
+        # dict.get es atómico bajo el GIL; expirados se ignoran y los limpia el próximo writer
+        conversation = self._shard(key).entries.get(key)
+        if conversation is None or self._expired(conversation, time.monotonic()):
+            return None
+        return conversation
+
+    def get(self, key: str) -> Turns:
+        conversation = self._peek(key)
+        return conversation.turns if conversation else ()
+
+    def clear(self, key: str) -> None:
+        shard = self._shard(key)
+        with shard.lock:
+            shard.entries.pop(key, None)
+
+    def get_facts(self, key: str) -> Facts:
+        conversation = self._peek(key)
+        return dict(conversation.facts) if conversation else {}
+
+    def update_facts(self, key: str, updater: FactsUpdater) -> None:
+        shard = self._shard(key)
+        now = time.monotonic()
+        with shard.lock:
+            conversation = self._touch(shard, key, now)
+            conversation.facts = updater(dict(conversation.facts))
+
+    def stats(self) -> Dict[str, Any]:
+        keys = evictions = expirations = 0
+        for shard in self._shards:
+            with shard.lock:
+                keys += len(shard.entries)
+                evictions += shard.evictions
+                expirations += shard.expirations
+        return {
+            "backend": self.name,
+            "keys": keys,
+            "capacity": self._per_shard * len(self._shards),
+            "utilization": round(keys / (self._per_shard * len(self._shards)), 4),
+            "shards": len(self._shards),
+            "ttl_seconds": self.ttl_seconds,
+            "evictions": evictions,
+            "expirations": expirations,
+        }
+
+
+class SQLiteHistoryBackend(HistoryBackend):
+    """
+    Shared history in a SQLite file (WAL) so every uvicorn worker on the host
+    sees the same conversation. One connection per thread; SQLite serializes writers.
+    """
+
+    name = "sqlite"
+    _PURGE_EVERY = 500
+
+    def __init__(self, path: str, *, ttl_seconds: int = 6 * 60 * 60) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        conn = self._conn()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS history_turns (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_history_turns_key ON history_turns (key, seq);
+            CREATE TABLE IF NOT EXISTS history_facts (
+                key TEXT PRIMARY KEY,
+                facts TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl_seconds if self.ttl_seconds else 0.0
+
+    def _maybe_purge(self, conn: sqlite3.Connection) -> None:
+        with self._writes_lock:
+            self._writes += 1
+            due = self._writes % self._PURGE_EVERY == 0
+        if due and self.ttl_seconds:
+            cutoff = self._cutoff()
+            conn.execute("DELETE FROM history_turns WHERE created_at < ?", (cutoff,))
+            conn.execute("DELETE FROM history_facts WHERE updated_at < ?", (cutoff,))
+
+    def append(self, key: str, turn: ChatTurn, max_messages: int) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO history_turns (key, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (key, turn[0], turn[1], time.time()),
+            )
+            conn.execute(
+                """
+                DELETE FROM history_turns WHERE key = ? AND seq NOT IN (
+                    SELECT seq FROM history_turns WHERE key = ? ORDER BY seq DESC LIMIT ?
+                )
+                """,
+                (key, key, max_messages),
+            )
+        self._maybe_purge(conn)
+
+    def get(self, key: str) -> Turns:
+        rows = self._conn().execute(
+            "SELECT role, content FROM history_turns WHERE key = ? AND created_at >= ? ORDER BY seq",
+            (key, self._cutoff()),
+        ).fetchall()
+        return tuple((role, content) for role, content in rows)
+
+    def clear(self, key: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM history_turns WHERE key = ?", (key,))
+            conn.execute("DELETE FROM history_facts WHERE key = ?", (key,))
+
+    def get_facts(self, key: str) -> Facts:
+        row = self._conn().execute(
+            "SELECT facts FROM history_facts WHERE key = ? AND updated_at >= ?",
+            (key, self._cutoff()),
+        ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def update_facts(self, key: str, updater: FactsUpdater) -> None:
+        conn = self._conn()
+        with conn:
+            # BEGIN IMMEDIATE toma el lock de escritura: el read-modify-write es atómico entre procesos.
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT facts FROM history_facts WHERE key = ?", (key,)).fetchone()
+            facts = updater(json.loads(row[0]) if row else {})
+            conn.execute(
+                "INSERT OR REPLACE INTO history_facts (key, facts, updated_at) VALUES (?, ?, ?)",
+                (key, json.dumps(facts, ensure_ascii=False), time.time()),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        keys = conn.execute(
+            "SELECT COUNT(DISTINCT key) FROM history_turns WHERE created_at >= ?", (self._cutoff(),)
+        ).fetchone()[0]
+        turns = conn.execute("SELECT COUNT(*) FROM history_turns").fetchone()[0]
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "keys": keys,
+            "stored_turns": turns,
+            "ttl_seconds": self.ttl_seconds,
+        }
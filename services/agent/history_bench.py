@@ -0,0 +1,149 @@
+"""
+Contention benchmark for conversation history backends.
+Muchos hilos haciendo append/get mezclados sobre muchas conversaciones:
+
+    python -m services.agent.history_bench --threads 32 --ops 20000 --keys 2000 --reads 0.7
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, List
+
+from services.agent.history_backends import (
+    ChatTurn,
+    Facts,
+    FactsUpdater,
+    HistoryBackend,
+    InMemoryHistoryBackend,
+    Turns,
+)
+
+
+class SingleLockHistoryBackend(HistoryBackend):
+    """
+    Baseline that mirrors the original store: one global Lock and a list copy per read.
+    """
+
+    name = "single-lock"
+
+    def __init__(self) -> None:
+        self._store: Dict[str, Deque[ChatTurn]] = defaultdict(deque)
+        self._facts: Dict[str, Facts] = {}
+        self._lock = threading.Lock()
+
+    def append(self, key: str, turn: ChatTurn, max_messages: int) -> None:
+        with self._lock:
+            turns = self._store[key]
+            turns.append(turn)
+            while len(turns) > max_messages:
+                turns.popleft()
+
+    def get(self, key: str) -> Turns:
+        with self._lock:
+            return list(self._store.get(key, ()))
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._store.pop(key, None)
+
+    def get_facts(self, key: str) -> Facts:
+        with self._lock:
+            return dict(self._facts.get(key, {}))
+
+    def update_facts(self, key: str, updater: FactsUpdater) -> None:
+        with self._lock:
+            self._facts[key] = updater(dict(self._facts.get(key, {})))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "keys": len(self._store)}
+
+
+def run_contention_benchmark(
+    backend: HistoryBackend,
+    *,
+    threads: int = 16,
+    ops_per_thread: int = 10_000,
+    keys: int = 1_000,
+    read_ratio: float = 0.7,
+    max_messages: int = 20,
+    seed: int = 7,
+) -> Dict[str, Any]:
+    key_space = [f"contact-{i}" for i in range(keys)]
+    barrier = threading.Barrier(threads + 1)
+    latencies: List[float] = []
+    latencies_lock = threading.Lock()
+
+    def worker(worker_id: int) -> None:
+        rng = random.Random(seed + worker_id)
+        local: List[float] = []
+        barrier.wait()
+        for _ in range(ops_per_thread):
+            key = rng.choice(key_space)
+            started = time.perf_counter()
+            if rng.random() < read_ratio:
+                backend.get(key)
+            else:
+                backend.append(key, ("user", "Busco apartamento en Pasto"), max_messages)
+            local.append(time.perf_counter() - started)
+        with latencies_lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total_ops = threads * ops_per_thread
+
+    def pct(p: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e6, 2)
+
+    return {
+        "backend": backend.name,
+        "threads": threads,
+        "ops": total_ops,
+        "elapsed_s": round(elapsed, 3),
+        "ops_per_s": round(total_ops / elapsed) if elapsed else None,
+        "p50_us": pct(0.50),
+        "p99_us": pct(0.99),
+    }
+
+
+BACKENDS: Dict[str, Callable[[argparse.Namespace], HistoryBackend]] = {
+    "single-lock": lambda _: SingleLockHistoryBackend(),
+    "sharded": lambda args: InMemoryHistoryBackend(max_keys=args.keys * 2, shards=args.shards),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=10_000, help="operaciones por hilo")
+    parser.add_argument("--keys", type=int, default=1_000)
+    parser.add_argument("--reads", type=float, default=0.7, help="fracción de lecturas")
+    parser.add_argument("--shards", type=int, default=16)
+    args = parser.parse_args()
+
+    for name, factory in BACKENDS.items():
+        result = run_contention_benchmark(
+            factory(args),
+            threads=args.threads,
+            ops_per_thread=args.ops,
+            keys=args.keys,
+            read_ratio=args.reads,
+        )
+        print(name, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,11 @@ Lead analysis agent that uses LangChain + LLM to classify real-estate leads and
 
 from __future__ import annotations
 
+import asyncio
 import json
 import re
 import logging
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
 
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
@@ -18,14 +19,24 @@ from db.supabase_client import get_supabase_client
 from repositories.interaction_repository import LeadInteractionRepository
 from repositories.lead_repository import LeadRepository
 from repositories.property_repository import PropertyRepository
-from services.agent.history import format_history, history_store
+from services.agent.batcher import LeadBatcher
+from services.agent.cache import make_cache_key, prompt_fingerprint, response_cache
+from services.agent.history import history_store, render_history
 from services.agent.prompts import BASE_PROMPT
-from utils.scoring import interest_from_category
+from services.agent.rules import classify as rule_classify, extract_urgencia, rule_stats
+from services.agent.runtime import call_with_timeout, llm_slot
+from services.interaction_queue import record_interaction
+from services.lead_matches import lead_matches
+from services.agent.semantic import blend, lead_text, semantic_available, semantic_matcher
+from utils.notes import AGENT_PREFIX, compact_notes, rollover_rows
+from utils.preferences import decode_preferences, merge_preferences, split_legacy_notes
+from utils.scoring import interest_from_category, score_property
 
 load_dotenv()
 
 MODEL_NAME = settings.llm_model
 TEMPERATURE = settings.llm_temperature
+PROMPT_HASH = prompt_fingerprint(BASE_PROMPT)
 
 logger = logging.getLogger(__name__)
 
@@ -60,16 +71,84 @@ def _build_agent_summary(result: Dict[str, Any]) -> str:
     )
 
 
-def _persist_history(history_key: Optional[str], user_message: str, result: Dict[str, Any]) -> None:
+# campos no explícitos de una respuesta cacheada; se quita antes de devolverla
+UNSTATED_KEY = "_unstated"
+
+
+def _persist_history(
+    history_key: Optional[str], user_message: str, result: Dict[str, Any], facts: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    `facts` is what the classification actually stated; fallbacks pass None so their
+    defaults never reach the known facts.
+    """
     if not history_key:
         return
     history_store.append(history_key, "user", user_message)
     history_store.append(history_key, "agent", _build_agent_summary(result))
+    if facts is not None:
+        history_store.update_facts(history_key, facts)
+
+
+def _unstated_fields(urgencia: Any) -> List[str]:
+    """
+    Fields the normalization filled in although the classification did not state them.
+    """
+    # sin urgencia explícita _normalize_urgencia pone "media": no es un dato del lead
+    if isinstance(urgencia, str) and urgencia.strip().lower() in {"alta", "media", "baja"}:
+        return []
+    return ["urgencia"]
+
+
+def _stated_facts(normalized: Dict[str, Any], unstated: Sequence[str]) -> Dict[str, Any]:
+    facts = dict(normalized)
+    for field in unstated:
+        facts[field] = None
+    return facts
+
+
+class PendingAnalysis(NamedTuple):
+    prompt: str
+    cache_key: str
+    history_text: str
+
+
+def _build_prompt(message: str, history_key: Optional[str]) -> PendingAnalysis:
+    """
+    Return the rendered prompt and the cache key for this message + history state.
+    """
+    history_text = render_history(
+        history_store.get(history_key),
+        history_store.get_facts(history_key),
+        max_tokens=settings.history_prompt_max_tokens,
+        keep_last=settings.history_keep_last_turns,
+    )
+    prompt = BASE_PROMPT.replace("{historial}", history_text).replace("{mensaje}", message)
+    cache_key = make_cache_key(
+        model=MODEL_NAME,
+        temperature=TEMPERATURE,
+        prompt_hash=PROMPT_HASH,
+        history_text=history_text,
+        message=message,
+    )
+    return PendingAnalysis(prompt, cache_key, history_text)
 
 
-def _build_prompt(message: str, history_key: Optional[str]) -> str:
-    history_text = format_history(history_store.get(history_key))
-    return BASE_PROMPT.replace("{historial}", history_text).replace("{mensaje}", message)
+def _rule_based_result(message: str, history_key: Optional[str]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    Serve trivially classifiable messages without the LLM: (result, stated facts).
+    Only applies to the first message of a conversation: with history the LLM must merge context.
+    """
+    if not settings.rule_classifier_enabled or history_store.get(history_key):
+        return None
+    payload, confidence = rule_classify(message)
+    served = confidence >= settings.rule_classifier_min_confidence
+    rule_stats.record(served)
+    if not served:
+        return None
+    normalized = _normalize_payload(payload)
+    # classify también rellena urgencia "media"; solo cuenta si el mensaje la menciona
+    return normalized, _stated_facts(normalized, _unstated_fields(extract_urgencia(message)))
 
 
 def _load_llm() -> Optional[ChatOpenAI]:
@@ -278,33 +357,147 @@ def _normalize_payload(data: Dict[str, Any]) -> Dict[str, Any]:
     return normalized
 
 
-def analyze_lead_message(message: str, *, history_key: Optional[str] = None) -> Dict[str, Any]:
+def _prepare_analysis(
+    message: str, history_key: Optional[str]
+) -> Tuple[Optional[Dict[str, Any]], Optional[PendingAnalysis]]:
     """
-    Analyze the lead message using the LLM and normalize the response.
-    Stores a short chat history per usuario to avoid re-asking for data.
+    Resolve everything that does not need the LLM.
+    Returns (result, None) when the message is already answered, or (None, pending).
     """
+    ruled = _rule_based_result(message, history_key)
+    if ruled is not None:
+        result, facts = ruled
+        _persist_history(history_key, message, result, facts)
+        return result, None
+
     if llm is None:
         fallback = DEFAULT_RESPONSE.copy()
         fallback["razonamiento"] = "LLM no disponible (clave o dependencia faltante)"
         _persist_history(history_key, message, fallback)
-        return fallback
-
-    prompt = _build_prompt(message, history_key)
-
-    try:
-        response = llm.invoke(prompt)
-        content = response.content if hasattr(response, "content") else str(response)
-    except Exception:
+        return fallback, None
+
+    pending = _build_prompt(message, history_key)
+    cached = response_cache.get(pending.cache_key)
+    if cached is not None:
+        # entradas anteriores a la marca: no se sabe si la urgencia fue explícita
+        unstated = cached.pop(UNSTATED_KEY, ["urgencia"])
+        _persist_history(history_key, message, cached, _stated_facts(cached, unstated))
+        return cached, None
+    return None, pending
+
+
+def _finish_analysis(
+    message: str, history_key: Optional[str], cache_key: str, parsed: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    if parsed is None:
         fallback = DEFAULT_RESPONSE.copy()
         _persist_history(history_key, message, fallback)
         return fallback
 
-    parsed = _parse_json_response(content)
     normalized = _normalize_payload(parsed)
-    _persist_history(history_key, message, normalized)
+    if parsed.get("razonamiento") == DEFAULT_RESPONSE["razonamiento"]:
+        # el LLM no pudo interpretar el mensaje: ni cache ni datos conocidos, se reintenta
+        _persist_history(history_key, message, normalized)
+        return normalized
+    unstated = _unstated_fields(parsed.get("urgencia"))
+    response_cache.set(cache_key, {**normalized, UNSTATED_KEY: unstated})
+    _persist_history(history_key, message, normalized, _stated_facts(normalized, unstated))
     return normalized
 
 
+def _response_content(response: Any) -> str:
+    return response.content if hasattr(response, "content") else str(response)
+
+
+def analyze_lead_message(message: str, *, history_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Analyze the lead message using the LLM and normalize the response.
+    Stores a short chat history per usuario to avoid re-asking for data.
+    """
+    ready, pending = _prepare_analysis(message, history_key)
+    if ready is not None:
+        return ready
+
+    try:
+        parsed: Optional[Dict[str, Any]] = _parse_json_response(_response_content(llm.invoke(pending.prompt)))
+    except Exception:
+        parsed = None
+    return _finish_analysis(message, history_key, pending.cache_key, parsed)
+
+
+async def _invoke_async(prompt: str, timeout: Optional[float] = None) -> str:
+    async with llm_slot("openai"):
+        response = await call_with_timeout(llm.ainvoke(prompt), timeout)
+    return _response_content(response)
+
+
+async def analyze_lead_message_async(
+    message: str, *, history_key: Optional[str] = None, timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Async variant of `analyze_lead_message` using `ainvoke`.
+    Bounded per provider and by timeout; if cancelled, nothing is written to history.
+    With LLM_BATCH_ENABLED the call joins a micro-batch instead of going alone.
+    """
+    ready, pending = _prepare_analysis(message, history_key)
+    if ready is not None:
+        return ready
+
+    try:
+        if settings.llm_batch_enabled:
+            parsed = await get_lead_batcher().submit(message, pending)
+        else:
+            parsed = _parse_json_response(await _invoke_async(pending.prompt, timeout))
+    except asyncio.CancelledError:
+        raise
+    except asyncio.TimeoutError:
+        logger.warning("LLM call timed out for history key %s", history_key)
+        parsed = None
+    except Exception:
+        parsed = None
+    return _finish_analysis(message, history_key, pending.cache_key, parsed)
+
+
+_lead_batcher: Optional[LeadBatcher] = None
+
+
+def get_lead_batcher() -> LeadBatcher:
+    global _lead_batcher
+    if _lead_batcher is None:
+        _lead_batcher = LeadBatcher(
+            invoke=_invoke_async,
+            parse_single=_parse_json_response,
+            window_ms=settings.llm_batch_window_ms,
+            max_items=settings.llm_batch_max_items,
+        )
+    return _lead_batcher
+
+
+def complete_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ensure interest flags even if LLM was unavailable.
+    """
+    interested, level = _interest_flags(result.get("lead_score"))
+    result["is_interested"] = result.get("is_interested", interested)
+    result["interest_level"] = result.get("interest_level", level)
+    result["intent_score"] = result.get("intent_score") or _intent_score_from_result(result)
+    return result
+
+
+def _recommendation(p: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": p.get("id"),
+        "title": p.get("title"),
+        "price": p.get("price"),
+        "location": p.get("location"),
+        "property_type": p.get("property_type"),
+        "bedrooms": p.get("bedrooms"),
+        "bathrooms": p.get("bathrooms"),
+        "parking": p.get("parking"),
+        "photos": p.get("photos"),
+    }
+
+
 class LeadAgentService:
     """
     High-level orchestration: call the LLM agent, persist leads/interactions in Supabase,
@@ -342,7 +535,10 @@ class LeadAgentService:
             return str(contact)
         return "Lead sin nombre"
 
-    def _build_notes(self, existing_notes: Optional[str], result: Dict[str, Any]) -> str:
+    def _build_notes(self, existing_notes: Optional[str], result: Dict[str, Any]) -> Tuple[str, list[str]]:
+        """
+        Notes with this analysis appended, capped by compact_notes; also returns the entries rolled over.
+        """
         details = []
         if result.get("tipo_propiedad"):
             details.append(f"tipo: {result['tipo_propiedad']}")
@@ -350,13 +546,14 @@ class LeadAgentService:
             details.append(f"zona: {result['zona']}")
         if result.get("intencion_real"):
             details.append(f"intencion: {result['intencion_real']}")
-        summary = f"Agente -> score {result.get('lead_score')} ({result.get('razonamiento')})"
+        summary = f"{AGENT_PREFIX}score {result.get('lead_score')} ({result.get('razonamiento')})"
         block = summary
         if details:
             block = f"{summary}; " + ", ".join(details)
+        block = " ".join(block.splitlines())  # una entrada = una línea
         if existing_notes and block not in existing_notes:
-            return f"{existing_notes}\n{block}"
-        return block if not existing_notes else existing_notes
+            return compact_notes(f"{existing_notes}\n{block}")
+        return (block, []) if not existing_notes else (existing_notes, [])
 
     def _build_lead_payload(
         self,
@@ -365,13 +562,18 @@ class LeadAgentService:
         email: Optional[str],
         phone: Optional[str],
         existing: Optional[Dict[str, Any]],
-    ) -> Dict[str, Any]:
+    ) -> Tuple[Dict[str, Any], list[str]]:
         preferred_area = result.get("zona") or (existing or {}).get("preferred_area")
         budget = result.get("presupuesto")
         if budget is None and existing:
             budget = existing.get("budget")
 
         urgency_value = result.get("urgency_value") or _map_urgency_to_domain(result.get("urgencia", "media")).value
+        existing_notes = (existing or {}).get("notes")
+        legacy, free_text = split_legacy_notes(existing_notes)
+        if legacy is not None:
+            existing_notes = free_text  # las preferencias del JSON van a la columna
+        notes, rolled = self._build_notes(existing_notes, result)
 
         payload = {
             "full_name": self._choose_name(lead_data, existing),
@@ -380,29 +582,34 @@ class LeadAgentService:
             "preferred_area": preferred_area,
             "budget": budget,
             "urgency": urgency_value,
-            "notes": self._build_notes((existing or {}).get("notes"), result),
+            "notes": notes,
             "status": (existing or {}).get("status") or "new",
             "category": result.get("lead_score"),
             "intent_score": result.get("intent_score"),
             "post_id": _get_value(lead_data, "post_id") or (existing or {}).get("post_id"),
             "agency_id": _get_value(lead_data, "agency_id") or (existing or {}).get("agency_id"),
         }
+        preferences = merge_preferences(
+            decode_preferences(existing) if existing else {},
+            {
+                "tipo_propiedad": result.get("tipo_propiedad"),
+                "habitaciones": result.get("habitaciones"),
+                "banos": result.get("banos"),
+                "garaje": result.get("garaje") if isinstance(result.get("garaje"), bool) else None,
+            },
+        )
+        if preferences and (legacy is not None or preferences != (existing or {}).get("preferences")):
+            payload["preferences"] = preferences
 
         # Remove None values to avoid overwriting existing data with nulls.
-        return {k: v for k, v in payload.items() if v is not None}
+        return {k: v for k, v in payload.items() if v is not None}, rolled
 
     def _find_existing_lead(
         self, email: Optional[str], phone: Optional[str], agency_id: Optional[int]
     ) -> Optional[Dict[str, Any]]:
-        if phone:
-            found = self.lead_repo.find_by_phone(phone, agency_id=agency_id)
-            if found:
-                return found
-        if email:
-            found = self.lead_repo.find_by_email(email, agency_id=agency_id)
-            if found:
-                return found
-        return None
+        if not phone and not email:
+            return None
+        return self.lead_repo.find_by_contact(phone=phone, email=email, agency_id=agency_id)
 
     def _record_interactions(self, lead_id: int, message: str, channel: str, result: Dict[str, Any]) -> None:
         message_text = message if isinstance(message, str) else str(message)
@@ -415,7 +622,7 @@ class LeadAgentService:
             "direction": "inbound",
             "message": message_text,
         }
-        self.interaction_repo.create(inbound)
+        record_interaction(inbound, self.interaction_repo)
 
         agent_message = _build_agent_summary(result)
         outbound = {
@@ -424,7 +631,7 @@ class LeadAgentService:
             "direction": "outbound",
             "message": agent_message,
         }
-        self.interaction_repo.create(outbound)
+        record_interaction(outbound, self.interaction_repo)
 
     def _recommend_properties(self, result: Dict[str, Any], agency_id: Optional[int]) -> list[dict]:
         try:
@@ -435,6 +642,19 @@ class LeadAgentService:
             bedrooms = _get_value(result, "habitaciones")
             bathrooms = _get_value(result, "banos")
 
+            criteria = {
+                "budget": budget,
+                "zona": zona,
+                "tipo": tipo,
+                "bedrooms": bedrooms,
+                "bathrooms": bathrooms,
+                "parking": parking if isinstance(parking, bool) else None,
+            }
+            if settings.recommendation_ranker == "semantic" and semantic_available():
+                top_props = self._rank_semantic(result, agency_id, criteria)
+                if top_props:
+                    return [_recommendation(p) for p in top_props]
+
             # Recuperar candidatos (puede ser de agencia o global)
             props = self.property_repo.list_filtered(
                 agency_id=agency_id,
@@ -454,66 +674,45 @@ class LeadAgentService:
                     props = self.property_repo.list_filtered(agency_id=agency_id)[:10]
                     self._fallback_recs_cache[cache_key] = props
 
-            def score_prop(p: dict) -> float:
-                score = 0.0
-                price = p.get("price")
-                if budget and price:
-                    diff_ratio = abs(float(price) - budget) / max(budget, 1)
-                    if diff_ratio <= 0.3:
-                        score += 40
-                    elif diff_ratio <= 0.6:
-                        score += 20
-                    else:
-                        return -1  # demasiado lejos del presupuesto
-                if zona and p.get("location") and zona.lower() in str(p.get("location")).lower():
-                    score += 15
-                if tipo and p.get("property_type") and tipo.lower() == str(p.get("property_type")).lower():
-                    score += 15
-                if bedrooms and p.get("bedrooms") is not None:
-                    if abs(int(p.get("bedrooms")) - bedrooms) <= 1:
-                        score += 8
-                if bathrooms and p.get("bathrooms") is not None:
-                    if abs(int(p.get("bathrooms")) - bathrooms) <= 1:
-                        score += 6
-                if isinstance(parking, bool) and p.get("parking") is not None and p.get("parking") == parking:
-                    score += 4
-                return score
-
             ranked = []
             for prop in props:
-                s = score_prop(prop)
+                s = score_property(prop, **criteria)
                 if s >= 0:
                     ranked.append((s, prop))
             ranked.sort(key=lambda tup: tup[0], reverse=True)
             top_props = [p for _, p in ranked[:5]]
 
-            return [
-                {
-                    "id": p.get("id"),
-                    "title": p.get("title"),
-                    "price": p.get("price"),
-                    "location": p.get("location"),
-                    "property_type": p.get("property_type"),
-                    "bedrooms": p.get("bedrooms"),
-                    "bathrooms": p.get("bathrooms"),
-                    "parking": p.get("parking"),
-                    "photos": p.get("photos"),
-                }
-                for p in top_props
-            ]
+            return [_recommendation(p) for p in top_props]
         except Exception:
             return []
 
+    def _rank_semantic(self, result: Dict[str, Any], agency_id: Optional[int], criteria: Dict[str, Any]) -> list[dict]:
+        """
+        Cosine top-k over the agency catalog, re-scored with the rule score so budget limits still apply.
+        """
+        text = lead_text(result)
+        if not text:
+            return []
+        matches = semantic_matcher.rank(
+            text, agency_id, lambda: self.property_repo.list(agency_id), settings.semantic_candidates
+        )
+        return blend(matches, criteria, weight=settings.semantic_weight, k=5)
+
     def analyze_and_persist(self, lead_data: Any, *, history_key: Optional[str]) -> Dict[str, Any]:
         message = _get_value(lead_data, "mensaje") or ""
-        channel = (_get_value(lead_data, "canal") or "web").lower()
         result = analyze_lead_message(message, history_key=history_key)
+        return self.persist_analysis(lead_data, result)
 
-        # Ensure interest flags even if LLM was unavailable.
-        interested, level = _interest_flags(result.get("lead_score"))
-        result["is_interested"] = result.get("is_interested", interested)
-        result["interest_level"] = result.get("interest_level", level)
-        result["intent_score"] = result.get("intent_score") or _intent_score_from_result(result)
+    async def analyze_and_persist_async(self, lead_data: Any, *, history_key: Optional[str]) -> Dict[str, Any]:
+        message = _get_value(lead_data, "mensaje") or ""
+        result = await analyze_lead_message_async(message, history_key=history_key)
+        # supabase-py es bloqueante: la persistencia corre en un hilo.
+        return await asyncio.to_thread(self.persist_analysis, lead_data, result)
+
+    def persist_analysis(self, lead_data: Any, result: Dict[str, Any]) -> Dict[str, Any]:
+        message = _get_value(lead_data, "mensaje") or ""
+        channel = (_get_value(lead_data, "canal") or "web").lower()
+        result = complete_result(result)
 
         email, phone = self._parse_contact(_get_value(lead_data, "contacto"))
         lead_record: Dict[str, Any] = {"id": None}
@@ -522,11 +721,12 @@ class LeadAgentService:
         try:
             recs = self._recommend_properties(result, _get_value(lead_data, "agency_id"))
             existing = self._find_existing_lead(email, phone, _get_value(lead_data, "agency_id"))
-            payload = self._build_lead_payload(lead_data, result, email, phone, existing)
-            if existing:
-                lead_record = self.lead_repo.update(existing["id"], payload)
-            else:
-                lead_record = self.lead_repo.create(payload)
+            payload, rolled = self._build_lead_payload(lead_data, result, email, phone, existing)
+            lead_record = self.lead_repo.upsert_by_contact(payload, existing_id=(existing or {}).get("id"))
+            # las entradas que salen de notes quedan en el historial de interacciones
+            for row in rollover_rows(lead_record["id"], rolled):
+                record_interaction(row, self.interaction_repo)
+            lead_matches.submit(lead_matches.lead_saved, lead_record)
         except Exception as exc:
             logger.error("Lead persistence failed: %s", exc, exc_info=True)
             lead_record = {"id": None}
@@ -2,6 +2,17 @@
 Prompt templates for the lead analysis agent.
 """
 
+LEAD_RULES = """- presupuesto: número entero en moneda local, sin símbolos ni comas; null si no se sabe.
+- zona: ciudad/barrio si se menciona; null si no se sabe.
+- tipo_propiedad: normaliza a la lista dada; null si no se sabe.
+- urgencia: alta (cerrar pronto: semanas o 1-3 meses, dice "ya", "urgente"), media (3-6 meses, sin apuro explícito), baja (solo explorando, "algún día", sin presión).
+- lead_score:
+  - A: presupuesto realista + intención clara de comprar/arrendar + urgencia alta o media + zona o ciudad definida.
+  - B: interés moderado, presupuesto algo bajo/dudoso, o falta de zona clara pero sí tipo de propiedad.
+  - C: poca claridad o curiosidad, sin presupuesto realista ni urgencia, mensaje muy vago.
+- No inventes datos: usa null cuando falte información.
+"""
+
 BASE_PROMPT = """
 Eres un agente de calificación de leads para inmobiliarias. Lee el mensaje del posible comprador y devuelve SOLO un JSON válido con los campos pedidos.
 
@@ -21,16 +32,7 @@ Devuelve SIEMPRE este JSON:
 }}
 
 Reglas:
-- presupuesto: número entero en moneda local, sin símbolos ni comas; null si no se sabe.
-- zona: ciudad/barrio si se menciona; null si no se sabe.
-- tipo_propiedad: normaliza a la lista dada; null si no se sabe.
-- urgencia: alta (cerrar pronto: semanas o 1-3 meses, dice "ya", "urgente"), media (3-6 meses, sin apuro explícito), baja (solo explorando, "algún día", sin presión).
-- lead_score:
-  - A: presupuesto realista + intención clara de comprar/arrendar + urgencia alta o media + zona o ciudad definida.
-  - B: interés moderado, presupuesto algo bajo/dudoso, o falta de zona clara pero sí tipo de propiedad.
-  - C: poca claridad o curiosidad, sin presupuesto realista ni urgencia, mensaje muy vago.
-- No inventes datos: usa null cuando falte información.
-- Responde ÚNICAMENTE con el JSON, sin texto extra ni formato Markdown.
+""" + LEAD_RULES + """- Responde ÚNICAMENTE con el JSON, sin texto extra ni formato Markdown.
 
 Ejemplo 1 (lead A)
 Mensaje: "Busco apartamento en Pasto centro, tengo 400 millones, quiero cerrar en máximo 2 meses"
@@ -62,3 +64,34 @@ Ahora analiza este mensaje:
 "{mensaje}"
 Respuesta:
 """
+
+BATCH_PROMPT = """
+Eres un agente de calificación de leads para inmobiliarias. Vas a recibir VARIOS mensajes independientes,
+cada uno con su propio historial. Analiza cada uno por separado y devuelve SOLO un arreglo JSON válido
+con un objeto por mensaje, en el mismo orden, con estos campos:
+{{
+  "item": <número del mensaje>,
+  "presupuesto": <entero o null>,
+  "zona": <string o null>,
+  "tipo_propiedad": <"apartamento" | "casa" | "local" | "oficina" | "lote" | "finca" | "otro" | null>,
+  "urgencia": <"alta" | "media" | "baja">,
+  "lead_score": <"A" | "B" | "C">,
+  "intencion_real": <string corto o null>,
+  "razonamiento": <string corto explicando por qué se asignó el score>
+}}
+
+Reglas:
+""" + LEAD_RULES + """- Nunca mezcles datos entre mensajes distintos.
+- Responde ÚNICAMENTE con el arreglo JSON, sin texto extra ni formato Markdown.
+
+Mensajes:
+{items}
+Respuesta:
+"""
+
+BATCH_ITEM_TEMPLATE = """
+### Mensaje {index}
+Historial:
+{historial}
+Mensaje: "{mensaje}"
+"""
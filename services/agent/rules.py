@@ -0,0 +1,393 @@
+"""
+Deterministic pre-classifier for the lead agent.
+Extrae presupuesto, tipo, zona y urgencia con regex/diccionarios y devuelve
+una confianza; si es alta, el agente responde sin llamar al LLM.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import sys
+import unicodedata
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+RuleResult = Tuple[Dict[str, Any], float]
+
+_MILLION_WORDS = r"(?:millones|millon|millón|mill|mm)"
+
+_BILLION_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*mil\s+millones")
+_MILLION_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*" + _MILLION_WORDS + r"\b")
+# "300m" solo es presupuesto con "$" o contexto de dinero: "80 m" / "120 m²" suelen ser área
+_MILLION_SHORT_RE = re.compile(r"(\$\s*)?\b(\d+(?:[.,]\d+)?)\s*m\b(?!\s*(?:2|²|cuadrad))")
+_THOUSAND_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*mil\b")
+_GROUPED_RE = re.compile(r"(\$\s*)?\b(\d{1,3}(?:[.,]\d{3}){2,})\b")
+_PLAIN_RE = re.compile(r"(\$\s*)?\b(\d{7,})\b")
+# un número suelto solo es presupuesto con "$", "pesos"/"cop" o una palabra de contexto cerca
+_BUDGET_CONTEXT_RE = re.compile(
+    r"\b(?:presupuesto|tengo|cuento con|dispongo|hasta|maximo|pagar|pago|precio|valor|inversion|invertir|credito|ahorr\w*)\b"
+)
+_CURRENCY_AFTER_RE = re.compile(r"^\s*(?:pesos|cop|de pesos)\b")
+_PHONE_CONTEXT_RE = re.compile(
+    r"\b(?:cel|celular|tel|telefono|whatsapp|wsp|wp|numero|movil|llamar|llamame|contacto|contactar)\b"
+)
+_CONTEXT_CHARS = 30
+
+_TIPO_KEYWORDS: Tuple[Tuple[str, str], ...] = (
+    ("local comercial", "local"),
+    ("apartaestudio", "apartamento"),
+    ("apartamento", "apartamento"),
+    ("departamento", "apartamento"),
+    ("apto", "apartamento"),
+    ("casa", "casa"),
+    ("oficina", "oficina"),
+    ("local", "local"),
+    ("lote", "lote"),
+    ("terreno", "lote"),
+    ("parcela", "lote"),
+    ("finca", "finca"),
+    ("granja", "finca"),
+)
+
+_URGENCY_PHRASES: Dict[str, Tuple[str, ...]] = {
+    "alta": (
+        "urgente",
+        "lo antes posible",
+        "cuanto antes",
+        "inmediat",
+        "ya mismo",
+        "este mes",
+        "proxima semana",
+        "esta semana",
+        "maximo 1 mes",
+        "maximo 2 meses",
+        "maximo 3 meses",
+        "en 1 mes",
+        "en 2 meses",
+        "en 3 meses",
+        "en un mes",
+        "en dos meses",
+        "en tres meses",
+    ),
+    "media": (
+        "en unos meses",
+        "en 4 meses",
+        "en 5 meses",
+        "en 6 meses",
+        "3 a 6 meses",
+        "3-6 meses",
+        "este ano",
+        "sin apuro",
+    ),
+    "baja": (
+        "solo mirando",
+        "solo estoy mirando",
+        "estoy mirando opciones",
+        "por curiosidad",
+        "curiosidad",
+        "algun dia",
+        "a futuro",
+        "proximo ano",
+        "explorando",
+        "sin afan",
+    ),
+}
+
+_INTENT_PHRASES: Tuple[Tuple[str, str], ...] = (
+    ("arrend", "Quiere arrendar"),
+    ("arriendo", "Quiere arrendar"),
+    ("alquil", "Quiere arrendar"),
+    ("invertir", "Quiere invertir"),
+    ("inversion", "Quiere invertir"),
+    ("compr", "Quiere comprar"),
+    ("busco", "Busca propiedad"),
+    ("necesito", "Busca propiedad"),
+)
+
+_GREETINGS = {
+    "hola",
+    "buenas",
+    "buenos dias",
+    "buenas tardes",
+    "buenas noches",
+    "me interesa",
+    "hola me interesa",
+    "info",
+    "informacion",
+    "mas informacion",
+    "quiero informacion",
+    "precio",
+}
+
+_ZONA_RE = re.compile(
+    r"\b(?:en|por|zona|barrio|sector)\s+"
+    r"((?:[A-ZÁÉÍÓÚÑ][\wáéíóúñ]+)(?:\s+(?:[A-ZÁÉÍÓÚÑ][\wáéíóúñ]+|centro|norte|sur|oriente|occidente))*)"
+)
+# palabras con mayúscula que siguen a "en"/"por" y no son lugares
+_ZONA_STOPWORDS = frozenset(
+    {
+        "enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+        "septiembre", "setiembre", "octubre", "noviembre", "diciembre",
+        "lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo",
+        "navidad", "semana", "whatsapp", "facebook", "instagram", "efectivo", "credito",
+    }
+)
+_NEGATION_RE = re.compile(r"\bno\s+(?:tengo|se|sé|hay|busco|quiero)\b")
+
+DEFAULT_MIN_CONFIDENCE = 0.85
+MAX_TRIVIAL_WORDS = 40
+
+
+def _fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _to_number(raw: str) -> Optional[float]:
+    value = raw.strip()
+    # "1.500" o "1,500" -> separador de miles; "1.5" o "1,5" -> decimal
+    if re.fullmatch(r"\d{1,3}(?:[.,]\d{3})+", value):
+        value = re.sub(r"[.,]", "", value)
+    else:
+        value = value.replace(",", ".")
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _looks_like_phone(digits: str) -> bool:
+    # celulares colombianos (10 dígitos que empiezan por 3) o con indicativo 57
+    return (len(digits) == 10 and digits.startswith("3")) or (len(digits) == 12 and digits.startswith("573"))
+
+
+def _is_budget_number(folded: str, match: "re.Match[str]") -> bool:
+    before = folded[max(0, match.start() - _CONTEXT_CHARS):match.start()]
+    after = folded[match.end():match.end() + 12]
+    if _PHONE_CONTEXT_RE.search(before):
+        return False
+    has_currency = bool(match.group(1)) or bool(_CURRENCY_AFTER_RE.match(after))
+    if not has_currency and _looks_like_phone(re.sub(r"[.,]", "", match.group(2))):
+        return False
+    return has_currency or bool(_BUDGET_CONTEXT_RE.search(before))
+
+
+def extract_budget(text: str) -> Optional[int]:
+    folded = _fold(text)
+    for pattern, factor in ((_BILLION_RE, 1_000_000_000), (_MILLION_RE, 1_000_000)):
+        match = pattern.search(folded)
+        if match:
+            number = _to_number(match.group(1))
+            if number is not None:
+                return int(number * factor)
+    for match in _MILLION_SHORT_RE.finditer(folded):
+        before = folded[max(0, match.start() - _CONTEXT_CHARS):match.start()]
+        if match.group(1) or _BUDGET_CONTEXT_RE.search(before):
+            number = _to_number(match.group(2))
+            if number is not None:
+                return int(number * 1_000_000)
+    for pattern in (_GROUPED_RE, _PLAIN_RE):
+        for match in pattern.finditer(folded):
+            if _is_budget_number(folded, match):
+                return int(re.sub(r"[.,]", "", match.group(2)))
+    match = _THOUSAND_RE.search(folded)
+    if match:
+        number = _to_number(match.group(1))
+        if number is not None:
+            return int(number * 1_000)
+    return None
+
+
+def extract_tipo_propiedad(text: str) -> Tuple[Optional[str], int]:
+    """
+    Return the canonical type and how many distinct types were mentioned.
+    """
+    folded = _fold(text)
+    found: List[str] = []
+    consumed = folded
+    for keyword, canonical in _TIPO_KEYWORDS:
+        pattern = r"\b" + re.escape(keyword) + r"s?\b"
+        if re.search(pattern, consumed):
+            consumed = re.sub(pattern, " ", consumed)
+            if canonical not in found:
+                found.append(canonical)
+    return (found[0] if found else None), len(found)
+
+
+def extract_urgencia(text: str) -> Optional[str]:
+    folded = _fold(text)
+    for level in ("baja", "alta", "media"):
+        if any(phrase in folded for phrase in _URGENCY_PHRASES[level]):
+            return level
+    if re.search(r"\bya\b", folded):
+        return "alta"
+    return None
+
+
+def extract_zona(text: str) -> Optional[str]:
+    for match in _ZONA_RE.finditer(text):
+        zona = match.group(1).strip()
+        if _fold(zona.split()[0]) not in _ZONA_STOPWORDS:
+            return zona
+    return None
+
+
+def extract_intencion(text: str) -> Optional[str]:
+    folded = _fold(text)
+    for fragment, label in _INTENT_PHRASES:
+        if fragment in folded:
+            return label
+    return None
+
+
+def _score(
+    presupuesto: Optional[int],
+    zona: Optional[str],
+    tipo: Optional[str],
+    urgencia: Optional[str],
+    intencion: Optional[str],
+) -> str:
+    if presupuesto and zona and intencion and urgencia in {"alta", "media"}:
+        return "A"
+    if urgencia == "baja" and not presupuesto:
+        return "C"
+    if presupuesto or tipo:
+        return "B"
+    return "C"
+
+
+def classify(message: str) -> RuleResult:
+    """
+    Return a payload with the same keys the LLM produces plus a confidence in [0, 1].
+    Confidence is only high for messages that are trivially classifiable.
+    """
+    text = (message or "").strip()
+    folded = _fold(text)
+    cleaned = re.sub(r"[^\w\s]", " ", folded)
+    compact = " ".join(cleaned.split())
+
+    presupuesto = extract_budget(text)
+    tipo, tipo_count = extract_tipo_propiedad(text)
+    urgencia = extract_urgencia(text)
+    zona = extract_zona(text)
+    intencion = extract_intencion(text)
+    lead_score = _score(presupuesto, zona, tipo, urgencia, intencion)
+
+    payload: Dict[str, Any] = {
+        "presupuesto": presupuesto,
+        "zona": zona,
+        "tipo_propiedad": tipo,
+        "urgencia": urgencia or "media",
+        "lead_score": lead_score,
+        "intencion_real": intencion,
+        "razonamiento": "Clasificado por reglas deterministas",
+    }
+
+    if not compact:
+        return payload, 0.0
+
+    if compact in _GREETINGS:
+        payload["intencion_real"] = None
+        payload["razonamiento"] = "Saludo sin datos; se requiere más información"
+        return payload, 0.95
+
+    word_count = len(compact.split())
+    if word_count > MAX_TRIVIAL_WORDS or _NEGATION_RE.search(folded) or "?" in text or tipo_count > 1:
+        # Mensajes largos, con negaciones, preguntas o varios tipos: mejor que decida el LLM.
+        return payload, 0.3
+
+    if urgencia == "baja" and not presupuesto and not zona:
+        payload["razonamiento"] = "Solo explorando, sin presupuesto ni urgencia"
+        return payload, 0.9
+
+    if presupuesto and zona and tipo and intencion and urgencia in {"alta", "media"}:
+        payload["razonamiento"] = "Presupuesto, zona, tipo y urgencia explícitos"
+        return payload, 0.9
+
+    signals = sum(1 for value in (presupuesto, zona, tipo, urgencia, intencion) if value)
+    return payload, round(0.1 + 0.12 * signals, 2)
+
+
+class RuleStats:
+    """
+    Runtime counters: how much traffic is served without the LLM.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.evaluated = 0
+        self.served = 0
+
+    def record(self, served: bool) -> None:
+        with self._lock:
+            self.evaluated += 1
+            if served:
+                self.served += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "evaluated": self.evaluated,
+                "served_without_llm": self.served,
+                "served_ratio": round(self.served / self.evaluated, 4) if self.evaluated else 0.0,
+            }
+
+
+rule_stats = RuleStats()
+
+
+def evaluate(corpus: Iterable[Dict[str, Any]], min_confidence: float = DEFAULT_MIN_CONFIDENCE) -> Dict[str, Any]:
+    """
+    Measure coverage and agreement against a labeled corpus.
+    Each item: {"mensaje": str, "expected": {"lead_score": ..., "tipo_propiedad": ..., ...}}.
+    """
+    total = 0
+    covered = 0
+    agreed = 0
+    field_hits: Dict[str, int] = {}
+    field_total: Dict[str, int] = {}
+    disagreements: List[Dict[str, Any]] = []
+
+    for item in corpus:
+        total += 1
+        payload, confidence = classify(item.get("mensaje", ""))
+        if confidence < min_confidence:
+            continue
+        covered += 1
+        expected = item.get("expected") or {}
+        if payload["lead_score"] == expected.get("lead_score"):
+            agreed += 1
+        elif len(disagreements) < 20:
+            disagreements.append({"mensaje": item.get("mensaje"), "got": payload, "expected": expected})
+        for field, value in expected.items():
+            if field == "lead_score":
+                continue
+            field_total[field] = field_total.get(field, 0) + 1
+            if payload.get(field) == value:
+                field_hits[field] = field_hits.get(field, 0) + 1
+
+    return {
+        "total": total,
+        "served_without_llm": covered,
+        "coverage": round(covered / total, 4) if total else 0.0,
+        "agreement": round(agreed / covered, 4) if covered else 0.0,
+        "field_agreement": {
+            field: round(field_hits.get(field, 0) / count, 4) for field, count in field_total.items()
+        },
+        "disagreements": disagreements,
+    }
+
+
+def _load_corpus(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+if __name__ == "__main__":
+    # python -m services.agent.rules corpus.jsonl [min_confidence]
+    if len(sys.argv) < 2:
+        print("uso: python -m services.agent.rules <corpus.jsonl> [min_confidence]")
+        sys.exit(1)
+    threshold = float(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_MIN_CONFIDENCE
+    print(json.dumps(evaluate(_load_corpus(sys.argv[1]), threshold), ensure_ascii=False, indent=2))
@@ -0,0 +1,95 @@
+"""
+Async runtime helpers for LLM calls: per-provider concurrency limits,
+timeouts and cancellation when the client goes away.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+from core.config import settings
+
+T = TypeVar("T")
+
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _limit_for(provider: str) -> int:
+    limits = {
+        "openai": settings.llm_max_concurrency,
+        "gemini": settings.gemini_max_concurrency,
+    }
+    return max(1, limits.get(provider, settings.llm_max_concurrency))
+
+
+@asynccontextmanager
+async def llm_slot(provider: str) -> AsyncIterator[None]:
+    """
+    Bound the number of in-flight calls per LLM provider inside this worker.
+    """
+    semaphore = _semaphores.get(provider)
+    if semaphore is None:
+        semaphore = _semaphores.setdefault(provider, asyncio.Semaphore(_limit_for(provider)))
+    async with semaphore:
+        yield
+
+
+async def call_with_timeout(awaitable: Awaitable[T], timeout: Optional[float] = None) -> T:
+    seconds = settings.llm_timeout_seconds if timeout is None else timeout
+    if not seconds or seconds <= 0:
+        return await awaitable
+    return await asyncio.wait_for(awaitable, timeout=seconds)
+
+
+async def iter_with_timeout(stream: AsyncIterable[T], timeout: Optional[float] = None) -> AsyncIterator[T]:
+    """
+    Iterate a streamed response with the LLM timeout applied to every chunk:
+    `call_with_timeout` only covers opening the stream, and a stalled stream would hold its `llm_slot`.
+    """
+    seconds = settings.llm_timeout_seconds if timeout is None else timeout
+    iterator = stream.__aiter__()
+    try:
+        while True:
+            try:
+                if not seconds or seconds <= 0:
+                    item = await iterator.__anext__()
+                else:
+                    item = await asyncio.wait_for(iterator.__anext__(), timeout=seconds)
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class ClientDisconnected(Exception):
+    """
+    Raised when the HTTP client disconnects before the work finished.
+    """
+
+
+async def cancel_on_disconnect(
+    awaitable: Awaitable[T],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    *,
+    poll_interval: float = 0.5,
+) -> T:
+    """
+    Run `awaitable` and cancel it if `is_disconnected()` reports the client left.
+    """
+    task: "asyncio.Task[Any]" = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await is_disconnected():
+                task.cancel()
+                raise ClientDisconnected()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
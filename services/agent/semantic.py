@@ -0,0 +1,219 @@
+"""
+Semantic property matching with hashed n-gram vectors.
+Sin modelo externo: palabras y trigramas de caracteres (sin tildes) se proyectan
+con hashing firmado a un vector fijo y normalizado. Cada agencia tiene su matriz
+NumPy; el top-k es un producto matriz-vector (o matriz-matriz en lote) y, con
+`SEMANTIC_LSH_BITS > 0`, un índice LSH de hiperplanos reduce los candidatos.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.config import settings
+from utils.scoring import score_property
+from utils.text import tokenize
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se usa el ranker por reglas
+    np = None
+
+Doc = Dict[str, Any]
+Match = Tuple[Doc, float]
+
+PROPERTY_FIELDS = ("title", "property_type", "location", "area", "description")
+
+
+def semantic_available() -> bool:
+    return np is not None
+
+
+def _bucket(feature: str, dim: int) -> Tuple[int, float]:
+    # hash estable entre procesos (hash() de Python cambia por proceso)
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % dim, 1.0 if (value >> 63) & 1 else -1.0
+
+
+def _features(text: str) -> Counter:
+    features: Counter = Counter()
+    for token in tokenize(text):
+        features[f"w:{token}"] += 1.0
+        padded = f"^{token}$"
+        for start in range(len(padded) - 2):
+            features[f"c:{padded[start:start + 3]}"] += 0.5
+    return features
+
+
+class HashedNgramEmbedder:
+    def __init__(self, dim: int = 512) -> None:
+        self.dim = dim
+        self._bucket_cache: Dict[str, Tuple[int, float]] = {}
+
+    def embed(self, text: str) -> "np.ndarray":
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in _features(text).items():
+            cached = self._bucket_cache.get(feature)
+            if cached is None:
+                cached = _bucket(feature, self.dim)
+                if len(self._bucket_cache) < 200_000:
+                    self._bucket_cache[feature] = cached
+            index, sign = cached
+            weight = 1.0 + math.log(count) if count >= 1 else count  # tf sublineal
+            vector[index] += sign * weight
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def embed_many(self, texts: Sequence[str]) -> "np.ndarray":
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([self.embed(text) for text in texts])
+
+
+def property_text(prop: Doc) -> str:
+    return " ".join(str(prop.get(field) or "") for field in PROPERTY_FIELDS)
+
+
+def lead_text(result: Dict[str, Any]) -> str:
+    parts = [result.get("intencion_real"), result.get("tipo_propiedad"), result.get("zona")]
+    return " ".join(str(part) for part in parts if part)
+
+
+def blend(matches: Iterable[Match], criteria: Dict[str, Any], *, weight: float, k: int) -> List[Doc]:
+    """
+    Re-score cosine candidates with the rule score (utils.scoring), dropping out-of-budget ones.
+    """
+    ranked = []
+    for prop, similarity in matches:
+        rule_score = score_property(prop, **criteria)
+        if rule_score >= 0:
+            ranked.append((rule_score + weight * 100 * similarity, prop))
+    ranked.sort(key=lambda tup: tup[0], reverse=True)
+    return [prop for _, prop in ranked[:k]]
+
+
+class _HyperplaneLSH:
+    """
+    Random-hyperplane LSH (cosine). Several tables; a query probes its bucket in each.
+    """
+
+    def __init__(self, matrix: "np.ndarray", bits: int, tables: int, seed: int = 13) -> None:
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((tables, bits, matrix.shape[1])).astype(np.float32)
+        self.weights = (1 << np.arange(bits)).astype(np.int64)
+        self.buckets: List[Dict[int, List[int]]] = []
+        for table in range(tables):
+            keys = ((matrix @ self.planes[table].T) > 0).astype(np.int64) @ self.weights
+            buckets: Dict[int, List[int]] = defaultdict(list)
+            for row, key in enumerate(keys.tolist()):
+                buckets[key].append(row)
+            self.buckets.append(buckets)
+
+    def candidates(self, vector: "np.ndarray") -> "np.ndarray":
+        rows: set = set()
+        for table, buckets in enumerate(self.buckets):
+            key = int(((self.planes[table] @ vector) > 0).astype(np.int64) @ self.weights)
+            rows.update(buckets.get(key, ()))
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+
+class AgencyVectorIndex:
+    def __init__(self, docs: Sequence[Doc], embedder: HashedNgramEmbedder, *, lsh_bits: int = 0, lsh_tables: int = 4) -> None:
+        self.docs = list(docs)
+        self.embedder = embedder
+        self.matrix = embedder.embed_many([property_text(doc) for doc in self.docs])
+        self.lsh = _HyperplaneLSH(self.matrix, lsh_bits, lsh_tables) if lsh_bits > 0 and len(self.docs) else None
+        self.built_at = time.monotonic()
+
+    def top_k(self, vector: "np.ndarray", k: int, *, approximate: bool = True) -> List[Match]:
+        if not self.docs:
+            return []
+        rows: Optional["np.ndarray"] = None
+        if approximate and self.lsh is not None:
+            rows = self.lsh.candidates(vector)
+            if len(rows) < k:
+                rows = None  # muy pocos candidatos: búsqueda exacta
+        sub = self.matrix if rows is None else self.matrix[rows]
+        scores = sub @ vector
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        mapped = best if rows is None else rows[best]
+        return [(self.docs[int(row)], float(scores[pos])) for row, pos in zip(mapped, best)]
+
+    def top_k_batch(self, vectors: "np.ndarray", k: int) -> List[List[Match]]:
+        """
+        Exact top-k for many queries at once: one matrix product instead of a loop.
+        """
+        if not self.docs or not len(vectors):
+            return [[] for _ in range(len(vectors))]
+        scores = vectors @ self.matrix.T
+        k = min(k, scores.shape[1])
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results: List[List[Match]] = []
+        for row, candidates in enumerate(best):
+            ordered = candidates[np.argsort(-scores[row, candidates])]
+            results.append([(self.docs[int(col)], float(scores[row, col])) for col in ordered])
+        return results
+
+
+class SemanticMatcher:
+    """
+    Per-agency vector indexes, rebuilt lazily after a TTL or an explicit invalidation.
+    """
+
+    def __init__(self, *, dim: int = 512, ttl_seconds: int = 600, lsh_bits: int = 0, lsh_tables: int = 4) -> None:
+        self.embedder = HashedNgramEmbedder(dim) if semantic_available() else None
+        self.ttl_seconds = ttl_seconds
+        self.lsh_bits = lsh_bits
+        self.lsh_tables = lsh_tables
+        self._indexes: Dict[Any, AgencyVectorIndex] = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.queries = 0
+
+    def index_for(self, agency_id: Optional[int], loader: Callable[[], Iterable[Doc]]) -> AgencyVectorIndex:
+        index = self._indexes.get(agency_id)
+        if index is not None and (not self.ttl_seconds or time.monotonic() - index.built_at <= self.ttl_seconds):
+            return index
+        with self._lock:
+            index = self._indexes.get(agency_id)
+            if index is None or (self.ttl_seconds and time.monotonic() - index.built_at > self.ttl_seconds):
+                index = AgencyVectorIndex(list(loader()), self.embedder, lsh_bits=self.lsh_bits, lsh_tables=self.lsh_tables)
+                self._indexes[agency_id] = index
+                self.builds += 1
+        return index
+
+    def invalidate(self, agency_id: Optional[int] = None) -> None:
+        with self._lock:
+            self._indexes.pop(agency_id, None)
+            self._indexes.pop(None, None)  # el índice global también cambió
+
+    def rank(self, text: str, agency_id: Optional[int], loader: Callable[[], Iterable[Doc]], k: int) -> List[Match]:
+        if self.embedder is None or not text.strip():
+            return []
+        self.queries += 1
+        return self.index_for(agency_id, loader).top_k(self.embedder.embed(text), k)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.embedder is not None,
+            "indexes": len(self._indexes),
+            "documents": sum(len(index.docs) for index in self._indexes.values()),
+            "builds": self.builds,
+            "queries": self.queries,
+        }
+
+
+semantic_matcher = SemanticMatcher(
+    dim=settings.semantic_dim,
+    ttl_seconds=settings.semantic_index_ttl_seconds,
+    lsh_bits=settings.semantic_lsh_bits,
+    lsh_tables=settings.semantic_lsh_tables,
+)
@@ -0,0 +1,186 @@
+"""
+Recall/latency benchmark for property recommendations.
+Catálogo sintético y leads cuya intención parafrasea una propiedad objetivo
+(rasgos del texto libre, sin tildes, zona y tipo a veces omitidos):
+
+    python -m services.agent.semantic_bench --properties 20000 --leads 500 --lsh-bits 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from services.agent.semantic import AgencyVectorIndex, HashedNgramEmbedder, blend, semantic_available
+from utils.scoring import score_property
+
+Doc = Dict[str, Any]
+Lead = Tuple[str, Dict[str, Any], Any]
+
+ZONES = ["Centro", "Norte", "Sur", "Chapinero", "El Poblado", "Laureles", "Cabecera", "Versalles", "Bocagrande", "Torobajo"]
+TYPES = ["apartamento", "casa", "apartaestudio", "local", "finca", "oficina"]
+FEATURES = [
+    ("piscina", "con piscina"),
+    ("balcón amplio", "balcon grande"),
+    ("vista a la montaña", "que tenga vista a las montanas"),
+    ("cerca a la universidad", "cerca de la universidad"),
+    ("conjunto cerrado con vigilancia", "en conjunto cerrado"),
+    ("chimenea", "con chimenea"),
+    ("terraza privada", "terraza"),
+    ("cocina integral", "cocina integral"),
+    ("admite mascotas", "que acepten mascotas"),
+    ("gimnasio", "con gimnasio"),
+    ("estudio independiente", "con estudio"),
+    ("patio trasero", "con patio"),
+    ("remodelado", "remodelada"),
+    ("iluminación natural", "bien iluminado"),
+]
+
+
+def build_catalog(size: int, rng: random.Random) -> List[Doc]:
+    catalog = []
+    for pid in range(size):
+        zone = rng.choice(ZONES)
+        kind = rng.choice(TYPES)
+        features = rng.sample(FEATURES, 3)
+        catalog.append(
+            {
+                "id": pid,
+                "title": f"{kind.capitalize()} en {zone}",
+                "property_type": kind,
+                "location": zone,
+                "area": zone,
+                "description": ", ".join(original for original, _ in features),
+                "price": rng.randrange(80, 900) * 1_000_000,
+                "bedrooms": rng.randint(1, 5),
+                "bathrooms": rng.randint(1, 3),
+                "parking": rng.random() < 0.5,
+                "_features": features,
+            }
+        )
+    return catalog
+
+
+def build_leads(catalog: List[Doc], count: int, rng: random.Random) -> List[Lead]:
+    leads = []
+    for target in rng.sample(catalog, count):
+        phrases = [paraphrase for _, paraphrase in target["_features"]]
+        kind = target["property_type"] if rng.random() < 0.7 else None
+        zone = target["location"] if rng.random() < 0.7 else None
+        intent = f"Busco {kind or 'algo'} {' y '.join(phrases[:2])}"
+        criteria = {
+            "budget": target["price"] * rng.uniform(0.9, 1.1),
+            "zona": zone,
+            "tipo": kind,
+            "bedrooms": target["bedrooms"],
+            "bathrooms": None,
+            "parking": None,
+        }
+        text = " ".join(part for part in (intent, kind, zone) if part)
+        leads.append((text, criteria, target["id"]))
+    return leads
+
+
+def _filtered(catalog: List[Doc], criteria: Dict[str, Any]) -> List[Doc]:
+    # mismo filtro que PropertyRepository.list_filtered en _recommend_properties
+    budget, zona, tipo, bedrooms = criteria["budget"], criteria["zona"], criteria["tipo"], criteria["bedrooms"]
+    return [
+        prop
+        for prop in catalog
+        if (not zona or zona.lower() in prop["location"].lower())
+        and (not tipo or prop["property_type"] == tipo)
+        and (not budget or budget * 0.5 <= prop["price"] <= budget * 1.8)
+        and (not bedrooms or prop["bedrooms"] >= bedrooms)
+    ]
+
+
+def rank_rules(catalog: List[Doc], criteria: Dict[str, Any], k: int) -> List[Doc]:
+    ranked = []
+    for prop in _filtered(catalog, criteria):
+        score = score_property(prop, **criteria)
+        if score >= 0:
+            ranked.append((score, prop))
+    ranked.sort(key=lambda tup: tup[0], reverse=True)
+    return [prop for _, prop in ranked[:k]]
+
+
+def run_ranker(name: str, leads: List[Lead], rank: Callable[[str, Dict[str, Any]], List[Doc]]) -> Dict[str, Any]:
+    hits = 0
+    latencies: List[float] = []
+    for text, criteria, target in leads:
+        started = time.perf_counter()
+        top = rank(text, criteria)
+        latencies.append(time.perf_counter() - started)
+        hits += any(prop["id"] == target for prop in top)
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e3, 3)
+
+    return {"ranker": name, "recall": round(hits / len(leads), 3), "p50_ms": pct(0.50), "p95_ms": pct(0.95)}
+
+
+def lsh_overlap(index: AgencyVectorIndex, embedder: HashedNgramEmbedder, leads: List[Lead], k: int) -> float:
+    """
+    Fraction of the exact cosine top-k that the LSH path also returns.
+    """
+    found = total = 0
+    for text, _, _ in leads:
+        vector = embedder.embed(text)
+        exact = {prop["id"] for prop, _ in index.top_k(vector, k, approximate=False)}
+        approx = {prop["id"] for prop, _ in index.top_k(vector, k)}
+        found += len(exact & approx)
+        total += len(exact)
+    return round(found / total, 3) if total else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--properties", type=int, default=20_000)
+    parser.add_argument("--leads", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5, help="recomendaciones por lead")
+    parser.add_argument("--candidates", type=int, default=50, help="candidatos coseno antes del re-score")
+    parser.add_argument("--weight", type=float, default=0.5)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--lsh-bits", type=int, default=8)
+    parser.add_argument("--lsh-tables", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if not semantic_available():
+        raise SystemExit("NumPy no está instalado")
+
+    rng = random.Random(args.seed)
+    catalog = build_catalog(args.properties, rng)
+    leads = build_leads(catalog, args.leads, rng)
+    embedder = HashedNgramEmbedder(args.dim)
+
+    started = time.perf_counter()
+    exact_index = AgencyVectorIndex(catalog, embedder)
+    print("index_build", {"documents": len(catalog), "seconds": round(time.perf_counter() - started, 3)})
+    lsh_index = AgencyVectorIndex(catalog, embedder, lsh_bits=args.lsh_bits, lsh_tables=args.lsh_tables)
+
+    def semantic(index: AgencyVectorIndex) -> Callable[[str, Dict[str, Any]], List[Doc]]:
+        def rank(text: str, criteria: Dict[str, Any]) -> List[Doc]:
+            matches = index.top_k(embedder.embed(text), args.candidates)
+            return blend(matches, criteria, weight=args.weight, k=args.k)
+
+        return rank
+
+    print(run_ranker("rules", leads, lambda _, criteria: rank_rules(catalog, criteria, args.k)))
+    print(run_ranker("semantic-exact", leads, semantic(exact_index)))
+    if args.lsh_bits > 0:
+        print(run_ranker("semantic-lsh", leads, semantic(lsh_index)))
+        print("lsh_overlap", {"k": args.candidates, "overlap": lsh_overlap(lsh_index, embedder, leads, args.candidates)})
+
+    vectors = embedder.embed_many([text for text, _, _ in leads])
+    started = time.perf_counter()
+    exact_index.top_k_batch(vectors, args.candidates)
+    elapsed = time.perf_counter() - started
+    print("batch_top_k", {"leads": len(leads), "seconds": round(elapsed, 3), "per_lead_ms": round(elapsed / len(leads) * 1e3, 3)})
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,12 @@ Analytics service that pulls lead and interaction data from Supabase.
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 from db.supabase_client import get_supabase_client
 from repositories.interaction_repository import LeadInteractionRepository
 from repositories.lead_repository import LeadRepository
+from utils.notes import ROLLOVER_CHANNEL
 from utils.scoring import interest_from_category
 
 
@@ -41,7 +42,7 @@ class AnalyticsService:
         lead_ids: Optional[List[int]] = None
         if channel:
             interactions = self.interaction_repo.list_filtered(
-                channel=channel, from_date=from_date, to_date=to_date
+                channel=channel, exclude_channel=ROLLOVER_CHANNEL, from_date=from_date, to_date=to_date
             )
             lead_ids = list({int(item["lead_id"]) for item in interactions if item.get("lead_id") is not None})
             if not lead_ids:
@@ -61,8 +62,9 @@ class AnalyticsService:
         if not lead_id_list:
             return {}, set()
 
+        # las notas movidas a lead_interactions no son un canal de contacto
         interactions = self.interaction_repo.list_filtered(
-            lead_ids=lead_id_list, from_date=from_date, to_date=to_date
+            lead_ids=lead_id_list, exclude_channel=ROLLOVER_CHANNEL, from_date=from_date, to_date=to_date
         )
 
         channel_by_lead: Dict[int, str] = {}
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
-import json
 from typing import Any, Dict, Optional, Tuple
 
 from db.supabase_client import get_supabase_client
 from repositories.interaction_repository import LeadInteractionRepository
 from repositories.lead_repository import LeadRepository
 from repositories.property_repository import PropertyRepository
+from services.interaction_queue import record_interaction
+from services.lead_matches import lead_matches
+from utils.preferences import decode_preferences, merge_preferences, split_legacy_notes
 from utils.scoring import calculate_intent_score, interest_from_category
 
 
@@ -36,34 +38,7 @@ class ChatService:
         self.property_repo = PropertyRepository(supabase)
 
     def _find_lead(self, email: Optional[str], phone: Optional[str], user_id: Optional[int], agency_id: Optional[int]):
-        if user_id:
-            found = self.lead_repo.find_by_user(user_id, agency_id)
-            if found:
-                return found
-        if phone:
-            found = self.lead_repo.find_by_phone(phone, agency_id)
-            if found:
-                return found
-        if email:
-            found = self.lead_repo.find_by_email(email, agency_id)
-            if found:
-                return found
-        return None
-
-    def _merge_notes(self, existing: Optional[str], payload: Dict[str, Any]) -> str:
-        """
-        Guarda preferencias en JSON dentro de notes para no perder compatibilidad.
-        """
-        base = {}
-        if existing:
-            try:
-                base = json.loads(existing)
-            except Exception:
-                base = {"raw": existing}
-        prefs = base.get("preferences", {})
-        prefs.update(payload)
-        base["preferences"] = prefs
-        return json.dumps(base, ensure_ascii=False)
+        return self.lead_repo.find_by_contact(user_id=user_id, phone=phone, email=email, agency_id=agency_id)
 
     def save_preferences(
         self,
@@ -107,12 +82,18 @@ class ChatService:
             "property_id": property_id,
             "property_title": property_ref.get("title") if property_ref else None,
         }
-        payload["notes"] = self._merge_notes((existing or {}).get("notes"), notes_pref)
+        preferences = merge_preferences(decode_preferences(existing) if existing else {}, notes_pref)
+        if preferences:
+            payload["preferences"] = preferences
+        legacy, free_text = split_legacy_notes((existing or {}).get("notes"))
+        if legacy is not None:
+            # el JSON de notes pasa a la columna; notes vuelve a ser solo texto
+            payload["notes"] = free_text
 
         properties_for_score = []
         if payload.get("agency_id"):
             try:
-                properties_for_score = self.property_repo.list(payload.get("agency_id"))
+                properties_for_score = self.property_repo.list_records(payload.get("agency_id"))
             except Exception:
                 properties_for_score = []
         score, category = calculate_intent_score(
@@ -124,21 +105,19 @@ class ChatService:
         payload["intent_score"] = score
         payload["category"] = getattr(category, "value", category)
 
-        lead_record = existing
-        if existing:
-            lead_record = self.lead_repo.update(existing["id"], payload)
-        else:
-            lead_record = self.lead_repo.create(payload)
+        lead_record = self.lead_repo.upsert_by_contact(payload, existing_id=(existing or {}).get("id"))
+        lead_matches.submit(lead_matches.lead_saved, lead_record)
 
-        # registrar interacción
+        # registrar interacción (write-behind, no bloquea la respuesta)
         try:
-            self.interaction_repo.create(
+            record_interaction(
                 {
                     "lead_id": lead_record["id"],
                     "channel": canal or "web",
                     "direction": "inbound",
                     "message": mensaje,
-                }
+                },
+                self.interaction_repo,
             )
         except Exception:
             # no bloquear por logging
@@ -151,5 +130,5 @@ class ChatService:
             "intent_score": lead_record.get("intent_score"),
             "is_interested": interested,
             "interest_level": level,
-            "preferences": notes_pref,
+            "preferences": preferences or None,
         }
@@ -1,8 +1,12 @@
 # conversational_service.py
+import asyncio
+import json
+import logging
 import os
-from typing import Optional, Dict, Any
+from typing import Any, AsyncIterator, Dict, Optional, Set
 import google.generativeai as genai
-from services.agent.lead_agent import LeadAgentService
+from services.agent.lead_agent import LeadAgentService, analyze_lead_message_async, complete_result
+from services.agent.runtime import call_with_timeout, iter_with_timeout, llm_slot
 
 GEMINI_KEY = os.environ.get("GEMINI_KEY")
 GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
@@ -12,6 +16,15 @@ if not GEMINI_KEY:
 
 genai.configure(api_key=GEMINI_KEY)
 
+logger = logging.getLogger(__name__)
+
+# referencias fuertes a las tareas de persistencia en segundo plano
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _event(kind: str, **data: Any) -> str:
+    return json.dumps({"type": kind, **data}, ensure_ascii=False, default=str) + "\n"
+
 
 class ConversationalAgentService:
     def __init__(self):
@@ -78,3 +91,49 @@ class ConversationalAgentService:
             "lead_analysis": result,
             "reply": reply
         }
+
+    async def stream_reply(
+        self,
+        user_message: str,
+        contact_key: Optional[str] = None,
+        lead_payload: Optional[Dict] = None,
+    ) -> AsyncIterator[str]:
+        """
+        NDJSON stream: lead analysis first, then Gemini tokens as they arrive.
+        Lead/interaction persistence runs in background and is reported at the end.
+        """
+        if lead_payload is None:
+            lead_payload = {"mensaje": user_message, "contacto": contact_key}
+
+        result = complete_result(await analyze_lead_message_async(user_message, history_key=contact_key))
+        persist_task = asyncio.create_task(
+            asyncio.to_thread(self.lead_agent.persist_analysis, lead_payload, dict(result))
+        )
+        _background_tasks.add(persist_task)
+        persist_task.add_done_callback(_background_tasks.discard)
+
+        yield _event("lead_analysis", lead_analysis=result)
+
+        user_prompt = self._build_user_prompt(user_message, result)
+        try:
+            async with llm_slot("gemini"):
+                response = await call_with_timeout(self.model.generate_content_async(user_prompt, stream=True))
+                async for chunk in iter_with_timeout(response):
+                    text = getattr(chunk, "text", "")
+                    if text:
+                        yield _event("token", text=text)
+        except Exception as exc:
+            logger.error("Gemini stream failed: %s", exc, exc_info=True)
+            yield _event("error", detail="No se pudo generar la respuesta")
+
+        # la persistencia normalmente ya terminó mientras se enviaban los tokens
+        try:
+            persisted = await asyncio.shield(persist_task)
+            yield _event(
+                "lead",
+                lead_id=persisted.get("lead_id"),
+                recommendations=persisted.get("recommendations"),
+            )
+        except Exception as exc:
+            logger.error("Background lead persistence failed: %s", exc, exc_info=True)
+        yield _event("done")
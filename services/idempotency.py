@@ -0,0 +1,154 @@
+"""
+Idempotent processing of inbound messages.
+WhatsApp y n8n reenvían webhooks: dentro de la ventana configurada el mismo
+mensaje devuelve la respuesta guardada en vez de repetir LLM, upsert e interacciones.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from core.config import settings
+
+T = TypeVar("T")
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def _hash(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def derive_key(
+    scope: str,
+    *,
+    channel: Optional[str],
+    contact: Optional[str],
+    message: Optional[str],
+    tenant: Optional[Any] = None,
+) -> str:
+    normalized = " ".join((message or "").lower().split())
+    return _hash(
+        scope, str(tenant if tenant is not None else ""), (channel or "").lower().strip(),
+        (contact or "").strip().lower(), normalized,
+    )
+
+
+def resolve_key(
+    scope: str,
+    header_value: Optional[str],
+    *,
+    channel: Optional[str],
+    contact: Optional[str],
+    message: Optional[str],
+    tenant: Optional[Any] = None,
+) -> Optional[str]:
+    """
+    Prefer the client supplied Idempotency-Key; otherwise hash tenant + channel + contact + message.
+    Both are scoped by tenant (agencia) and contact so a caller never replays another caller's answer.
+    None (sin deduplicación) when there is neither a header nor a contact: two anonymous
+    "Hola" are different conversations.
+    """
+    contact_key = (contact or "").strip().lower()
+    tenant_key = str(tenant if tenant is not None else "")
+    if header_value and header_value.strip():
+        return f"{scope}:hdr:{_hash(tenant_key, contact_key, header_value.strip())}"
+    if not contact_key:
+        return None
+    return f"{scope}:msg:{derive_key(scope, channel=channel, contact=contact, message=message, tenant=tenant)}"
+
+
+class IdempotencyStore:
+    """
+    Bounded time-window store. Concurrent duplicates wait for the in-flight
+    request instead of running the pipeline twice. Failures are not remembered.
+    Scope is the current worker process (one event loop).
+    """
+
+    def __init__(self, *, ttl_seconds: int = 120, max_entries: int = 10_000) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._done: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self.replays = 0
+        self.executions = 0
+
+    def _lookup(self, key: str) -> Tuple[bool, Any]:
+        entry = self._done.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= time.monotonic():
+            self._done.pop(key, None)
+            return False, None
+        return True, entry[1]
+
+    def _remember(self, key: str, value: Any) -> None:
+        self._done[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._done.move_to_end(key)
+        while len(self._done) > self.max_entries:
+            self._done.popitem(last=False)
+
+    async def run(self, key: Optional[str], factory: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Return (result, replayed). `factory` only runs for the first delivery in the window;
+        with no key (mensaje anónimo) it always runs.
+        """
+        if key is None or self.ttl_seconds <= 0:
+            return await factory(), False
+
+        found, value = self._lookup(key)
+        if found:
+            self.replays += 1
+            return value, True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                value = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if inflight.cancelled():
+                    # el primer request se canceló (cliente desconectado): este lo reintenta
+                    return await self.run(key, factory)
+                raise
+            self.replays += 1
+            return value, True
+
+        future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # evita "exception was never retrieved" si nadie más esperaba
+            future.exception()
+            raise
+        else:
+            self.executions += 1
+            self._remember(key, value)
+            future.set_result(value)
+            return value, False
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._done),
+            "inflight": len(self._inflight),
+            "ttl_seconds": self.ttl_seconds,
+            "executions": self.executions,
+            "replays": self.replays,
+        }
+
+
+idempotency_store = IdempotencyStore(
+    ttl_seconds=settings.idempotency_ttl_seconds,
+    max_entries=settings.idempotency_max_entries,
+)
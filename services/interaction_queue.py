@@ -0,0 +1,241 @@
+"""
+Write-behind queue for `lead_interactions`.
+Las interacciones no afectan la respuesta: se encolan y un hilo las inserta en
+bloque por tamaño o tiempo; si el lote falla se reintenta fila por fila. Con
+`INTERACTION_SPILL_PATH` las filas que no se pudieron escribir (o no caben en
+memoria) se guardan en disco y se reintentan al arrancar.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Row = Dict[str, Any]
+
+
+def _default_writer(rows: List[Row]) -> None:
+    from db.supabase_client import get_supabase_client
+    from repositories.interaction_repository import LeadInteractionRepository
+
+    LeadInteractionRepository(get_supabase_client()).create_many(rows)
+
+
+class InteractionWriteBehind:
+    def __init__(
+        self,
+        *,
+        writer: Callable[[List[Row]], None] = _default_writer,
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        max_pending: int = 10_000,
+        spill_path: Optional[str] = None,
+    ) -> None:
+        self._writer = writer
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+        self.spill_path = spill_path
+        self._pending: Deque[Row] = deque()
+        self._cond = threading.Condition()
+        self._spill_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.written = 0
+        self.batches = 0
+        self.spilled = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="interaction-write-behind", daemon=True)
+            self._thread.start()
+        self._replay_spill()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Flush everything pending; called on graceful shutdown.
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        leftover = self._drain(len(self._pending))
+        if leftover:
+            self._spill(leftover)
+
+    def enqueue(self, row: Row) -> None:
+        if self._thread is None:
+            self.start()
+        overflow: Optional[Row] = None
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                overflow = self._pending.popleft()
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        if overflow is not None:
+            self._spill([overflow])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "written": self.written,
+            "batches": self.batches,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "spill_path": self.spill_path,
+        }
+
+    def _drain(self, limit: int) -> List[Row]:
+        with self._cond:
+            count = min(limit, len(self._pending))
+            return [self._pending.popleft() for _ in range(count)]
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._stopping and len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                stopping = self._stopping
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    break
+                self._write(batch)
+                if not stopping and len(batch) < self.batch_size:
+                    break
+            if stopping:
+                return
+
+    def _write(self, batch: List[Row]) -> None:
+        try:
+            self._writer(batch)
+            self.written += len(batch)
+            self.batches += 1
+            return
+        except Exception as exc:
+            logger.error("Bulk insert of %s interactions failed, retrying row by row: %s", len(batch), exc)
+        # una fila mala (p. ej. FK de un lead recién borrado) no arrastra al resto del lote
+        failed: List[Row] = []
+        for row in batch:
+            try:
+                self._writer([row])
+                self.written += 1
+            except Exception as exc:
+                logger.warning("Interaction insert failed for lead %s: %s", row.get("lead_id"), exc)
+                failed.append(row)
+        self.batches += 1
+        if failed:
+            self._spill(failed)
+
+    def _spill(self, rows: List[Row]) -> None:
+        if not self.spill_path:
+            self.dropped += len(rows)
+            logger.warning("Dropping %s interactions (no spill path configured)", len(rows))
+            return
+        try:
+            with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as handle:
+                for row in rows:
+                    handle.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            self.spilled += len(rows)
+        except OSError as exc:
+            self.dropped += len(rows)
+            logger.error("Could not spill %s interactions to %s: %s", len(rows), self.spill_path, exc)
+
+    def _replay_spill(self) -> None:
+        if not self.spill_path:
+            return
+        replay_path = f"{self.spill_path}.replay"
+        if not os.path.exists(replay_path) and not os.path.exists(self.spill_path):
+            return
+        threading.Thread(
+            target=self._replay_files, args=(replay_path,), name="interaction-spill-replay", daemon=True
+        ).start()
+
+    def _replay_files(self, replay_path: str) -> None:
+        # un .replay que quedó de un arranque interrumpido va primero; luego el spill actual
+        if os.path.exists(replay_path):
+            self._replay_file(replay_path)
+        with self._spill_lock:
+            try:
+                os.replace(self.spill_path, replay_path)
+            except OSError:
+                return
+        self._replay_file(replay_path)
+
+    def _replay_file(self, replay_path: str) -> None:
+        """
+        Write the spilled rows directly (failures go back to the spill) and only then delete the file.
+        Lines that do not parse, e.g. cut off by a crash, go to `<spill>.bad` instead of blocking startup.
+        """
+        rows: List[Row] = []
+        bad: List[str] = []
+        try:
+            with open(replay_path, encoding="utf-8") as handle:
+                for line in handle:
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        row = None
+                    if isinstance(row, dict):
+                        rows.append(row)
+                    else:
+                        bad.append(line.rstrip("\n") + "\n")
+        except OSError as exc:
+            logger.error("Could not read spilled interactions from %s: %s", replay_path, exc)
+            return
+        if bad:
+            logger.warning("Quarantining %s unreadable spilled interactions to %s.bad", len(bad), self.spill_path)
+            try:
+                with open(f"{self.spill_path}.bad", "a", encoding="utf-8") as handle:
+                    handle.writelines(bad)
+            except OSError as exc:
+                logger.error("Could not quarantine spilled interactions: %s", exc)
+                return
+
+        logger.info("Replaying %s spilled interactions", len(rows))
+        for start in range(0, len(rows), self.batch_size):
+            self._write(rows[start : start + self.batch_size])
+        os.remove(replay_path)
+
+interaction_writer = InteractionWriteBehind(
+    batch_size=settings.interaction_batch_size,
+    flush_interval=settings.interaction_flush_seconds,
+    max_pending=settings.interaction_max_pending,
+    spill_path=settings.interaction_spill_path,
+)
+
+
+def record_interaction(row: Row, repo: Any = None) -> None:
+    """
+    Queue an interaction row, or insert it right away when the queue is disabled.
+    """
+    if settings.interaction_queue_enabled:
+        interaction_writer.enqueue(row)
+    elif repo is not None:
+        repo.create(row)
+    else:
+        _default_writer([row])
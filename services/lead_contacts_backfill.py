@@ -0,0 +1,82 @@
+"""
+Backfill of `leads.phone`/`leads.email` to the canonical form of `normalize_contact`.
+Hay que correrlo antes de crear los índices únicos por contacto: las filas viejas
+guardan emails con mayúsculas y teléfonos con espacios o guiones, y sin normalizar
+`find_by_contact` no las encuentra y el upsert crea un lead duplicado. Reporta
+los leads que, ya normalizados, comparten contacto dentro de la misma agencia
+(ver "Leads: upsert por contacto" en el README para fusionarlos):
+
+    python -m services.lead_contacts_backfill --batch-size 500 --dry-run
+"""
+
+from __future__ import annotations
+
+import argparse
+from typing import Any, Dict, Optional, Tuple
+
+from db.supabase_client import get_supabase_client
+from repositories.lead_repository import LeadRepository, normalize_contact
+
+
+def backfill_contacts(
+    repo: LeadRepository,
+    *,
+    batch_size: int = 500,
+    agency_id: Optional[int] = None,
+    dry_run: bool = False,
+    max_duplicates: int = 200,
+) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"scanned": 0, "normalized": 0, "failed": 0, "duplicates": 0, "duplicate_rows": []}
+    # (agency_id, campo, valor normalizado) -> id del lead más viejo con ese contacto
+    seen: Dict[Tuple[Any, str, str], int] = {}
+    after_id = 0
+    while True:
+        rows = repo.list_contacts(after_id=after_id, limit=batch_size, agency_id=agency_id)
+        if not rows:
+            break
+        for row in rows:
+            after_id = row["id"]
+            report["scanned"] += 1
+            phone, email = normalize_contact(row.get("phone"), row.get("email"))
+            for field, value in (("phone", phone), ("email", email)):
+                if not value:
+                    continue
+                keep_id = seen.setdefault((row.get("agency_id"), field, value), row["id"])
+                if keep_id != row["id"]:
+                    report["duplicates"] += 1
+                    if len(report["duplicate_rows"]) < max_duplicates:
+                        report["duplicate_rows"].append(
+                            {"agency_id": row.get("agency_id"), field: value, "keep_id": keep_id, "duplicate_id": row["id"]}
+                        )
+
+            changes = {}
+            if phone != row.get("phone"):
+                changes["phone"] = phone
+            if email != row.get("email"):
+                changes["email"] = email
+            if not changes:
+                continue
+            if dry_run:
+                report["normalized"] += 1
+                continue
+            try:
+                repo.update(row["id"], changes)
+                report["normalized"] += 1
+            except Exception:
+                report["failed"] += 1  # p. ej. el índice único ya existe y hay un duplicado
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--agency-id", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="solo cuenta, no escribe")
+    args = parser.parse_args()
+
+    repo = LeadRepository(get_supabase_client())
+    print(backfill_contacts(repo, batch_size=args.batch_size, agency_id=args.agency_id, dry_run=args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
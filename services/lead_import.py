@@ -0,0 +1,220 @@
+"""
+Bulk lead import from CSV or NDJSON uploads.
+Las filas se leen en streaming, se validan contra `LeadCreate` una por una y se
+insertan por lotes; el catálogo para el scoring se descarga una sola vez.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, UploadFile, status
+from pydantic import ValidationError
+
+from core.config import settings
+from core.domain import UserRole
+from core.security import resolve_role
+from db.supabase_client import get_supabase_client
+from repositories.lead_repository import LeadRepository, is_unique_violation, normalize_contact
+from repositories.post_repository import PostRepository
+from repositories.property_repository import PropertyRepository
+from schemas.lead import LeadCreate
+from services.lead_matches import lead_matches
+from utils.scoring import calculate_intent_score
+
+RawRow = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+_NO_POST = object()
+
+
+def _detect_format(upload: UploadFile, requested: Optional[str]) -> str:
+    if requested:
+        fmt = requested.lower()
+    else:
+        name = (upload.filename or "").lower()
+        content_type = (upload.content_type or "").lower()
+        if name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type or "jsonl" in content_type:
+            fmt = "ndjson"
+        else:
+            fmt = "csv"
+    if fmt not in {"csv", "ndjson"}:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Formato no soportado (csv o ndjson)")
+    return fmt
+
+
+def _clean(row: Dict[str, Any]) -> Dict[str, Any]:
+    cleaned: Dict[str, Any] = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if value == "":
+                value = None
+        cleaned[key.strip()] = value
+    return cleaned
+
+
+def iter_rows(upload: UploadFile, fmt: str) -> Iterator[RawRow]:
+    """
+    Yield (row_number, row, parse_error) without loading the file in memory.
+    """
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            for row in reader:
+                # row_number = línea del archivo (1 es el encabezado)
+                yield reader.line_num, _clean(row), None
+        else:
+            for number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    parsed = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    yield number, None, f"JSON inválido: {exc.msg}"
+                    continue
+                if not isinstance(parsed, dict):
+                    yield number, None, "Cada línea debe ser un objeto JSON"
+                    continue
+                yield number, _clean(parsed), None
+    finally:
+        text.detach()
+
+
+def _validation_message(exc: ValidationError) -> str:
+    parts = []
+    for error in exc.errors():
+        location = ".".join(str(item) for item in error.get("loc", ()))
+        parts.append(f"{location}: {error.get('msg')}")
+    return "; ".join(parts)
+
+
+class LeadImportService:
+    def __init__(self):
+        supabase = get_supabase_client()
+        self.lead_repo = LeadRepository(supabase)
+        self.property_repo = PropertyRepository(supabase)
+        self.post_repo = PostRepository(supabase)
+
+    def import_leads(
+        self,
+        upload: UploadFile,
+        current_user,
+        *,
+        agency_id: Optional[int] = None,
+        fmt: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        resolved_agency = current_user.get("agency_id")
+        if resolve_role(current_user) == UserRole.superadmin.value:
+            resolved_agency = agency_id or resolved_agency
+        if not resolved_agency:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Se requiere agency_id para importar leads")
+        file_format = _detect_format(upload, fmt)
+
+        # una sola descarga del catálogo para puntuar todo el archivo
+        catalog = self.property_repo.list_records(resolved_agency)
+        # post_id -> agencia del post (_NO_POST si no existe)
+        known_posts: Dict[str, Any] = {}
+        seen_contacts: Set[Tuple[str, str]] = set()
+        batch_size = max(1, settings.lead_import_batch_size)
+        max_errors = max(0, settings.lead_import_max_errors)
+
+        batch: List[Dict[str, Any]] = []
+        batch_rows: List[int] = []
+        report: Dict[str, Any] = {"processed": 0, "imported": 0, "failed": 0, "errors": [], "errors_truncated": False}
+
+        def fail(row_number: int, message: str) -> None:
+            report["failed"] += 1
+            if len(report["errors"]) < max_errors:
+                report["errors"].append({"row": row_number, "error": message})
+            else:
+                report["errors_truncated"] = True
+
+        def flush() -> None:
+            if not batch:
+                return
+            try:
+                created = self.lead_repo.create_many(batch)
+            except Exception:
+                # un contacto ya existente hace fallar el lote entero: se reintenta fila por fila
+                created = []
+                for row_number, payload in zip(batch_rows, batch):
+                    try:
+                        created.append(self.lead_repo.create(payload))
+                    except Exception as exc:
+                        if is_unique_violation(exc):
+                            fail(row_number, "Ya existe un lead con ese teléfono o email")
+                        else:
+                            fail(row_number, f"Error al insertar: {exc}")
+            report["imported"] += len(created)
+            for lead in created:
+                lead_matches.submit(lead_matches.lead_saved, lead)
+            batch.clear()
+            batch_rows.clear()
+
+        for row_number, raw, parse_error in iter_rows(upload, file_format):
+            report["processed"] += 1
+            if parse_error or raw is None:
+                fail(row_number, parse_error or "Fila vacía")
+                continue
+            # celdas vacías -> se aplican los defaults del schema
+            raw = {key: value for key, value in raw.items() if value is not None}
+            raw["agency_id"] = resolved_agency
+            try:
+                lead_in = LeadCreate(**raw)
+            except ValidationError as exc:
+                fail(row_number, _validation_message(exc))
+                continue
+
+            if lead_in.post_id:
+                if lead_in.post_id not in known_posts:
+                    post = self.post_repo.get(lead_in.post_id)
+                    known_posts[lead_in.post_id] = (post.get("company_id") or post.get("agency_id")) if post else _NO_POST
+                post_agency = known_posts[lead_in.post_id]
+                if post_agency is _NO_POST:
+                    fail(row_number, "post_id no encontrado")
+                    continue
+                # igual que LeadService.create_lead: el lead queda en la agencia del post
+                if post_agency is not None and str(post_agency) != str(resolved_agency):
+                    fail(row_number, "post_id pertenece a otra agencia")
+                    continue
+
+            # misma forma canónica que upsert_by_contact, para que los índices únicos la reconozcan
+            phone, email = normalize_contact(lead_in.phone, lead_in.email)
+            contacts = [("phone", phone)] if phone else []
+            if email:
+                contacts.append(("email", email))
+            if any(contact in seen_contacts for contact in contacts):
+                fail(row_number, "Contacto repetido en el archivo")
+                continue
+            seen_contacts.update(contacts)
+
+            urgency = getattr(lead_in.urgency, "value", lead_in.urgency)
+            score, category = calculate_intent_score(lead_in.preferred_area, lead_in.budget, urgency, catalog)
+            batch.append(
+                {
+                    "agency_id": resolved_agency,
+                    "user_id": current_user.get("id"),
+                    "full_name": lead_in.full_name,
+                    "email": email,
+                    "phone": phone,
+                    "preferred_area": lead_in.preferred_area,
+                    "budget": lead_in.budget,
+                    "urgency": urgency,
+                    "notes": lead_in.notes,
+                    "status": "new",
+                    "post_id": lead_in.post_id,
+                    "intent_score": score,
+                    "category": getattr(category, "value", category),
+                }
+            )
+            batch_rows.append(row_number)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+        return report
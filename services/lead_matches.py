@@ -0,0 +1,505 @@
+"""
+Precomputed lead <-> property matches (`lead_property_matches`).
+Por agencia se mantiene en memoria el top-k de propiedades de cada lead abierto y
+el top-k de leads de cada propiedad, con el mismo `score_property` que las
+recomendaciones. Guardar una propiedad la puntúa contra los leads abiertos de la
+agencia; guardar un lead lo puntúa contra el catálogo. Solo se puntúan los pares
+dentro del rango de presupuesto (fuera de él `score_property` devuelve -1), así
+que cada actualización recorre una ventana ordenada por precio y no todo el catálogo.
+Con `LEAD_MATCHES_PATH` las listas se copian a SQLite y las lecturas de una
+agencia que este proceso aún no cargó se sirven desde ahí. Propiedades y leads se
+guardan como records compactos (`repositories.records`), no como filas completas.
+"""
+
+from __future__ import annotations
+
+import bisect
+import heapq
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from core.config import settings
+from db.supabase_client import get_supabase_client
+from repositories.lead_repository import LeadRepository
+from repositories.property_repository import PropertyRepository
+from repositories.records import LeadRecord, PropertyRecord
+from services.reverse_match import LeadMatrix, outreach_queue, vectorized_available
+from utils.scoring import score_property
+
+logger = logging.getLogger(__name__)
+
+Row = Dict[str, Any]
+Entry = Tuple[float, Any]  # (score, id del otro lado)
+
+LEAD_SIDE = "lead"  # listas por lead: sus mejores propiedades
+PROPERTY_SIDE = "property"  # listas por propiedad: sus leads más calientes
+
+CLOSED_LEAD_STATUSES = frozenset({"closed", "won", "lost", "discarded", "cerrado", "ganado", "perdido", "descartado"})
+
+# |price - budget| / budget <= 0.6  <=>  price en [0.4 * budget, 1.6 * budget]
+_BUDGET_LOW = 0.4
+_BUDGET_HIGH = 1.6
+_EPS = 1e-9  # margen de redondeo en los bordes; score_property decide
+
+
+def is_open_lead(lead: Any) -> bool:
+    return str(lead.get("status") or "new").lower() not in CLOSED_LEAD_STATUSES
+
+
+def _property_record(prop: Any) -> PropertyRecord:
+    return prop if isinstance(prop, PropertyRecord) else PropertyRecord.from_row(prop)
+
+
+def _lead_record(lead: Any) -> LeadRecord:
+    return lead if isinstance(lead, LeadRecord) else LeadRecord.from_row(lead)
+
+
+class _SortedKeys:
+    """
+    Ids ordered by a numeric key (price or budget); ids without a key are kept apart.
+    """
+
+    def __init__(self) -> None:
+        self._keys: List[Tuple[float, str, Any]] = []
+        self._by_id: Dict[Any, float] = {}
+        self.unkeyed: Set[Any] = set()
+
+    def bulk_load(self, items: Iterable[Tuple[Any, Optional[float]]]) -> None:
+        for item_id, key in items:
+            if key is None:
+                self.unkeyed.add(item_id)
+            else:
+                self._by_id[item_id] = key
+        # str(id) desempata sin comparar ids de tipos distintos
+        self._keys = sorted((key, str(item_id), item_id) for item_id, key in self._by_id.items())
+
+    def add(self, item_id: Any, key: Optional[float]) -> None:
+        self.discard(item_id)
+        if key is None:
+            self.unkeyed.add(item_id)
+            return
+        self._by_id[item_id] = key
+        bisect.insort(self._keys, (key, str(item_id), item_id))
+
+    def discard(self, item_id: Any) -> None:
+        self.unkeyed.discard(item_id)
+        key = self._by_id.pop(item_id, None)
+        if key is not None:
+            pos = bisect.bisect_left(self._keys, (key, str(item_id)))
+            if pos < len(self._keys) and self._keys[pos][2] == item_id:
+                del self._keys[pos]
+
+    def between(self, low: float, high: float) -> List[Any]:
+        start = bisect.bisect_left(self._keys, (low,))
+        end = bisect.bisect_right(self._keys, (high, "\uffff"))
+        return [item_id for _, _, item_id in self._keys[start:end]]
+
+    def all(self) -> List[Any]:
+        return [item_id for _, _, item_id in self._keys]
+
+
+class _AgencyMatches:
+    def __init__(self) -> None:
+        self.props: Dict[Any, PropertyRecord] = {}
+        self.leads: Dict[Any, LeadRecord] = {}
+        self.prices = _SortedKeys()
+        self.budgets = _SortedKeys()
+        self.lists: Dict[str, Dict[Any, List[Entry]]] = {LEAD_SIDE: {}, PROPERTY_SIDE: {}}
+        # holders[side][other_id] = owners cuya lista de ese lado contiene a other_id
+        self.holders: Dict[str, Dict[Any, Set[Any]]] = {LEAD_SIDE: defaultdict(set), PROPERTY_SIDE: defaultdict(set)}
+        self.matrix: Optional[LeadMatrix] = None  # se reconstruye tras cambios de leads
+        self.loaded_at = time.monotonic()
+
+    def property_candidates(self, criteria: Dict[str, Any]) -> List[Any]:
+        budget = criteria.get("budget")
+        if not budget:
+            return self.prices.all() + list(self.prices.unkeyed)
+        low, high = budget * _BUDGET_LOW * (1 - _EPS), budget * _BUDGET_HIGH * (1 + _EPS)
+        return self.prices.between(low, high) + list(self.prices.unkeyed)
+
+    def lead_candidates(self, price: Optional[float]) -> List[Any]:
+        if not price:
+            return self.budgets.all() + list(self.budgets.unkeyed)
+        low, high = price / _BUDGET_HIGH * (1 - _EPS), price / _BUDGET_LOW * (1 + _EPS)
+        return self.budgets.between(low, high) + list(self.budgets.unkeyed)
+
+    def score_leads(self, prop: PropertyRecord) -> Tuple[Dict[Any, float], int]:
+        """
+        Positive scores of every open lead for one property, plus how many leads were evaluated.
+        """
+        if vectorized_available():
+            if self.matrix is None:
+                self.matrix = LeadMatrix({lid: lead.criteria() for lid, lead in self.leads.items()})
+            ids, scores = self.matrix.score(prop)
+            return dict(zip(ids.tolist(), scores.tolist())), len(self.matrix)
+        candidates = self.lead_candidates(prop.price)
+        scores: Dict[Any, float] = {}
+        for lid in candidates:
+            score = score_property(prop, **self.leads[lid].criteria())
+            if score > 0:
+                scores[lid] = score
+        return scores, len(candidates)
+
+
+class LeadPropertyMatches:
+    def __init__(self, path: Optional[str] = None, *, k: int = 10, ttl_seconds: int = 900) -> None:
+        self.path = path
+        self.k = max(1, k)
+        self.ttl_seconds = ttl_seconds
+        self._agencies: Dict[Any, _AgencyMatches] = {}
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self.loads = 0
+        self.updates = 0
+        self.lookups = 0
+        self.pairs_scored = 0
+        self.outreach_enqueued = 0
+        if path:
+            self._conn().executescript(
+                """
+                CREATE TABLE IF NOT EXISTS lead_property_matches (
+                    agency_id TEXT NOT NULL,
+                    side TEXT NOT NULL,
+                    owner_id TEXT NOT NULL,
+                    rank INTEGER NOT NULL,
+                    score REAL NOT NULL,
+                    summary TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (side, owner_id, rank)
+                );
+                CREATE INDEX IF NOT EXISTS idx_lead_property_matches_agency ON lead_property_matches (agency_id);
+                """
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _fresh(self, state: Optional[_AgencyMatches]) -> bool:
+        return state is not None and (not self.ttl_seconds or time.monotonic() - state.loaded_at <= self.ttl_seconds)
+
+    def _state(self, agency_id: Any) -> _AgencyMatches:
+        state = self._agencies.get(agency_id)
+        if self._fresh(state):
+            return state
+        with self._lock:
+            state = self._agencies.get(agency_id)
+            if not self._fresh(state):
+                state = self._load(agency_id)
+                self._agencies[agency_id] = state
+        return state
+
+    def _load(self, agency_id: Any) -> _AgencyMatches:
+        supabase = get_supabase_client()
+        props = PropertyRepository(supabase).list_records(agency_id)
+        leads = [lead for lead in LeadRepository(supabase).list_records(agency_id) if is_open_lead(lead)]
+        return self.build(agency_id, props, leads)
+
+    def build(self, agency_id: Any, props: Iterable[Any], leads: Iterable[Any]) -> _AgencyMatches:
+        """
+        Full computation for one agency: one pass per property over the leads in its budget window.
+        Accepts raw rows or records.
+        """
+        state = _AgencyMatches()
+        for prop in props:
+            record = _property_record(prop)
+            state.props[record.id] = record
+        for lead in leads:
+            record = _lead_record(lead)
+            state.leads[record.id] = record
+        state.prices.bulk_load((pid, prop.price) for pid, prop in state.props.items())
+        state.budgets.bulk_load((lid, lead.budget) for lid, lead in state.leads.items())
+
+        per_lead: Dict[Any, List[Tuple[float, int, Any]]] = defaultdict(list)
+        for seq, (pid, prop) in enumerate(state.props.items()):
+            scores, evaluated = state.score_leads(prop)
+            self.pairs_scored += evaluated
+            ranked = heapq.nlargest(self.k, ((score, lid) for lid, score in scores.items()), key=lambda e: e[0])
+            self._set_list(state, PROPERTY_SIDE, pid, ranked)
+            for lid, score in scores.items():
+                heap = per_lead[lid]
+                if len(heap) < self.k:
+                    heapq.heappush(heap, (score, -seq, pid))
+                elif score > heap[0][0]:
+                    heapq.heapreplace(heap, (score, -seq, pid))
+        for lid, heap in per_lead.items():
+            entries = sorted(((score, pid) for score, _, pid in heap), key=lambda e: e[0], reverse=True)
+            self._set_list(state, LEAD_SIDE, lid, entries)
+
+        self.loads += 1
+        if self.path:
+            self._persist_all(agency_id, state)
+        return state
+
+    def _set_list(self, state: _AgencyMatches, side: str, owner: Any, entries: List[Entry]) -> None:
+        holders = state.holders[side]
+        for _, other in state.lists[side].get(owner, ()):
+            holders[other].discard(owner)
+        if entries:
+            state.lists[side][owner] = entries
+            for _, other in entries:
+                holders[other].add(owner)
+        else:
+            state.lists[side].pop(owner, None)
+
+    def _offer(self, state: _AgencyMatches, side: str, owner: Any, other: Any, score: float) -> Tuple[bool, bool]:
+        """
+        Put (score, other) into owner's top-k. Returns (changed, needs_rescore): when `other` was in a
+        full list and its score dropped, an entry that was never kept may now rank above it.
+        """
+        current = state.lists[side].get(owner, [])
+        kept = [entry for entry in current if entry[1] != other]
+        previous = next((entry[0] for entry in current if entry[1] == other), None)
+        if previous is not None and len(current) >= self.k and score < previous:
+            return True, True
+        accepted = score > 0 and (len(kept) < self.k or score > kept[-1][0])
+        if previous is None and not accepted:
+            return False, False
+        if accepted:
+            kept.append((score, other))
+            kept.sort(key=lambda e: e[0], reverse=True)
+            kept = kept[: self.k]
+        self._set_list(state, side, owner, kept)
+        return True, False
+
+    def _rescore_lead(self, state: _AgencyMatches, lid: Any) -> None:
+        crit = state.leads[lid].criteria()
+        candidates = state.property_candidates(crit)
+        scored = []
+        for pid in candidates:
+            score = score_property(state.props[pid], **crit)
+            if score > 0:
+                scored.append((score, pid))
+        self.pairs_scored += len(candidates)
+        self._set_list(state, LEAD_SIDE, lid, heapq.nlargest(self.k, scored, key=lambda e: e[0]))
+
+    def _rescore_property(self, state: _AgencyMatches, pid: Any) -> None:
+        scores, evaluated = state.score_leads(state.props[pid])
+        self.pairs_scored += evaluated
+        ranked = heapq.nlargest(self.k, ((score, lid) for lid, score in scores.items()), key=lambda e: e[0])
+        self._set_list(state, PROPERTY_SIDE, pid, ranked)
+
+    def property_saved(self, prop: Row, *, notify: bool = False) -> None:
+        """
+        Score a saved property against the agency's open leads; with `notify` (new listing)
+        the leads above OUTREACH_MIN_SCORE go to the outreach queue.
+        """
+        agency_id, pid = prop.get("agency_id"), prop.get("id")
+        if agency_id is None or pid is None:
+            return
+        with self._lock:
+            state = self._state(agency_id)
+            record = _property_record(prop)
+            state.props[pid] = record
+            state.prices.add(pid, record.price)
+            dirty: Set[Tuple[str, Any]] = {(PROPERTY_SIDE, pid)}
+
+            scores, evaluated = state.score_leads(record)
+            self.pairs_scored += evaluated
+            # también los leads que ya la tenían aunque ahora queden fuera de la ventana de presupuesto
+            for lid in dict.fromkeys([*state.holders[LEAD_SIDE].get(pid, ()), *scores]):
+                changed, rescore = self._offer(state, LEAD_SIDE, lid, pid, scores.get(lid, 0.0))
+                if rescore:
+                    self._rescore_lead(state, lid)
+                if changed or rescore:
+                    dirty.add((LEAD_SIDE, lid))
+            ranked = heapq.nlargest(self.k, ((score, lid) for lid, score in scores.items()), key=lambda e: e[0])
+            self._set_list(state, PROPERTY_SIDE, pid, ranked)
+            self.updates += 1
+            self._persist(agency_id, state, dirty)
+        if notify:
+            interested = heapq.nlargest(
+                settings.outreach_max_per_property,
+                ((lid, score) for lid, score in scores.items() if score >= settings.outreach_min_score),
+                key=lambda e: e[1],
+            )
+            self.outreach_enqueued += outreach_queue.enqueue_many(agency_id, pid, interested)
+
+    def property_removed(self, agency_id: Any, pid: Any) -> None:
+        if agency_id is None:
+            return
+        # aunque no esté en memoria (p. ej. tras reiniciar), la cola no debe seguir ofreciéndola
+        outreach_queue.dismiss(agency_id, property_id=pid)
+        with self._lock:
+            state = self._state(agency_id)
+            if pid not in state.props:
+                return
+            dirty: Set[Tuple[str, Any]] = {(PROPERTY_SIDE, pid)}
+            del state.props[pid]
+            state.prices.discard(pid)
+            self._set_list(state, PROPERTY_SIDE, pid, [])
+            for lid in list(state.holders[LEAD_SIDE].get(pid, ())):
+                self._rescore_lead(state, lid)
+                dirty.add((LEAD_SIDE, lid))
+            state.holders[LEAD_SIDE].pop(pid, None)
+            self.updates += 1
+            self._persist(agency_id, state, dirty)
+
+    def lead_saved(self, lead: Row) -> None:
+        agency_id, lid = lead.get("agency_id"), lead.get("id")
+        if agency_id is None or lid is None:
+            return
+        if not is_open_lead(lead):
+            self.lead_removed(agency_id, lid)
+            return
+        with self._lock:
+            state = self._state(agency_id)
+            record = _lead_record(lead)
+            crit = record.criteria()
+            state.leads[lid] = record
+            state.budgets.add(lid, record.budget)
+            state.matrix = None
+            dirty: Set[Tuple[str, Any]] = {(LEAD_SIDE, lid)}
+
+            candidates = state.property_candidates(crit)
+            scores: Dict[Any, float] = {}
+            for pid in candidates:
+                score = score_property(state.props[pid], **crit)
+                if score > 0:
+                    scores[pid] = score
+            self.pairs_scored += len(candidates)
+            for pid in dict.fromkeys([*state.holders[PROPERTY_SIDE].get(lid, ()), *scores]):
+                changed, rescore = self._offer(state, PROPERTY_SIDE, pid, lid, scores.get(pid, 0.0))
+                if rescore:
+                    self._rescore_property(state, pid)
+                if changed or rescore:
+                    dirty.add((PROPERTY_SIDE, pid))
+            ranked = heapq.nlargest(self.k, ((score, pid) for pid, score in scores.items()), key=lambda e: e[0])
+            self._set_list(state, LEAD_SIDE, lid, ranked)
+            self.updates += 1
+            self._persist(agency_id, state, dirty)
+
+    def lead_removed(self, agency_id: Any, lid: Any) -> None:
+        if agency_id is None:
+            return
+        # lead cerrado o borrado: no se contacta por propiedades pendientes
+        outreach_queue.dismiss(agency_id, lead_id=lid)
+        with self._lock:
+            state = self._state(agency_id)
+            dirty: Set[Tuple[str, Any]] = {(LEAD_SIDE, lid)}
+            if state.leads.pop(lid, None) is None:
+                self._persist(agency_id, state, dirty)
+                return
+            state.budgets.discard(lid)
+            state.matrix = None
+            self._set_list(state, LEAD_SIDE, lid, [])
+            for pid in list(state.holders[PROPERTY_SIDE].get(lid, ())):
+                self._rescore_property(state, pid)
+                dirty.add((PROPERTY_SIDE, pid))
+            state.holders[PROPERTY_SIDE].pop(lid, None)
+            self.updates += 1
+            self._persist(agency_id, state, dirty)
+
+    def submit(self, handler: Callable[..., None], *args: Any, **kwargs: Any) -> None:
+        """
+        Run an update on the single background worker (keeps per-agency order, off the request).
+        """
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lead-matches")
+
+        def run() -> None:
+            try:
+                handler(*args, **kwargs)
+            except Exception as exc:
+                logger.error("Lead match update failed: %s", exc, exc_info=True)
+
+        self._executor.submit(run)
+
+    def _lookup(self, side: str, agency_id: Any, owner: Any, limit: Optional[int]) -> List[Row]:
+        self.lookups += 1
+        limit = min(limit or self.k, self.k)
+        state = self._agencies.get(agency_id)
+        if not self._fresh(state) and self.path:
+            rows = self._conn().execute(
+                "SELECT score, summary FROM lead_property_matches WHERE side = ? AND owner_id = ? ORDER BY rank LIMIT ?",
+                (side, str(owner), limit),
+            ).fetchall()
+            if rows:
+                return [{**json.loads(summary), "score": score} for score, summary in rows]
+        if state is None or not self._fresh(state):
+            state = self._state(agency_id)
+        others = state.props if side == LEAD_SIDE else state.leads
+        return [
+            {**others[other].to_dict(), "score": score}
+            for score, other in state.lists[side].get(owner, [])[:limit]
+            if other in others
+        ]
+
+    def best_properties(self, agency_id: Any, lead_id: Any, limit: Optional[int] = None) -> List[Row]:
+        return self._lookup(LEAD_SIDE, agency_id, lead_id, limit)
+
+    def hottest_leads(self, agency_id: Any, property_id: Any, limit: Optional[int] = None) -> List[Row]:
+        return self._lookup(PROPERTY_SIDE, agency_id, property_id, limit)
+
+    def _rows(self, agency_id: Any, state: _AgencyMatches, side: str, owner: Any) -> List[Tuple[Any, ...]]:
+        others = state.props if side == LEAD_SIDE else state.leads
+        now = time.time()
+        return [
+            (str(agency_id), side, str(owner), rank, score, json.dumps(others[other].to_dict(), ensure_ascii=False, default=str), now)
+            for rank, (score, other) in enumerate(state.lists[side].get(owner, []))
+            if other in others
+        ]
+
+    def _persist(self, agency_id: Any, state: _AgencyMatches, dirty: Set[Tuple[str, Any]]) -> None:
+        if not self.path or not dirty:
+            return
+        rows = [row for side, owner in dirty for row in self._rows(agency_id, state, side, owner)]
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "DELETE FROM lead_property_matches WHERE side = ? AND owner_id = ?",
+                [(side, str(owner)) for side, owner in dirty],
+            )
+            conn.executemany("INSERT INTO lead_property_matches VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _persist_all(self, agency_id: Any, state: _AgencyMatches) -> None:
+        rows = [
+            row
+            for side in (LEAD_SIDE, PROPERTY_SIDE)
+            for owner in state.lists[side]
+            for row in self._rows(agency_id, state, side, owner)
+        ]
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM lead_property_matches WHERE agency_id = ?", (str(agency_id),))
+            conn.executemany("INSERT INTO lead_property_matches VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def stats(self) -> Dict[str, Any]:
+        agencies = list(self._agencies.values())
+        return {
+            "persistent": bool(self.path),
+            "k": self.k,
+            "agencies": len(agencies),
+            "leads": sum(len(state.leads) for state in agencies),
+            "properties": sum(len(state.props) for state in agencies),
+            "loads": self.loads,
+            "updates": self.updates,
+            "lookups": self.lookups,
+            "pairs_scored": self.pairs_scored,
+            "vectorized": vectorized_available(),
+            "outreach_enqueued": self.outreach_enqueued,
+        }
+
+
+lead_matches = LeadPropertyMatches(
+    settings.lead_matches_path,
+    k=settings.lead_matches_k,
+    ttl_seconds=settings.lead_matches_ttl_seconds,
+)
@@ -0,0 +1,61 @@
+"""
+Backfill of `leads.preferences` from the legacy JSON-in-notes format.
+Mueve las preferencias a la columna y deja en notes solo el texto libre:
+
+    python -m services.lead_preferences_backfill --batch-size 500 --dry-run
+"""
+
+from __future__ import annotations
+
+import argparse
+from typing import Any, Dict, Optional
+
+from db.supabase_client import get_supabase_client
+from repositories.lead_repository import LeadRepository
+from utils.preferences import clean_preferences, split_legacy_notes
+
+
+def backfill_preferences(
+    repo: LeadRepository,
+    *,
+    batch_size: int = 500,
+    agency_id: Optional[int] = None,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    report = {"scanned": 0, "migrated": 0, "skipped": 0, "failed": 0}
+    after_id = 0
+    while True:
+        rows = repo.list_legacy_preferences(after_id=after_id, limit=batch_size, agency_id=agency_id)
+        if not rows:
+            break
+        for row in rows:
+            after_id = row["id"]
+            report["scanned"] += 1
+            legacy, free_text = split_legacy_notes(row.get("notes"))
+            if legacy is None:
+                report["skipped"] += 1  # texto libre que empieza con "{"
+                continue
+            if dry_run:
+                report["migrated"] += 1
+                continue
+            try:
+                repo.update(row["id"], {"preferences": clean_preferences(legacy) or None, "notes": free_text})
+                report["migrated"] += 1
+            except Exception:
+                report["failed"] += 1
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--agency-id", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="solo cuenta, no escribe")
+    args = parser.parse_args()
+
+    repo = LeadRepository(get_supabase_client())
+    print(backfill_preferences(repo, batch_size=args.batch_size, agency_id=args.agency_id, dry_run=args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,8 +11,10 @@ from repositories.post_repository import PostRepository
 from repositories.property_repository import PropertyRepository
 from schemas.interaction import LeadInteractionCreate
 from schemas.lead import LeadCreate, LeadUpdate
+from services.lead_matches import lead_matches
+from services.reverse_match import outreach_queue
+from utils.preferences import clean_preferences, decode_preferences
 from utils.scoring import calculate_intent_score
-import json
 
 
 class LeadService:
@@ -36,21 +38,12 @@ class LeadService:
 
     def _parse_preferences(self, lead: dict):
         """
-        Extrae preferencias persistidas como JSON en notes (compatibilidad con chatbot progresivo).
+        Preferencias de la columna `preferences`; filas sin migrar se leen del JSON en notes (cacheado).
         """
-        preferences = None
-        raw_notes = lead.get("notes")
-        if raw_notes:
-            try:
-                parsed = json.loads(raw_notes)
-                if isinstance(parsed, dict):
-                    preferences = parsed.get("preferences", parsed)
-            except Exception:
-                preferences = None
-        lead["preferences"] = preferences
+        lead["preferences"] = decode_preferences(lead) or None
 
     def _recalculate(self, lead_dict: dict):
-        properties = self.property_repo.list(lead_dict.get("agency_id"))
+        properties = self.property_repo.list_records(lead_dict.get("agency_id"))
         urgency_val = lead_dict.get("urgency")
         if hasattr(urgency_val, "value"):
             urgency_val = urgency_val.value
@@ -90,8 +83,12 @@ class LeadService:
             "status": "new",
             "post_id": lead_in.post_id,
         }
+        if lead_in.preferences:
+            lead_payload["preferences"] = clean_preferences(lead_in.preferences.model_dump()) or None
         self._recalculate(lead_payload)
-        return self.lead_repo.create(lead_payload)
+        created = self.lead_repo.create(lead_payload)
+        lead_matches.submit(lead_matches.lead_saved, created)
+        return created
 
     def update_lead(self, lead_id: int, lead_in: LeadUpdate, current_user) -> dict:
         scope = self._scope(current_user)
@@ -107,11 +104,17 @@ class LeadService:
             if not post:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
             updates["agency_id"] = post.get("company_id") or post.get("agency_id")
+        if updates.get("preferences") is not None:
+            updates["preferences"] = clean_preferences(updates["preferences"]) or None
         merged = {**lead, **updates}
         if any(field in updates for field in ["preferred_area", "budget", "urgency"]):
             self._recalculate(merged)
         updates.update({"intent_score": merged.get("intent_score"), "category": merged.get("category")})
-        return self.lead_repo.update(lead_id, updates)
+        updated = self.lead_repo.update(lead_id, updates)
+        lead_matches.submit(lead_matches.lead_saved, {**lead, **updated})
+        if updated.get("agency_id") != lead.get("agency_id"):
+            lead_matches.submit(lead_matches.lead_removed, lead.get("agency_id"), lead_id)
+        return updated
 
     def list_leads(self, current_user):
         scope = self._scope(current_user)
@@ -135,6 +138,31 @@ class LeadService:
         if not lead:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Lead not found")
         self.lead_repo.delete(lead_id)
+        lead_matches.submit(lead_matches.lead_removed, lead.get("agency_id"), lead_id)
+
+    def get_lead_matches(self, lead_id: int, current_user, limit: int = 10):
+        """
+        Best properties for a lead from the precomputed match table (no catalog scan).
+        """
+        scope = self._scope(current_user)
+        lead = self.lead_repo.get(lead_id, scope["agency_id"], scope["user_id"])
+        if not lead:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Lead not found")
+        return lead_matches.best_properties(lead.get("agency_id"), lead_id, limit)
+
+    def list_outreach(self, current_user, limit: int = 50):
+        """
+        Pending outreach: open leads matched to newly published properties, best score first.
+        """
+        scope = self._scope(current_user)
+        if scope["user_id"] is not None:
+            return []
+        return outreach_queue.pending(scope["agency_id"], limit)
+
+    def update_outreach(self, outreach_id: int, new_status: str, current_user) -> None:
+        scope = self._scope(current_user)
+        if scope["user_id"] is not None or not outreach_queue.mark(outreach_id, new_status, scope["agency_id"]):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Outreach item not found")
 
     def add_interaction(self, lead_id: int, interaction_in: LeadInteractionCreate, current_user):
         lead = self.get_lead(lead_id, current_user)
@@ -0,0 +1,138 @@
+"""
+Image derivatives (thumbnail + web) generated at upload time.
+El redimensionado corre en un ProcessPoolExecutor para no competir por el GIL
+con el servidor; las variantes se guardan junto al original como
+`<nombre>__thumb.jpg` / `<nombre>__web.jpg`. Sin Pillow instalado se omiten.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from core.config import settings
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow es opcional
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+VariantSpec = Tuple[str, int, int]  # (nombre, lado máximo en px, calidad JPEG)
+Variants = Dict[str, bytes]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def variant_specs() -> List[VariantSpec]:
+    return [
+        ("thumb", settings.media_thumb_max_px, settings.media_thumb_quality),
+        ("web", settings.media_web_max_px, settings.media_web_quality),
+    ]
+
+
+def derivatives_available() -> bool:
+    return Image is not None and settings.media_derivatives_enabled
+
+
+def derivative_path(object_path: str, variant: str) -> str:
+    stem, _ = os.path.splitext(object_path)
+    return f"{stem}__{variant}.jpg"
+
+
+def render_variants(content: bytes, specs: Sequence[VariantSpec]) -> Optional[Variants]:
+    """
+    Worker-side: decode once, then resize/compress each variant. Returns None if the image can't be decoded.
+    """
+    try:
+        with Image.open(io.BytesIO(content)) as source:
+            image = ImageOps.exif_transpose(source)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            rendered: Variants = {}
+            for name, max_px, quality in specs:
+                copy = image.copy()
+                copy.thumbnail((max_px, max_px), Image.LANCZOS)
+                buffer = io.BytesIO()
+                copy.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+                rendered[name] = buffer.getvalue()
+            return rendered
+    except Exception:
+        return None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=max(1, settings.media_derivative_workers))
+    return _pool
+
+
+def generate_variants(loaders: Sequence[Optional[Callable[[], bytes]]]) -> List[Optional[Variants]]:
+    """
+    Render variants for every image in parallel; entries are None when skipped or undecodable.
+    Each image is read only when a worker slot frees up (at most 2 per worker in flight), so a
+    large batch never holds every original in memory at once.
+    """
+    results: List[Optional[Variants]] = [None] * len(loaders)
+    if not derivatives_available() or not loaders:
+        return results
+    specs = variant_specs()
+    pool = _get_pool()
+    limit = max(1, settings.media_derivative_workers) * 2
+    inflight: Deque[Tuple[int, "Future[Optional[Variants]]"]] = deque()
+
+    def collect() -> None:
+        index, future = inflight.popleft()
+        try:
+            results[index] = future.result(timeout=settings.media_derivative_timeout_seconds)
+        except Exception as exc:
+            logger.warning("Image derivative generation failed: %s", exc)
+
+    for index, load in enumerate(loaders):
+        if load is None:
+            continue
+        while len(inflight) >= limit:
+            collect()
+        try:
+            content = load()
+        except Exception:
+            continue  # el error real aparece al subir el original
+        if content:
+            inflight.append((index, pool.submit(render_variants, content, specs)))
+        content = None  # el buffer queda solo en la cola del pool hasta que se envía
+    while inflight:
+        collect()
+    return results
+
+
+def render_derivative(load: Callable[[], bytes], variant: str) -> bytes:
+    """
+    Render one variant on demand, for a derivative the index listed but storage no longer has.
+    """
+    specs = [spec for spec in variant_specs() if spec[0] == variant]
+    if not specs or not derivatives_available():
+        raise ValueError(f"Variante no disponible: {variant}")
+    rendered = _get_pool().submit(render_variants, load(), specs).result(
+        timeout=settings.media_derivative_timeout_seconds
+    )
+    if not rendered:
+        raise ValueError(f"No se pudo generar la variante {variant}")
+    return rendered[variant]
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,113 @@
+"""
+Local index of content-addressed objects already in storage.
+Los objetos se nombran por el sha256 de su contenido, así que saber que una
+ruta existe basta para reutilizar su URL sin volver a subir los bytes.
+Con `MEDIA_INDEX_PATH` el índice vive en SQLite (WAL) y lo comparten los
+workers del host; sin él es un LRU en memoria del proceso.
+Solo el rollback de `MediaUploader` quita entradas: si un objeto se borra de
+storage por otro camino (consola, script, otro host), el índice sigue
+devolviendo su URL hasta que se borre la entrada (o el archivo del índice).
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from core.config import settings
+
+
+class MediaHashIndex:
+    def __init__(self, path: Optional[str] = None, *, max_entries: int = 100_000) -> None:
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self._memory: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self._conn().executescript(
+                """
+                CREATE TABLE IF NOT EXISTS media_objects (
+                    bucket TEXT NOT NULL,
+                    object_path TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    size INTEGER,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (bucket, object_path)
+                );
+                """
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, bucket: str, object_path: str) -> Optional[str]:
+        if self.path:
+            row = self._conn().execute(
+                "SELECT url FROM media_objects WHERE bucket = ? AND object_path = ?", (bucket, object_path)
+            ).fetchone()
+            url = row[0] if row else None
+        else:
+            with self._lock:
+                url = self._memory.get((bucket, object_path))
+                if url is not None:
+                    self._memory.move_to_end((bucket, object_path))
+        if url is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return url
+
+    def put(self, bucket: str, object_path: str, url: str, size: Optional[int] = None) -> None:
+        if self.path:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO media_objects (bucket, object_path, url, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                (bucket, object_path, url, size, time.time()),
+            )
+            return
+        with self._lock:
+            self._memory[(bucket, object_path)] = url
+            self._memory.move_to_end((bucket, object_path))
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def discard(self, bucket: str, object_paths: Iterable[str]) -> None:
+        paths = list(object_paths)
+        if not paths:
+            return
+        if self.path:
+            self._conn().executemany(
+                "DELETE FROM media_objects WHERE bucket = ? AND object_path = ?", [(bucket, path) for path in paths]
+            )
+            return
+        with self._lock:
+            for path in paths:
+                self._memory.pop((bucket, path), None)
+
+    def stats(self) -> Dict[str, Any]:
+        if self.path:
+            entries = self._conn().execute("SELECT COUNT(*) FROM media_objects").fetchone()[0]
+        else:
+            entries = len(self._memory)
+        lookups = self.hits + self.misses
+        return {
+            "backend": "sqlite" if self.path else "memory",
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+media_index = MediaHashIndex(settings.media_index_path, max_entries=settings.media_index_max_entries)
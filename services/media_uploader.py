@@ -0,0 +1,377 @@
+"""
+Shared media upload pipeline for Supabase Storage.
+Las subidas corren en paralelo con un pool acotado, la URL pública se arma
+localmente a partir del bucket y la ruta, el orden de salida respeta el de
+entrada y, si algo falla, se eliminan los objetos que creó ese lote. Los archivos
+grandes van por la API resumable (TUS) en bloques de tamaño fijo. Las rutas se
+derivan del sha256 del contenido: lo que ya está en storage no se vuelve a subir.
+"""
+
+from __future__ import annotations
+
+import base64
+import io
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+from urllib.parse import quote
+
+import httpx
+from fastapi import UploadFile
+
+from core.config import settings
+from services.media_derivatives import (
+    derivative_path,
+    derivatives_available,
+    generate_variants,
+    render_derivative,
+    variant_specs,
+)
+from services.media_index import media_index
+from utils.media import (
+    MEDIA_CONTENT_TYPES,
+    content_object_path,
+    file_size,
+    read_head,
+    sniff_media_type,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class MediaUploadError(Exception):
+    """Raised when an upload batch fails; already uploaded objects were removed."""
+
+
+class _AlreadyStored(Exception):
+    """The object path already exists in storage (TUS create answered 409)."""
+
+
+class MediaItem(NamedTuple):
+    object_path: str
+    open: Callable[[], BinaryIO]
+    content_type: str = "application/octet-stream"
+    label: str = ""
+    size: Optional[int] = None
+
+
+UploadResult = Union[str, Exception]
+PhotoVariants = Optional[Dict[str, str]]
+ImageResult = Union[Tuple[str, PhotoVariants], Exception]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# rutas en uso por lotes en curso de este proceso: un rollback no borra lo que otro lote reutiliza
+_claims: Counter = Counter()
+_claims_lock = threading.Lock()
+
+
+def _claim(paths: Sequence[str]) -> None:
+    with _claims_lock:
+        _claims.update(set(paths))
+
+
+def _release(paths: Sequence[str]) -> None:
+    with _claims_lock:
+        for path in set(paths):
+            _claims[path] -= 1
+            if _claims[path] <= 0:
+                del _claims[path]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # un único pool por proceso: el límite aplica a todos los requests a la vez
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, settings.media_upload_workers), thread_name_prefix="media-upload"
+                )
+    return _executor
+
+
+def _is_duplicate(exc: Exception) -> bool:
+    if isinstance(exc, _AlreadyStored):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 409:
+        return True
+    # storage3 guarda el código en el payload del error
+    status_code = getattr(exc, "status", None) or getattr(exc, "status_code", None) or getattr(exc, "statusCode", None)
+    if str(status_code) == "409":
+        return True
+    text = str(exc).lower()
+    return "duplicate" in text or "already exists" in text
+
+
+def item_from_upload(owner_id: int, upload: UploadFile, default_name: str = "file") -> MediaItem:
+    def _open() -> BinaryIO:
+        upload.file.seek(0)
+        return upload.file
+
+    content_type = upload.content_type
+    if not content_type or content_type == "application/octet-stream":
+        kind = sniff_media_type(read_head(upload.file))
+        content_type = MEDIA_CONTENT_TYPES.get(kind or "", "application/octet-stream")
+    return MediaItem(
+        object_path=content_object_path(owner_id, upload.file, upload.filename or default_name),
+        open=_open,
+        content_type=content_type,
+        label=upload.filename or default_name,
+    )
+
+
+class MediaUploader:
+    def __init__(self, supabase: Any, bucket: Optional[str] = None) -> None:
+        self.supabase = supabase
+        self.bucket = bucket or settings.supabase_bucket
+
+    def public_url(self, object_path: str) -> str:
+        base = settings.supabase_url.rstrip("/")
+        if base:
+            return f"{base}/storage/v1/object/public/{self.bucket}/{quote(object_path)}"
+        # sin SUPABASE_URL no se puede armar localmente; se pregunta al cliente
+        resp = self.supabase.storage.from_(self.bucket).get_public_url(object_path)
+        url = (resp.get("publicUrl") or resp.get("public_url")) if isinstance(resp, dict) else str(resp)
+        if not url:
+            raise MediaUploadError(f"No se pudo obtener URL de {object_path}")
+        return url
+
+    def _upload_one(self, item: MediaItem) -> Tuple[str, bool]:
+        """
+        Returns (url, reused). Content-addressed paths already in the index are not uploaded again.
+        """
+        known = media_index.get(self.bucket, item.object_path)
+        if known:
+            return known, True
+        handle = item.open()
+        size = item.size if item.size is not None else file_size(handle)
+        threshold = max(1, settings.media_resumable_threshold_bytes)
+        try:
+            if size > threshold and settings.supabase_url:
+                self._resumable_upload(item, handle, size)
+            else:
+                # por debajo del umbral el buffer nunca supera `threshold` bytes
+                res = self.supabase.storage.from_(self.bucket).upload(
+                    item.object_path, handle.read(threshold + 1), {"content-type": item.content_type}
+                )
+                if res is None:
+                    raise MediaUploadError(f"No se pudo subir {item.label or item.object_path}")
+            reused = False
+        except Exception as exc:
+            # mismo contenido ya subido por otro worker o antes de tener índice
+            if not _is_duplicate(exc):
+                raise
+            reused = True
+        url = self.public_url(item.object_path)
+        media_index.put(self.bucket, item.object_path, url, size)
+        return url, reused
+
+    def _resumable_upload(self, item: MediaItem, handle: BinaryIO, size: int) -> None:
+        """
+        TUS upload to Supabase Storage in fixed-size chunks; a failed PATCH resumes from the server offset.
+        """
+        base = settings.supabase_url.rstrip("/")
+        headers = {
+            "Authorization": f"Bearer {settings.supabase_key}",
+            "apikey": settings.supabase_key,
+            "Tus-Resumable": "1.0.0",
+        }
+        metadata = {"bucketName": self.bucket, "objectName": item.object_path, "contentType": item.content_type}
+        encoded = ",".join(f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in metadata.items())
+        chunk_size = max(1, settings.media_chunk_bytes)
+        with httpx.Client(timeout=settings.media_upload_timeout_seconds) as client:
+            created = client.post(
+                f"{base}/storage/v1/upload/resumable",
+                headers={**headers, "Upload-Length": str(size), "Upload-Metadata": encoded},
+            )
+            if created.status_code == 409:
+                raise _AlreadyStored(item.object_path)
+            created.raise_for_status()
+            location = created.headers["Location"]
+            offset = position = 0
+            failures = 0
+            while offset < size:
+                if position != offset:
+                    handle.seek(offset)
+                chunk = handle.read(chunk_size)
+                position = offset + len(chunk)
+                try:
+                    resp = client.patch(
+                        location,
+                        headers={
+                            **headers,
+                            "Upload-Offset": str(offset),
+                            "Content-Type": "application/offset+octet-stream",
+                        },
+                        content=chunk,
+                    )
+                    resp.raise_for_status()
+                    offset = int(resp.headers.get("Upload-Offset", position))
+                    failures = 0
+                except httpx.HTTPError as exc:
+                    failures += 1
+                    if failures > settings.media_upload_retries:
+                        raise MediaUploadError(f"No se pudo subir {item.label or item.object_path}: {exc}") from exc
+                    head = client.head(location, headers=headers)
+                    head.raise_for_status()
+                    offset = int(head.headers["Upload-Offset"])
+
+    def remove(self, object_paths: Sequence[str]) -> None:
+        if not object_paths:
+            return
+        try:
+            self.supabase.storage.from_(self.bucket).remove(list(object_paths))
+        except Exception as exc:
+            logger.error("Could not roll back %s uploaded objects: %s", len(object_paths), exc)
+
+    def _run(self, items: Sequence[MediaItem]) -> List[Union[Tuple[str, bool], Exception]]:
+        # rutas repetidas (mismo contenido dos veces en el lote) se suben una sola vez
+        executor = _get_executor()
+        futures: Dict[str, Any] = {}
+        for item in items:
+            if item.object_path not in futures:
+                futures[item.object_path] = executor.submit(self._upload_one, item)
+        outcomes: Dict[str, Union[Tuple[str, bool], Exception]] = {}
+        for path, future in futures.items():
+            try:
+                outcomes[path] = future.result()
+            except Exception as exc:
+                outcomes[path] = exc
+        return [outcomes[item.object_path] for item in items]
+
+    def prepare_each(self, builders: Sequence[Callable[[], MediaItem]]) -> List[Union[MediaItem, Exception]]:
+        """
+        Build items on the upload pool, so content hashing runs bounded and in parallel
+        instead of one after another on the request thread. One item or exception per builder.
+        """
+        futures = [_get_executor().submit(builder) for builder in builders]
+        prepared: List[Union[MediaItem, Exception]] = []
+        for future in futures:
+            try:
+                prepared.append(future.result())
+            except Exception as exc:
+                prepared.append(exc)
+        return prepared
+
+    def upload_each(self, items: Sequence[MediaItem]) -> List[UploadResult]:
+        """
+        Upload concurrently; returns one URL or exception per item, in input order.
+        """
+        if not items:
+            return []
+        paths = [item.object_path for item in items]
+        _claim(paths)
+        try:
+            outcomes = self._run(items)
+        finally:
+            _release(paths)
+        return [outcome if isinstance(outcome, Exception) else outcome[0] for outcome in outcomes]
+
+    def upload_many(self, items: Sequence[MediaItem]) -> List[str]:
+        """
+        All-or-nothing variant: on any failure the objects this batch created are removed.
+        Reused objects (index hit or duplicate) belong to earlier uploads and are left alone,
+        and so are created ones that another in-flight batch of this process also holds.
+        Other workers sharing MEDIA_INDEX_PATH are not covered: one of them could reuse an
+        object in the moment between its upload here and the rollback.
+        """
+        if not items:
+            return []
+        paths = [item.object_path for item in items]
+        _claim(paths)
+        try:
+            outcomes = self._run(items)
+            failures = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+            if failures:
+                created = {
+                    item.object_path
+                    for item, outcome in zip(items, outcomes)
+                    if not isinstance(outcome, Exception) and not outcome[1]
+                }
+                # bajo el lock: un lote que llegue después ya no encuentra la ruta en el índice y la vuelve a subir
+                with _claims_lock:
+                    removable = sorted(path for path in created if _claims[path] <= 1)
+                    media_index.discard(self.bucket, removable)
+                    self.remove(removable)
+                raise MediaUploadError(str(failures[0])) from failures[0]
+        finally:
+            _release(paths)
+        return [outcome[0] for outcome in outcomes]  # type: ignore[index]
+
+    def _with_variants(self, items: Sequence[MediaItem]) -> Tuple[List[MediaItem], List[Dict[str, int]]]:
+        """
+        Append derivative items after the originals; returns the expanded list and, per original,
+        variant name -> index in that list.
+        """
+        expanded = list(items)
+        slots: List[Dict[str, int]] = [{} for _ in items]
+        if not derivatives_available():
+            return expanded, slots
+        names = [name for name, _, _ in variant_specs()]
+        # el original se lee recién cuando hay un worker libre, no todo el lote por adelantado
+        loaders: List[Optional[Callable[[], bytes]]] = []
+        for index, item in enumerate(items):
+            paths = {name: derivative_path(item.object_path, name) for name in names}
+            if all(media_index.get(self.bucket, path) for path in paths.values()):
+                # contenido ya procesado: las variantes se resuelven por índice sin renderizar; si la entrada
+                # desaparece antes de subir, se regenera la variante (nunca se sube el original en su ruta)
+                for name, path in paths.items():
+                    slots[index][name] = len(expanded)
+                    expanded.append(
+                        MediaItem(
+                            path,
+                            lambda item=item, name=name: io.BytesIO(render_derivative(lambda: item.open().read(), name)),
+                            "image/jpeg",
+                            f"{item.label}:{name}",
+                        )
+                    )
+                loaders.append(None)
+                continue
+            loaders.append(lambda item=item: item.open().read())
+        for index, (item, variants) in enumerate(zip(items, generate_variants(loaders))):
+            for name, data in (variants or {}).items():
+                slots[index][name] = len(expanded)
+                expanded.append(
+                    MediaItem(
+                        derivative_path(item.object_path, name),
+                        lambda data=data: io.BytesIO(data),
+                        "image/jpeg",
+                        f"{item.label}:{name}",
+                        len(data),
+                    )
+                )
+        return expanded, slots
+
+    def upload_images_each(self, items: Sequence[MediaItem]) -> List[ImageResult]:
+        """
+        Like `upload_each` for images: (url, variants) per item. A failed variant is just left out.
+        """
+        expanded, slots = self._with_variants(items)
+        results = self.upload_each(expanded)
+        outcomes: List[ImageResult] = []
+        for index, slot in enumerate(slots):
+            original = results[index]
+            if isinstance(original, Exception):
+                outcomes.append(original)
+                continue
+            variants = {name: results[pos] for name, pos in slot.items() if not isinstance(results[pos], Exception)}
+            outcomes.append((original, variants or None))
+        return outcomes
+
+    def upload_media(
+        self, images: Sequence[MediaItem], others: Sequence[MediaItem] = ()
+    ) -> Tuple[List[str], List[PhotoVariants], List[str]]:
+        """
+        All-or-nothing upload of images (plus derivatives) and other media such as videos.
+        Returns (image_urls, photo_variants, other_urls), each aligned with its input.
+        """
+        expanded, slots = self._with_variants(images)
+        offset = len(expanded)
+        results = self.upload_many(expanded + list(others))
+        urls = results[: len(images)]
+        variants = [{name: results[pos] for name, pos in slot.items()} or None for slot in slots]
+        return urls, variants, results[offset:]
@@ -0,0 +1,80 @@
+"""
+Compaction of `leads.notes` for leads written before the notes cap.
+Recorta las entradas del agente que exceden `NOTES_MAX_ENTRIES`/`NOTES_MAX_CHARS`
+y las mueve a `lead_interactions`; pensado para correr desde cron:
+
+    python -m services.notes_compaction --batch-size 500 --dry-run
+"""
+
+from __future__ import annotations
+
+import argparse
+from typing import Any, Dict, Optional
+
+from db.supabase_client import get_supabase_client
+from repositories.interaction_repository import LeadInteractionRepository
+from repositories.lead_repository import LeadRepository
+from utils.notes import compact_notes, rollover_rows
+
+
+def compact_lead_notes(
+    repo: LeadRepository,
+    interaction_repo: LeadInteractionRepository,
+    *,
+    batch_size: int = 500,
+    agency_id: Optional[int] = None,
+    max_entries: Optional[int] = None,
+    max_chars: Optional[int] = None,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    report = {"scanned": 0, "compacted": 0, "rolled_over": 0, "chars_saved": 0, "failed": 0}
+    after_id = 0
+    while True:
+        rows = repo.list_agent_notes(after_id=after_id, limit=batch_size, agency_id=agency_id)
+        if not rows:
+            break
+        for row in rows:
+            after_id = row["id"]
+            report["scanned"] += 1
+            notes = row.get("notes") or ""
+            kept, rolled = compact_notes(notes, max_entries=max_entries, max_chars=max_chars)
+            if not rolled:
+                continue
+            if not dry_run:
+                try:
+                    # primero el historial: si falla el update, repetir duplica pero no pierde entradas
+                    interaction_repo.create_many(rollover_rows(row["id"], rolled))
+                    repo.update(row["id"], {"notes": kept})
+                except Exception:
+                    report["failed"] += 1
+                    continue
+            report["compacted"] += 1
+            report["rolled_over"] += len(rolled)
+            report["chars_saved"] += len(notes) - len(kept or "")
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--agency-id", type=int, default=None)
+    parser.add_argument("--max-entries", type=int, default=None, help="por defecto NOTES_MAX_ENTRIES")
+    parser.add_argument("--max-chars", type=int, default=None, help="por defecto NOTES_MAX_CHARS")
+    parser.add_argument("--dry-run", action="store_true", help="solo cuenta, no escribe")
+    args = parser.parse_args()
+
+    supabase = get_supabase_client()
+    report = compact_lead_notes(
+        LeadRepository(supabase),
+        LeadInteractionRepository(supabase),
+        batch_size=args.batch_size,
+        agency_id=args.agency_id,
+        max_entries=args.max_entries,
+        max_chars=args.max_chars,
+        dry_run=args.dry_run,
+    )
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 from uuid import UUID
 
 from fastapi import HTTPException, UploadFile, status
@@ -7,7 +7,8 @@ from fastapi import HTTPException, UploadFile, status
 from core.config import settings
 from db.supabase_client import get_supabase_client
 from repositories.post_repository import PostRepository
-from utils.media import generate_object_path, validate_media
+from services.media_uploader import MediaUploadError, MediaUploader, item_from_upload
+from utils.media import validate_media
 
 
 class PostService:
@@ -15,26 +16,18 @@ class PostService:
         self.supabase = get_supabase_client()
         self.repo = PostRepository(self.supabase)
         self.bucket = settings.supabase_bucket
+        self.uploader = MediaUploader(self.supabase, self.bucket)
 
-    def _upload_files(self, company_id: int, files: List[UploadFile]) -> List[str]:
-        urls: List[str] = []
-        storage = self.supabase.storage.from_(self.bucket)
-        for upload in files:
-            object_path = generate_object_path(company_id, upload.filename or "file")
-            file_bytes = upload.file.read()
-            upload.file.seek(0)
-            res = storage.upload(object_path, file_bytes, {"content-type": upload.content_type or "application/octet-stream"})
-            if res is None:
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to upload media")
-            public_url_resp = storage.get_public_url(object_path)
-            if isinstance(public_url_resp, dict):
-                url = public_url_resp.get("publicUrl") or public_url_resp.get("public_url")
-            else:
-                url = str(public_url_resp)
-            if not url:
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to obtain media URL")
-            urls.append(url)
-        return urls
+    def _upload_files(
+        self, company_id: int, photos: List[UploadFile], videos: List[UploadFile]
+    ) -> Tuple[List[str], List[Optional[Dict[str, str]]], List[str]]:
+        # fotos (con variantes) y videos en un solo lote: misma concurrencia y rollback conjunto
+        photo_items = [item_from_upload(company_id, upload) for upload in photos]
+        video_items = [item_from_upload(company_id, upload) for upload in videos]
+        try:
+            return self.uploader.upload_media(photo_items, video_items)
+        except MediaUploadError:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to upload media")
 
     def _authorize(self, post: Dict[str, Any], company_id: int):
         if post.get("company_id") != company_id:
@@ -44,8 +37,7 @@ class PostService:
         if not company_id:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Company is required to create posts")
         validate_media(photos, videos)
-        photo_urls = self._upload_files(company_id, photos)
-        video_urls = self._upload_files(company_id, videos) if videos else []
+        photo_urls, photo_variants, video_urls = self._upload_files(company_id, photos, videos or [])
         payload = {
             "title": title,
             "description": description,
@@ -55,6 +47,8 @@ class PostService:
             "created_at": datetime.utcnow().isoformat(),
             "updated_at": datetime.utcnow().isoformat(),
         }
+        if any(photo_variants):
+            payload["photo_variants"] = photo_variants
         return self.repo.create(payload)
 
     def get_post(self, post_id: Union[str, UUID]) -> Dict[str, Any]:
@@ -79,12 +73,16 @@ class PostService:
             updates["description"] = metadata["description"]
         photo_urls: List[str] = existing.get("photos", [])
         video_urls: List[str] = existing.get("videos", [])
-        if photos:
-            photo_urls += self._upload_files(company_id, photos)
-            updates["photos"] = photo_urls
-        if videos:
-            video_urls += self._upload_files(company_id, videos)
-            updates["videos"] = video_urls
+        if photos or videos:
+            new_photos, new_variants, new_videos = self._upload_files(company_id, photos or [], videos or [])
+            if photos:
+                updates["photos"] = photo_urls + new_photos
+                if any(new_variants) or existing.get("photo_variants"):
+                    previous = existing.get("photo_variants") or []
+                    previous = (previous + [None] * len(photo_urls))[: len(photo_urls)]
+                    updates["photo_variants"] = previous + new_variants
+            if videos:
+                updates["videos"] = video_urls + new_videos
         updates["updated_at"] = datetime.utcnow().isoformat()
         return self.repo.update(post_id, updates)
 
@@ -0,0 +1,366 @@
+"""
+Bulk property import: manifest (CSV / NDJSON / JSON) + media archive (zip).
+El manifiesto se procesa por lotes: fotos en paralelo con un pool acotado,
+inserción en bloque, publicación social en segundo plano y checkpoint por lote
+para poder reanudar el job si se interrumpe.
+"""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import zipfile
+from collections import Counter
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+from fastapi import HTTPException, UploadFile, status
+from pydantic import ValidationError
+
+from core.config import settings
+from db.supabase_client import get_supabase_client
+from repositories.property_repository import PropertyRepository
+from schemas.property import PropertyCreate
+from services.agent.semantic import semantic_matcher
+from services.lead_matches import lead_matches
+from services.media_uploader import MediaItem, MediaUploader
+from services.property_search import property_search_index
+from services.publish_outbox import enqueue_publication
+from utils.media import (
+    ALLOWED_IMAGE_TYPES,
+    IMAGE_MAX_BYTES,
+    MEDIA_CONTENT_TYPES,
+    SNIFF_BYTES,
+    content_object_path,
+    sniff_media_type,
+)
+
+logger = logging.getLogger(__name__)
+
+ManifestRow = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+
+def _split_photos(value: Any) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value).split("|") if item.strip()]
+
+
+def _clean(row: Dict[str, Any]) -> Dict[str, Any]:
+    cleaned: Dict[str, Any] = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        if value in ("", None):
+            continue
+        cleaned[key.strip()] = value
+    return cleaned
+
+
+def manifest_digest(upload: UploadFile) -> str:
+    digest = hashlib.sha256()
+    upload.file.seek(0)
+    for block in iter(lambda: upload.file.read(1 << 20), b""):
+        digest.update(block)
+    upload.file.seek(0)
+    return digest.hexdigest()
+
+
+def _row_key(row: Dict[str, Any]) -> Tuple[Any, ...]:
+    price = row.get("price")
+    return (row.get("title"), float(price) if price is not None else None, row.get("location"))
+
+
+def iter_manifest(upload: UploadFile) -> Iterator[ManifestRow]:
+    """
+    Stream rows from CSV or NDJSON. A JSON array is accepted too, but it is parsed whole.
+    """
+    name = (upload.filename or "").lower()
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    try:
+        if name.endswith(".csv"):
+            reader = csv.DictReader(text)
+            for index, row in enumerate(reader, start=1):
+                yield index, _clean(row), None
+            return
+        if name.endswith(".json"):
+            data = json.load(text)
+            if not isinstance(data, list):
+                yield 1, None, "El manifiesto JSON debe ser un arreglo"
+                return
+            for index, row in enumerate(data, start=1):
+                yield (index, _clean(row), None) if isinstance(row, dict) else (index, None, "Fila inválida")
+            return
+        index = 0
+        for line in text:
+            if not line.strip():
+                continue
+            index += 1
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield index, None, f"JSON inválido: {exc.msg}"
+                continue
+            yield (index, _clean(row), None) if isinstance(row, dict) else (index, None, "Fila inválida")
+    finally:
+        text.detach()
+
+
+class ImportCheckpoint:
+    """
+    Small JSON file per (agency, job): last committed row, counters and already uploaded media.
+    El job solo se reanuda con el mismo manifiesto (sha256 guardado en el checkpoint).
+    """
+
+    def __init__(self, job_id: str, *, agency_id: int, manifest_sha256: str) -> None:
+        directory = settings.import_checkpoint_dir or os.path.join(tempfile.gettempdir(), "property-imports")
+        os.makedirs(directory, exist_ok=True)
+        safe_id = "".join(ch for ch in job_id if ch.isalnum() or ch in "-_")
+        if not safe_id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="job_id inválido")
+        self.job_id = safe_id
+        # el job_id lo elige el cliente: "lote1" de dos agencias no puede compartir estado
+        self.path = os.path.join(directory, f"{agency_id}-{safe_id}-{manifest_sha256[:16]}.json")
+        self.state: Dict[str, Any] = {
+            "agency_id": agency_id,
+            "manifest_sha256": manifest_sha256,
+            "last_row": 0,
+            "inflight": None,  # [primera, última] fila de un lote enviado a la base y aún sin confirmar
+            "imported": 0,
+            "failed": 0,
+            "errors": [],
+            "uploaded": {},
+            "completed": False,
+        }
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as handle:
+                stored = json.load(handle)
+            if stored.get("agency_id") != agency_id or stored.get("manifest_sha256") != manifest_sha256:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="El job_id corresponde a otro manifiesto; use un job_id nuevo",
+                )
+            self.state.update(stored)
+
+    def save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(self.state, handle, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+class PropertyImportService:
+    def __init__(self):
+        self.supabase = get_supabase_client()
+        self.property_repo = PropertyRepository(self.supabase)
+        self.bucket = settings.supabase_bucket
+        self.uploader = MediaUploader(self.supabase, self.bucket)
+
+    def _member_item(self, archive: zipfile.ZipFile, member: str, agency_id: int) -> MediaItem:
+        """
+        Runs on the upload pool: the size is checked before the member is decompressed to be hashed.
+        """
+        if member not in archive.NameToInfo:
+            raise KeyError(member)
+        info = archive.getinfo(member)
+        if info.file_size > IMAGE_MAX_BYTES:
+            raise ValueError(f"{member} excede el tamaño permitido")
+
+        def _open() -> BinaryIO:
+            with archive.open(info) as handle:
+                kind = sniff_media_type(handle.read(SNIFF_BYTES))
+            if kind not in ALLOWED_IMAGE_TYPES:
+                raise ValueError(f"{member} no es una imagen soportada")
+            return archive.open(info)
+
+        ext = os.path.splitext(member)[1].lower().lstrip(".")
+        content_type = MEDIA_CONTENT_TYPES.get("jpeg" if ext == "jpg" else ext, "image/jpeg")
+        with archive.open(info) as handle:
+            object_path = content_object_path(agency_id, handle, member)
+        return MediaItem(object_path, _open, content_type, member, info.file_size)
+
+    def _upload_chunk_media(
+        self, archive: Optional[zipfile.ZipFile], names: List[str], agency_id: int, uploaded: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Upload every photo referenced by the chunk concurrently; returns name -> (url, variants) or exception.
+        """
+        pending = [name for name in dict.fromkeys(names) if name not in uploaded]
+        results: Dict[str, Any] = {}
+        for name in names:
+            if name in uploaded:
+                previous = uploaded[name]
+                # checkpoints viejos guardaban solo la URL
+                results[name] = (previous, None) if isinstance(previous, str) else tuple(previous)
+        if not pending:
+            return results
+        if archive is None:
+            for name in pending:
+                results[name] = ValueError(f"{name}: no se envió archivo de medios")
+            return results
+        prepared = self.uploader.prepare_each(
+            [lambda name=name: self._member_item(archive, name, agency_id) for name in pending]
+        )
+        ready = [(name, item) for name, item in zip(pending, prepared) if not isinstance(item, Exception)]
+        # sin rollback: una foto fallida invalida solo su fila
+        uploaded_items = self.uploader.upload_images_each([item for _, item in ready])
+        outcomes = dict(zip((name for name, _ in ready), uploaded_items))
+        for name, item in zip(pending, prepared):
+            outcome = item if isinstance(item, Exception) else outcomes[name]
+            if isinstance(outcome, KeyError):
+                outcome = ValueError(f"{name} no existe en el archivo")
+            elif not isinstance(outcome, Exception):
+                uploaded[name] = list(outcome)
+            results[name] = outcome
+        return results
+
+    def _already_inserted(
+        self, agency_id: int, rows: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Split a chunk that may have been inserted right before a crash into (pending, existing rows).
+        """
+        existing = Counter()
+        found: Dict[Tuple[Any, ...], List[Dict[str, Any]]] = {}
+        for row in self.property_repo.find_by_titles(agency_id, [row.get("title") for row in rows]):
+            existing[_row_key(row)] += 1
+            found.setdefault(_row_key(row), []).append(row)
+        pending, recovered = [], []
+        for row in rows:
+            key = _row_key(row)
+            if existing[key] > 0:
+                existing[key] -= 1
+                recovered.append(found[key][existing[key]])
+            else:
+                pending.append(row)
+        return pending, recovered
+
+    def _publish_async(self, created: List[Dict[str, Any]]) -> None:
+        for prop in created:
+            try:
+                property_search_index.upsert(prop)
+                enqueue_publication(prop)
+            except Exception as exc:
+                # p. ej. "database is locked" en el outbox: la propiedad ya está creada
+                logger.error("Could not index/publish imported property %s: %s", prop.get("id"), exc)
+
+    def import_properties(
+        self,
+        manifest: UploadFile,
+        media: Optional[UploadFile],
+        *,
+        agency_id: int,
+        job_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        checkpoint = ImportCheckpoint(
+            job_id or uuid4().hex, agency_id=agency_id, manifest_sha256=manifest_digest(manifest)
+        )
+        state = checkpoint.state
+        resumed_from = state["last_row"]
+        max_errors = max(0, settings.property_import_max_errors)
+        chunk_size = max(1, settings.property_import_batch_size)
+
+        try:
+            archive = zipfile.ZipFile(media.file) if media is not None else None
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El archivo de medios debe ser un zip")
+
+        def fail(row_number: int, message: str) -> None:
+            state["failed"] += 1
+            if len(state["errors"]) < max_errors:
+                state["errors"].append({"row": row_number, "error": message})
+
+        def process(chunk: List[Tuple[int, Dict[str, Any], List[str]]]) -> None:
+            names = [name for _, _, photos in chunk for name in photos]
+            media_urls = self._upload_chunk_media(archive, names, agency_id, state["uploaded"])
+            rows: List[Dict[str, Any]] = []
+            row_numbers: List[int] = []
+            for row_number, payload, photos in chunk:
+                errors = [str(media_urls[name]) for name in photos if isinstance(media_urls.get(name), Exception)]
+                if errors:
+                    fail(row_number, "; ".join(errors))
+                    continue
+                linked = payload.get("photos") or []
+                payload["photos"] = linked + [media_urls[name][0] for name in photos]
+                variants = [None] * len(linked) + [media_urls[name][1] for name in photos]
+                if any(variants):
+                    payload["photo_variants"] = variants
+                else:
+                    payload.pop("photo_variants", None)
+                rows.append(payload)
+                row_numbers.append(row_number)
+            if rows:
+                try:
+                    recovered: List[Dict[str, Any]] = []
+                    inflight = state.get("inflight")
+                    if inflight and chunk[0][0] <= inflight[1]:
+                        # el proceso cayó entre el insert y el checkpoint: no duplicar lo ya insertado
+                        rows, recovered = self._already_inserted(agency_id, rows)
+                    state["inflight"] = [chunk[0][0], chunk[-1][0]]
+                    checkpoint.save()
+                    created = recovered + self.property_repo.create_many(rows)
+                except Exception as exc:
+                    # las filas que ya fallaron por sus fotos no se cuentan dos veces
+                    for row_number in row_numbers:
+                        fail(row_number, f"Error al insertar el lote: {exc}")
+                    created = []
+                state["imported"] += len(created)
+                if created:
+                    # las filas ya están insertadas: un error aquí no las convierte en fallidas
+                    try:
+                        semantic_matcher.invalidate(agency_id)
+                        for row in created:
+                            lead_matches.submit(lead_matches.property_saved, row, notify=True)
+                        self._publish_async(created)
+                    except Exception as exc:
+                        logger.error("Post-insert hooks failed for %s imported properties: %s", len(created), exc)
+            state["last_row"] = chunk[-1][0]
+            state["inflight"] = None
+            checkpoint.save()
+
+        chunk: List[Tuple[int, Dict[str, Any], List[str]]] = []
+        try:
+            for row_number, raw, parse_error in iter_manifest(manifest):
+                if row_number <= state["last_row"]:
+                    continue  # ya procesada en una ejecución anterior
+                if parse_error or raw is None:
+                    fail(row_number, parse_error or "Fila vacía")
+                    continue
+                photos = _split_photos(raw.pop("photos", None))
+                photo_urls = [item for item in photos if item.startswith(("http://", "https://"))]
+                archive_names = [item for item in photos if item not in photo_urls]
+                raw["agency_id"] = agency_id
+                try:
+                    property_in = PropertyCreate(**raw, photos=photo_urls)
+                except ValidationError as exc:
+                    fail(row_number, "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors()))
+                    continue
+                chunk.append((row_number, property_in.dict(), archive_names))
+                if len(chunk) >= chunk_size:
+                    process(chunk)
+                    chunk = []
+            if chunk:
+                process(chunk)
+            state["completed"] = True
+            checkpoint.save()
+        finally:
+            if archive is not None:
+                archive.close()
+
+        return {
+            "job_id": checkpoint.job_id,
+            "resumed_from_row": resumed_from,
+            "imported": state["imported"],
+            "failed": state["failed"],
+            "errors": state["errors"],
+            "completed": state["completed"],
+        }
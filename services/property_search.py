@@ -0,0 +1,420 @@
+"""
+In-process property search index.
+Índice invertido (título, ubicación, descripción, sin tildes) con ranking BM25,
+índices ordenados para rangos numéricos (precio, habitaciones, baños) y facetas
+por tipo, ubicación y banda de precio. Se mantiene incrementalmente en
+create/update/delete; cada worker además lo reconstruye cuando pasa el TTL para
+recoger cambios hechos por otros procesos.
+"""
+
+from __future__ import annotations
+
+import bisect
+import heapq
+import logging
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from core.config import settings
+from utils.text import fold_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+Doc = Dict[str, Any]
+
+FIELD_WEIGHTS = {"title": 3.0, "location": 2.0, "area": 2.0, "property_type": 1.5, "description": 1.0}
+NUMERIC_FIELDS = ("price", "bedrooms", "bathrooms")
+FACET_FIELDS = ("property_type", "location", "price_band")
+SORTS = {"relevance", "price_asc", "price_desc", "newest"}
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+_PREFIX_MIN_LEN = 3
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def price_band(price: Optional[float], edges: Sequence[float]) -> str:
+    if price is None:
+        return "sin precio"
+    position = bisect.bisect_right(edges, price)
+    if position == 0:
+        return f"< {edges[0]:,.0f}"
+    if position == len(edges):
+        return f">= {edges[-1]:,.0f}"
+    return f"{edges[position - 1]:,.0f} - {edges[position]:,.0f}"
+
+
+class PropertySearchIndex:
+    def __init__(self, *, price_bands: Sequence[float] = ()) -> None:
+        self.price_bands = sorted(price_bands)
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._rebuilding = False
+        # cambios recibidos mientras se reconstruye en segundo plano; se re-aplican al final
+        self._journal: Optional[List[Tuple[str, Any]]] = None
+        self._reset()
+        self.built_at = 0.0
+        self.searches = 0
+        self.rebuilds = 0
+
+    def _reset(self) -> None:
+        self._docs: Dict[Any, Doc] = {}
+        self._postings: Dict[str, Dict[Any, float]] = defaultdict(dict)
+        self._doc_terms: Dict[Any, Tuple[str, ...]] = {}
+        self._doc_len: Dict[Any, float] = {}
+        self._total_len = 0.0
+        self._vocabulary: List[str] = []  # ordenado, para prefijos
+        self._by_agency: Dict[Any, Set[Any]] = defaultdict(set)
+        self._numeric: Dict[str, List[Tuple[float, Any]]] = {field: [] for field in NUMERIC_FIELDS}
+        # valor de faceta -> ids; el conteo es una intersección de sets (en C)
+        self._facet_sets: Dict[str, Dict[str, Set[Any]]] = {field: defaultdict(set) for field in FACET_FIELDS}
+        self._doc_facets: Dict[Any, Tuple[Tuple[str, str], ...]] = {}
+        self._created: Dict[Any, str] = {}
+        self._values: Dict[str, Dict[Any, float]] = {field: {} for field in NUMERIC_FIELDS}
+
+    # -- mantenimiento ----------------------------------------------------
+
+    def rebuild(self, docs: Iterable[Doc]) -> None:
+        with self._lock:
+            self._reset()
+            for doc in docs:
+                self._add(doc, bulk=True)
+            # en carga masiva se ordena una vez al final en vez de insort por documento
+            self._vocabulary = sorted(self._postings)
+            for entries in self._numeric.values():
+                entries.sort()
+            self.built_at = time.monotonic()
+
+    def refresh(self, load: Callable[[], Iterable[Doc]], ttl_seconds: float) -> None:
+        """
+        Rebuild from `load()` when the TTL expired, one rebuild at a time.
+        Only the very first build blocks; afterwards the catalog is reloaded in a background
+        thread and searches keep using the current index until the new one is swapped in.
+        """
+        if not self.is_stale(ttl_seconds):
+            return
+        if not self.built_at:
+            with self._build_lock:
+                if not self.built_at:
+                    self._rebuild_from(load)
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._background_rebuild, args=(load,), name="property-search-rebuild", daemon=True).start()
+
+    def _background_rebuild(self, load: Callable[[], Iterable[Doc]]) -> None:
+        try:
+            with self._build_lock:
+                self._rebuild_from(load)
+        except Exception as exc:
+            logger.error("Property search index rebuild failed: %s", exc)
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _rebuild_from(self, load: Callable[[], Iterable[Doc]]) -> None:
+        with self._lock:
+            self._journal = []
+        try:
+            fresh = PropertySearchIndex(price_bands=self.price_bands)
+            fresh.rebuild(load())
+            with self._lock:
+                for name in _STATE_FIELDS:
+                    setattr(self, name, getattr(fresh, name))
+                # lo que cambió en este worker durante la descarga gana sobre la foto vieja
+                for op, value in self._journal:
+                    if op == "upsert":
+                        self._remove(value["id"])
+                        self._add(value)
+                    else:
+                        self._remove(value)
+                self.built_at = fresh.built_at
+                self.rebuilds += 1
+        finally:
+            with self._lock:
+                self._journal = None
+
+    def upsert(self, doc: Doc) -> None:
+        if doc.get("id") is None:
+            return
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("upsert", doc))
+            self._remove(doc["id"])
+            self._add(doc)
+
+    def remove(self, doc_id: Any) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(("remove", doc_id))
+            self._remove(doc_id)
+
+    def is_stale(self, ttl_seconds: float) -> bool:
+        return not self.built_at or (ttl_seconds > 0 and time.monotonic() - self.built_at > ttl_seconds)
+
+    def _add(self, doc: Doc, bulk: bool = False) -> None:
+        doc_id = doc["id"]
+        weights: Counter = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(doc.get(field)):
+                weights[token] += weight
+        for term, tf in weights.items():
+            postings = self._postings[term]
+            if not postings and not bulk:
+                bisect.insort(self._vocabulary, term)
+            postings[doc_id] = tf
+        self._doc_terms[doc_id] = tuple(weights)
+        length = float(sum(weights.values()))
+        self._doc_len[doc_id] = length
+        self._total_len += length
+        self._docs[doc_id] = doc
+        self._created[doc_id] = str(doc.get("created_at") or "")
+        self._by_agency[doc.get("agency_id")].add(doc_id)
+        facets = self._facet_values(doc)
+        for field, value in facets:
+            self._facet_sets[field][value].add(doc_id)
+        self._doc_facets[doc_id] = facets
+        for field in NUMERIC_FIELDS:
+            value = _number(doc.get(field))
+            if value is None:
+                continue
+            self._values[field][doc_id] = value
+            if bulk:
+                self._numeric[field].append((value, doc_id))
+            else:
+                bisect.insort(self._numeric[field], (value, doc_id))
+
+    def _remove(self, doc_id: Any) -> None:
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for term in self._doc_terms.pop(doc_id, ()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                position = bisect.bisect_left(self._vocabulary, term)
+                if position < len(self._vocabulary) and self._vocabulary[position] == term:
+                    self._vocabulary.pop(position)
+        self._total_len -= self._doc_len.pop(doc_id, 0.0)
+        self._created.pop(doc_id, None)
+        for field, value in self._doc_facets.pop(doc_id, ()):
+            members = self._facet_sets[field].get(value)
+            if members is not None:
+                members.discard(doc_id)
+                if not members:
+                    del self._facet_sets[field][value]
+        agency_docs = self._by_agency.get(doc.get("agency_id"))
+        if agency_docs is not None:
+            agency_docs.discard(doc_id)
+        for field in NUMERIC_FIELDS:
+            value = self._values[field].pop(doc_id, None)
+            if value is None:
+                continue
+            entries = self._numeric[field]
+            position = bisect.bisect_left(entries, (value, doc_id))
+            if position < len(entries) and entries[position] == (value, doc_id):
+                entries.pop(position)
+
+    # -- consulta ---------------------------------------------------------
+
+    def _restrict(self, candidates: Set[Any], field: str, low: Optional[float], high: Optional[float]) -> Set[Any]:
+        entries = self._numeric[field]
+        start = 0 if low is None else bisect.bisect_left(entries, (low,))
+        end = len(entries) if high is None else bisect.bisect_right(entries, (high, _MAX_KEY))
+        if len(candidates) < end - start:
+            # menos candidatos que filas en el rango: se comprueba el valor directamente
+            values = self._values[field]
+            low = -math.inf if low is None else low
+            high = math.inf if high is None else high
+            return {doc_id for doc_id in candidates if low <= values.get(doc_id, math.nan) <= high}
+        return candidates.intersection(doc_id for _, doc_id in entries[start:end])
+
+    def _expand(self, token: str, is_last: bool) -> List[str]:
+        if token in self._postings:
+            return [token]
+        if not is_last or len(token) < _PREFIX_MIN_LEN:
+            return []
+        # el último término se trata como prefijo ("pas" -> "pasto")
+        start = bisect.bisect_left(self._vocabulary, token)
+        terms: List[str] = []
+        for term in self._vocabulary[start:]:
+            if not term.startswith(token) or len(terms) >= 20:
+                break
+            terms.append(term)
+        return terms
+
+    def _text_scores(self, tokens: List[str], candidates: Set[Any]) -> Dict[Any, float]:
+        total_docs = max(1, len(self._docs))
+        avg_len = self._total_len / total_docs if total_docs else 1.0
+        expanded = [self._expand(token, position == len(tokens) - 1) for position, token in enumerate(tokens)]
+        # el término más raro primero: cada paso solo recorre lo que ya coincidió (AND)
+        expanded.sort(key=lambda terms: sum(len(self._postings[term]) for term in terms))
+        scores: Dict[Any, float] = {}
+        current = candidates
+        for terms in expanded:
+            token_scores: Dict[Any, float] = {}
+            for term in terms:
+                postings = self._postings[term]
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                if len(current) < len(postings):
+                    pairs = ((doc_id, postings[doc_id]) for doc_id in current if doc_id in postings)
+                else:
+                    pairs = ((doc_id, tf) for doc_id, tf in postings.items() if doc_id in current)
+                for doc_id, tf in pairs:
+                    norm = tf * (_BM25_K1 + 1) / (tf + _BM25_K1 * (1 - _BM25_B + _BM25_B * self._doc_len[doc_id] / avg_len))
+                    if idf * norm > token_scores.get(doc_id, 0.0):
+                        token_scores[doc_id] = idf * norm
+            if not token_scores:
+                return {}
+            scores = {doc_id: scores.get(doc_id, 0.0) + score for doc_id, score in token_scores.items()}
+            current = token_scores.keys()
+        return scores
+
+    def _facet_values(self, doc: Doc) -> Tuple[Tuple[str, str], ...]:
+        values = []
+        if doc.get("property_type"):
+            values.append(("property_type", str(doc["property_type"])))
+        if doc.get("location"):
+            values.append(("location", str(doc["location"])))
+        if self.price_bands:
+            values.append(("price_band", price_band(_number(doc.get("price")), self.price_bands)))
+        return tuple(values)
+
+    def _facets(self, doc_ids: Set[Any]) -> Dict[str, Dict[str, int]]:
+        facets: Dict[str, Dict[str, int]] = {}
+        for field in FACET_FIELDS:
+            counts = Counter()
+            for value, members in self._facet_sets[field].items():
+                count = len(members & doc_ids) if len(doc_ids) < len(self._docs) else len(members)
+                if count:
+                    counts[value] = count
+            facets[field] = dict(counts.most_common(None if field == "price_band" else 20))
+        return facets
+
+    def search(
+        self,
+        query: str = "",
+        *,
+        agency_id: Optional[int] = None,
+        property_type: Optional[str] = None,
+        location: Optional[str] = None,
+        status: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        bedrooms: Optional[int] = None,
+        bathrooms: Optional[int] = None,
+        parking: Optional[bool] = None,
+        sort: str = "relevance",
+        offset: int = 0,
+        limit: int = 20,
+    ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        with self._lock:
+            self.searches += 1
+            candidates = set(self._by_agency.get(agency_id, ())) if agency_id is not None else set(self._docs)
+            for field, low, high in (
+                ("price", min_price, max_price),
+                ("bedrooms", bedrooms, None),
+                ("bathrooms", bathrooms, None),
+            ):
+                if candidates and (low is not None or high is not None):
+                    candidates = self._restrict(candidates, field, low, high)
+
+            folded_type = fold_text(property_type)
+            folded_location = fold_text(location)
+            folded_status = fold_text(status)
+            if folded_type or folded_location or folded_status or parking is not None:
+                candidates = {
+                    doc_id
+                    for doc_id in candidates
+                    if (not folded_type or fold_text(self._docs[doc_id].get("property_type")) == folded_type)
+                    and (not folded_location or folded_location in fold_text(self._docs[doc_id].get("location")))
+                    and (not folded_status or fold_text(self._docs[doc_id].get("status")) == folded_status)
+                    and (parking is None or bool(self._docs[doc_id].get("parking")) == parking)
+                }
+
+            tokens = tokenize(query)
+            scores = self._text_scores(tokens, candidates) if tokens else {}
+            matched = set(scores) if tokens else candidates
+
+            def price(doc_id: Any) -> float:
+                value = _number(self._docs[doc_id].get("price"))
+                return math.inf if value is None else value
+
+            created = self._created.__getitem__
+
+            # solo se ordena lo que cubre la página pedida
+            window = max(0, offset) + max(1, limit)
+            if sort == "price_asc":
+                top = heapq.nsmallest(window, matched, key=price)
+            elif sort == "price_desc":
+                top = heapq.nsmallest(window, matched, key=lambda doc_id: (price(doc_id) == math.inf, -price(doc_id)))
+            elif sort == "newest" or not tokens:
+                top = heapq.nlargest(window, matched, key=created)
+            else:
+                top = heapq.nlargest(window, matched, key=lambda doc_id: (scores[doc_id], created(doc_id)))
+            page = top[max(0, offset):]
+            return {
+                "total": len(matched),
+                "offset": offset,
+                "limit": limit,
+                "items": [self._docs[doc_id] for doc_id in page],
+                "facets": self._facets(matched),
+                "took_ms": round((time.perf_counter() - started) * 1000, 3),
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self._docs),
+                "terms": len(self._postings),
+                "searches": self.searches,
+                "rebuilds": self.rebuilds,
+                "rebuilding": self._rebuilding,
+                "age_seconds": round(time.monotonic() - self.built_at, 1) if self.built_at else None,
+            }
+
+
+# lo que `_reset` arma: se copia de un índice nuevo para reemplazar el actual de una vez
+_STATE_FIELDS = (
+    "_docs",
+    "_postings",
+    "_doc_terms",
+    "_doc_len",
+    "_total_len",
+    "_vocabulary",
+    "_by_agency",
+    "_numeric",
+    "_facet_sets",
+    "_doc_facets",
+    "_created",
+    "_values",
+)
+
+
+class _MaxKey:
+    """Sorts after any doc id, so (value, _MAX_KEY) closes an inclusive range."""
+
+    def __lt__(self, other: Any) -> bool:
+        return False
+
+    def __gt__(self, other: Any) -> bool:
+        return True
+
+
+_MAX_KEY = _MaxKey()
+
+property_search_index = PropertySearchIndex(price_bands=settings.search_price_bands)
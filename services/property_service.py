@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 from fastapi import HTTPException, status, UploadFile
 
@@ -8,8 +8,12 @@ from db.supabase_client import get_supabase_client
 from repositories.property_repository import PropertyRepository
 from schemas.property import PropertyCreate, PropertyUpdate
 from core.config import settings
-from utils.media import generate_object_path, validate_media
-from services.social_publisher import SocialPublisher
+from utils.media import validate_media
+from services.media_uploader import MediaUploadError, MediaUploader, item_from_upload
+from services.agent.semantic import semantic_matcher
+from services.lead_matches import lead_matches
+from services.property_search import property_search_index
+from services.publish_outbox import enqueue_publication
 
 
 class PropertyService:
@@ -18,7 +22,7 @@ class PropertyService:
         self.property_repo = PropertyRepository(supabase)
         self.supabase = supabase
         self.bucket = settings.supabase_bucket
-        self.publisher = SocialPublisher()
+        self.uploader = MediaUploader(supabase, self.bucket)
 
     def _is_superadmin(self, current_user) -> bool:
         return resolve_role(current_user) == UserRole.superadmin.value
@@ -39,25 +43,16 @@ class PropertyService:
         if role not in {UserRole.agency_admin.value, UserRole.superadmin.value}:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo agencias pueden gestionar propiedades")
 
-    def _upload_photos(self, agency_id: int, photos: List[UploadFile]) -> List[str]:
+    def _upload_photos(self, agency_id: int, photos: List[UploadFile]) -> Tuple[List[str], List[Optional[dict]]]:
         if not photos:
-            return []
+            return [], []
         validate_media(photos, [])
-        urls: List[str] = []
-        storage = self.supabase.storage.from_(self.bucket)
-        for upload in photos:
-            object_path = generate_object_path(agency_id, upload.filename or "photo")
-            file_bytes = upload.file.read()
-            upload.file.seek(0)
-            res = storage.upload(object_path, file_bytes, {"content-type": upload.content_type or "application/octet-stream"})
-            if res is None:
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo subir la imagen")
-            public_url_resp = storage.get_public_url(object_path)
-            url = public_url_resp.get("publicUrl") if isinstance(public_url_resp, dict) else str(public_url_resp)
-            if not url:
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo obtener URL de imagen")
-            urls.append(url)
-        return urls
+        items = [item_from_upload(agency_id, upload, "photo") for upload in photos]
+        try:
+            urls, variants, _ = self.uploader.upload_media(items)
+            return urls, variants
+        except MediaUploadError:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="No se pudo subir la imagen")
 
     def create_property(self, property_in: PropertyCreate, current_user) -> dict:
         self._ensure_agency_role(current_user)
@@ -76,8 +71,14 @@ class PropertyService:
             "status": property_in.status,
             "photos": property_in.photos or [],
         }
+        if property_in.photo_variants and any(property_in.photo_variants):
+            payload["photo_variants"] = property_in.photo_variants
         created = self.property_repo.create(payload)
-        self.publisher.publish_property(created)
+        property_search_index.upsert(created)
+        semantic_matcher.invalidate(agency_id)
+        lead_matches.submit(lead_matches.property_saved, created, notify=True)
+        # la entrega a n8n la hace el worker del outbox, fuera del request
+        enqueue_publication(created)
         return created
 
     def create_property_with_media(
@@ -99,7 +100,7 @@ class PropertyService:
     ) -> dict:
         self._ensure_agency_role(current_user)
         resolved_agency = self._resolve_agency(agency_id, current_user)
-        photo_urls = self._upload_photos(resolved_agency, photos or [])
+        photo_urls, photo_variants = self._upload_photos(resolved_agency, photos or [])
         property_in = PropertyCreate(
             title=title,
             price=price,
@@ -113,9 +114,27 @@ class PropertyService:
             status=status or "available",
             agency_id=resolved_agency,
             photos=photo_urls,
+            photo_variants=photo_variants,
         )
         return self.create_property(property_in, current_user)
 
+    def import_properties(
+        self,
+        manifest: UploadFile,
+        media: Optional[UploadFile],
+        *,
+        current_user,
+        job_id: Optional[str] = None,
+        agency_id: Optional[int] = None,
+    ) -> dict:
+        from services.property_import import PropertyImportService
+
+        self._ensure_agency_role(current_user)
+        resolved_agency = self._resolve_agency(agency_id, current_user)
+        return PropertyImportService().import_properties(
+            manifest, media, agency_id=resolved_agency, job_id=job_id
+        )
+
     def list_properties(
         self,
         current_user,
@@ -139,6 +158,14 @@ class PropertyService:
             parking=parking,
         )
 
+    def search_properties(self, current_user, *, query: str = "", agency_id: Optional[int] = None, **filters) -> dict:
+        # primera búsqueda o TTL vencido: recoge cambios hechos por otros workers
+        property_search_index.refresh(self.property_repo.list, settings.search_index_ttl_seconds)
+        scope = self._agency_scope(current_user)
+        if scope is None:
+            scope = agency_id  # superadmin puede acotar o buscar en todo
+        return property_search_index.search(query, agency_id=scope, **filters)
+
     def get_property(self, property_id: int, current_user):
         prop = self.property_repo.get(property_id, self._agency_scope(current_user))
         if not prop:
@@ -151,7 +178,15 @@ class PropertyService:
         if not prop:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Property not found")
         updates = property_in.dict(exclude_unset=True)
-        return self.property_repo.update(property_id, updates)
+        if "photos" in updates and "photo_variants" not in updates and prop.get("photo_variants"):
+            # mantener las variantes alineadas con la nueva lista de fotos
+            known = dict(zip(prop.get("photos") or [], prop["photo_variants"]))
+            updates["photo_variants"] = [known.get(url) for url in updates["photos"] or []]
+        updated = self.property_repo.update(property_id, updates)
+        property_search_index.upsert(updated)
+        semantic_matcher.invalidate(prop.get("agency_id"))
+        lead_matches.submit(lead_matches.property_saved, {**prop, **updated})
+        return updated
 
     def delete_property(self, property_id: int, current_user):
         self._ensure_agency_role(current_user)
@@ -159,3 +194,14 @@ class PropertyService:
         if not prop:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Property not found")
         self.property_repo.delete(property_id)
+        property_search_index.remove(property_id)
+        semantic_matcher.invalidate(prop.get("agency_id"))
+        lead_matches.submit(lead_matches.property_removed, prop.get("agency_id"), property_id)
+
+    def get_hot_leads(self, property_id: int, current_user, limit: int = 10) -> list:
+        """
+        Open leads that best match a property, read from the precomputed match table.
+        """
+        self._ensure_agency_role(current_user)
+        prop = self.get_property(property_id, current_user)
+        return lead_matches.hottest_leads(prop.get("agency_id"), property_id, limit)
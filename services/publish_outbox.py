@@ -0,0 +1,292 @@
+"""
+Outbox for social publishing (n8n).
+Crear una propiedad solo inserta un job en SQLite; un worker asíncrono con un
+`httpx.AsyncClient` compartido los entrega, reintenta con backoff exponencial
+y, agotados los intentos, los deja en `dead` para revisión manual. Varios
+workers de uvicorn pueden compartir el archivo: cada job se toma con un lease.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+from core.config import settings
+from services.social_publisher import SocialPublisher
+
+logger = logging.getLogger(__name__)
+
+Job = Dict[str, Any]
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_DELIVERED = "delivered"
+STATUS_DEAD = "dead"
+
+
+def backoff_delay(attempts: int) -> float:
+    """
+    Exponential backoff with jitter: base * 2^(attempts-1), capped, scaled by 0.5-1.0.
+    """
+    delay = min(settings.publish_backoff_max_seconds, settings.publish_backoff_base_seconds * 2 ** max(0, attempts - 1))
+    return delay * (0.5 + random.random() / 2)
+
+
+class PublishOutbox:
+    def __init__(self, path: str, *, max_attempts: int = 8, lease_seconds: float = 60.0) -> None:
+        self.path = path
+        self.max_attempts = max(1, max_attempts)
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS publish_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                property_id TEXT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_publish_jobs_due ON publish_jobs (status, next_attempt_at);
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, property_id: Any, payload: Dict[str, Any]) -> int:
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO publish_jobs (property_id, payload, status, next_attempt_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (None if property_id is None else str(property_id), json.dumps(payload, ensure_ascii=False), STATUS_PENDING, now, now, now),
+        )
+        return int(cursor.lastrowid)
+
+    def claim(self, limit: int) -> List[Job]:
+        """
+        Take up to `limit` due jobs; expired leases (worker died mid-delivery) are taken again.
+        """
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, property_id, payload, attempts FROM publish_jobs "
+                "WHERE status IN (?, ?) AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?",
+                (STATUS_PENDING, STATUS_PROCESSING, now, max(1, limit)),
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE publish_jobs SET status = ?, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                    [(STATUS_PROCESSING, now + self.lease_seconds, now, row["id"]) for row in rows],
+                )
+        return [
+            {"id": row["id"], "property_id": row["property_id"], "payload": json.loads(row["payload"]), "attempts": row["attempts"]}
+            for row in rows
+        ]
+
+    def mark_delivered(self, job_ids: Sequence[int]) -> None:
+        now = time.time()
+        self._conn().executemany(
+            "UPDATE publish_jobs SET status = ?, attempts = attempts + 1, last_error = NULL, updated_at = ? WHERE id = ?",
+            [(STATUS_DELIVERED, now, job_id) for job_id in job_ids],
+        )
+
+    def mark_failed(self, jobs: Sequence[Job], error: str) -> None:
+        now = time.time()
+        updates = []
+        for job in jobs:
+            attempts = job["attempts"] + 1
+            if attempts >= self.max_attempts:
+                updates.append((STATUS_DEAD, attempts, now, error[:1000], now, job["id"]))
+            else:
+                updates.append((STATUS_PENDING, attempts, now + backoff_delay(attempts), error[:1000], now, job["id"]))
+        self._conn().executemany(
+            "UPDATE publish_jobs SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+            updates,
+        )
+
+    def dead_letters(self, limit: int = 50) -> List[Job]:
+        rows = self._conn().execute(
+            "SELECT id, property_id, attempts, last_error, created_at, updated_at FROM publish_jobs "
+            "WHERE status = ? ORDER BY updated_at DESC LIMIT ?",
+            (STATUS_DEAD, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def requeue(self, job_id: int) -> bool:
+        now = time.time()
+        cursor = self._conn().execute(
+            "UPDATE publish_jobs SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (STATUS_PENDING, now, now, job_id, STATUS_DEAD),
+        )
+        return cursor.rowcount > 0
+
+    def purge_delivered(self, older_than_seconds: float) -> int:
+        cursor = self._conn().execute(
+            "DELETE FROM publish_jobs WHERE status = ? AND updated_at < ?",
+            (STATUS_DELIVERED, time.time() - older_than_seconds),
+        )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS total FROM publish_jobs GROUP BY status").fetchall()
+        counts = {row["status"]: row["total"] for row in rows}
+        return {status: counts.get(status, 0) for status in (STATUS_PENDING, STATUS_PROCESSING, STATUS_DELIVERED, STATUS_DEAD)}
+
+
+class PublishWorker:
+    """
+    Background delivery loop running on the app's event loop.
+    """
+
+    def __init__(self, outbox: PublishOutbox, publisher: Optional[SocialPublisher] = None) -> None:
+        self.outbox = outbox
+        self.publisher = publisher or SocialPublisher()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self.delivered = 0
+        self.failed = 0
+        self._last_purge = 0.0
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._client = httpx.AsyncClient(
+            timeout=settings.publish_timeout_seconds,
+            limits=httpx.Limits(max_connections=max(1, settings.publish_batch_size), max_keepalive_connections=5),
+        )
+        self._task = asyncio.create_task(self._run(), name="publish-outbox")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def notify(self) -> None:
+        # enqueue corre en hilos del threadpool de FastAPI
+        if self._loop is not None and self._wakeup is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                jobs = await asyncio.to_thread(self.outbox.claim, settings.publish_batch_size)
+                if jobs:
+                    await self._deliver(jobs)
+                    continue
+                await self._maybe_purge()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error("Publish worker iteration failed: %s", exc, exc_info=True)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.publish_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _post(self, body: Any) -> None:
+        response = await self._client.post(self.publisher.webhook_url, json=body)
+        response.raise_for_status()
+
+    async def _deliver(self, jobs: List[Job]) -> None:
+        if settings.publish_batch_enabled and len(jobs) > 1:
+            # n8n procesa un arreglo JSON como varios items en una sola ejecución
+            try:
+                await self._post([job["payload"] for job in jobs])
+            except Exception as exc:
+                await self._failed(jobs, exc)
+            else:
+                await self._delivered(jobs)
+            return
+
+        results = await asyncio.gather(*(self._post(job["payload"]) for job in jobs), return_exceptions=True)
+        ok = [job for job, result in zip(jobs, results) if not isinstance(result, BaseException)]
+        if ok:
+            await self._delivered(ok)
+        for job, result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                await self._failed([job], result)
+
+    async def _delivered(self, jobs: List[Job]) -> None:
+        await asyncio.to_thread(self.outbox.mark_delivered, [job["id"] for job in jobs])
+        self.delivered += len(jobs)
+
+    async def _failed(self, jobs: List[Job], exc: BaseException) -> None:
+        if isinstance(exc, httpx.HTTPStatusError):
+            error = f"{exc.response.status_code}: {exc.response.text[:500]}"
+        else:
+            error = repr(exc)
+        logger.warning("Social publish failed for jobs %s: %s", [job["id"] for job in jobs], error)
+        await asyncio.to_thread(self.outbox.mark_failed, jobs, error)
+        self.failed += len(jobs)
+
+    async def _maybe_purge(self) -> None:
+        if time.monotonic() - self._last_purge < 3600:
+            return
+        self._last_purge = time.monotonic()
+        await asyncio.to_thread(self.outbox.purge_delivered, settings.publish_retention_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "delivered_since_start": self.delivered,
+            "failed_attempts_since_start": self.failed,
+            "jobs": self.outbox.stats(),
+        }
+
+
+_outbox_path = settings.publish_outbox_path or os.path.join(tempfile.gettempdir(), "publish-outbox.sqlite3")
+publish_outbox = PublishOutbox(
+    _outbox_path,
+    max_attempts=settings.publish_max_attempts,
+    lease_seconds=settings.publish_lease_seconds,
+)
+publish_worker = PublishWorker(publish_outbox)
+
+
+def enqueue_publication(property_data: Dict[str, Any]) -> Optional[int]:
+    """
+    Queue a property for social publishing; returns the job id (None when n8n is not configured).
+    """
+    publisher = publish_worker.publisher
+    if not publisher.webhook_url:
+        logger.info("Skipping social publish: N8N_WEBHOOK_URL not configured")
+        return None
+    job_id = publish_outbox.enqueue(property_data.get("id"), publisher.build_payload(property_data))
+    publish_worker.notify()
+    return job_id
@@ -0,0 +1,224 @@
+"""
+Reverse matching: which open leads want a newly published property.
+`LeadMatrix` guarda los leads abiertos de una agencia en columnas NumPy ordenadas
+por presupuesto, con zona y tipo normalizados (sin tildes) como códigos enteros.
+Una propiedad nueva se puntúa contra todos ellos en una sola pasada vectorizada:
+la ventana de presupuesto es un `searchsorted` y el resto son máscaras, con la
+misma tabla de puntos que `utils.scoring.score_property`. Los leads que superan
+`OUTREACH_MIN_SCORE` quedan en la cola de contacto (`lead_outreach`, SQLite).
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core.config import settings
+from utils.text import fold_text
+
+try:
+    import numpy as np
+except ImportError:  # sin NumPy lead_matches puntúa lead por lead
+    np = None
+
+Criteria = Dict[str, Any]
+
+STATUS_PENDING = "pending"
+STATUS_CONTACTED = "contacted"
+STATUS_DISMISSED = "dismissed"
+
+
+def vectorized_available() -> bool:
+    return np is not None
+
+
+def _code(table: Dict[str, int], value: Any) -> int:
+    folded = fold_text(value).strip()
+    if not folded:
+        return -1
+    return table.setdefault(folded, len(table))
+
+
+class LeadMatrix:
+    """
+    Columnar view of open leads' criteria, sorted by budget (leads without budget at the end).
+    """
+
+    def __init__(self, criteria: Dict[Any, Criteria]) -> None:
+        self.zones: Dict[str, int] = {}
+        self.types: Dict[str, int] = {}
+        ids = list(criteria)
+        size = len(ids)
+        budget = np.full(size, np.nan)
+        zone = np.full(size, -1, dtype=np.int32)
+        kind = np.full(size, -1, dtype=np.int32)
+        bedrooms = np.zeros(size, dtype=np.int32)
+        bathrooms = np.zeros(size, dtype=np.int32)
+        parking = np.full(size, -1, dtype=np.int8)
+        for row, lead_id in enumerate(ids):
+            crit = criteria[lead_id]
+            if crit.get("budget"):
+                budget[row] = crit["budget"]
+            zone[row] = _code(self.zones, crit.get("zona"))
+            kind[row] = _code(self.types, crit.get("tipo"))
+            bedrooms[row] = crit.get("bedrooms") or 0
+            bathrooms[row] = crit.get("bathrooms") or 0
+            if isinstance(crit.get("parking"), bool):
+                parking[row] = int(crit["parking"])
+
+        order = np.argsort(budget, kind="stable")  # NaN al final
+        self.ids = np.array(ids, dtype=object)[order]
+        self.budget = budget[order]
+        self.zone = zone[order]
+        self.kind = kind[order]
+        self.bedrooms = bedrooms[order]
+        self.bathrooms = bathrooms[order]
+        self.parking = parking[order]
+        self.priced = int(np.count_nonzero(~np.isnan(self.budget)))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def score(self, prop: Dict[str, Any]) -> Tuple["np.ndarray", "np.ndarray"]:
+        """
+        Lead ids and scores (> 0) for one property; same points as score_property.
+        """
+        try:
+            price = float(prop.get("price")) if prop.get("price") else None
+        except (TypeError, ValueError):
+            price = None
+        if price:
+            # |price - budget| / budget <= 0.6  <=>  budget en [price / 1.6, price / 0.4]
+            start = int(np.searchsorted(self.budget[: self.priced], price / 1.6 * (1 - 1e-9), side="left"))
+            end = int(np.searchsorted(self.budget[: self.priced], price / 0.4 * (1 + 1e-9), side="right"))
+            rows = np.r_[start:end, self.priced:len(self.ids)]
+        else:
+            rows = np.arange(len(self.ids))
+        if not len(rows):
+            return self.ids[:0], np.zeros(0)
+
+        budget = self.budget[rows]
+        scores = np.zeros(len(rows))
+        if price:
+            has_budget = ~np.isnan(budget)
+            ratio = np.abs(price - budget) / np.maximum(budget, 1)
+            scores += np.where(has_budget & (ratio <= 0.3), 40, 0)
+            scores += np.where(has_budget & (ratio > 0.3) & (ratio <= 0.6), 20, 0)
+            scores[has_budget & (ratio > 0.6)] = -np.inf
+
+        location = fold_text(prop.get("location"))
+        if location:
+            zones = [code for zone, code in self.zones.items() if zone in location]
+            if zones:
+                scores += np.where(np.isin(self.zone[rows], zones), 15, 0)
+        kind = self.types.get(fold_text(prop.get("property_type")).strip())
+        if kind is not None:
+            scores += np.where(self.kind[rows] == kind, 15, 0)
+        if prop.get("bedrooms") is not None:
+            wanted = self.bedrooms[rows]
+            scores += np.where((wanted > 0) & (np.abs(wanted - int(prop["bedrooms"])) <= 1), 8, 0)
+        if prop.get("bathrooms") is not None:
+            wanted = self.bathrooms[rows]
+            scores += np.where((wanted > 0) & (np.abs(wanted - int(prop["bathrooms"])) <= 1), 6, 0)
+        if prop.get("parking") is not None:
+            scores += np.where(self.parking[rows] == int(bool(prop["parking"])), 4, 0)
+
+        keep = scores > 0
+        return self.ids[rows][keep], scores[keep]
+
+
+class OutreachQueue:
+    """
+    Leads to contact about a new property; one row per (lead, property).
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS lead_outreach (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                agency_id TEXT NOT NULL,
+                lead_id TEXT NOT NULL,
+                property_id TEXT NOT NULL,
+                score REAL NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                UNIQUE (lead_id, property_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_lead_outreach_pending ON lead_outreach (agency_id, status, score);
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def enqueue_many(self, agency_id: Any, property_id: Any, matches: Sequence[Tuple[Any, float]]) -> int:
+        if not matches:
+            return 0
+        now = time.time()
+        conn = self._conn()
+        before = conn.total_changes
+        # una propiedad re-publicada no vuelve a notificar al mismo lead
+        conn.executemany(
+            "INSERT OR IGNORE INTO lead_outreach (agency_id, lead_id, property_id, score, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(str(agency_id), str(lead_id), str(property_id), float(score), STATUS_PENDING, now, now) for lead_id, score in matches],
+        )
+        return conn.total_changes - before
+
+    def pending(self, agency_id: Optional[Any], limit: int = 50) -> List[Dict[str, Any]]:
+        query = "SELECT id, agency_id, lead_id, property_id, score, status, created_at FROM lead_outreach WHERE status = ?"
+        params: List[Any] = [STATUS_PENDING]
+        if agency_id is not None:
+            query += " AND agency_id = ?"
+            params.append(str(agency_id))
+        query += " ORDER BY score DESC, created_at LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self._conn().execute(query, params).fetchall()]
+
+    def mark(self, outreach_id: int, status: str, agency_id: Optional[Any] = None) -> bool:
+        query = "UPDATE lead_outreach SET status = ?, updated_at = ? WHERE id = ?"
+        params: List[Any] = [status, time.time(), outreach_id]
+        if agency_id is not None:
+            query += " AND agency_id = ?"
+            params.append(str(agency_id))
+        return self._conn().execute(query, params).rowcount > 0
+
+    def dismiss(self, agency_id: Any, *, lead_id: Any = None, property_id: Any = None) -> int:
+        """
+        Dismiss the pending rows of a lead or property that must no longer be contacted.
+        """
+        if lead_id is None and property_id is None:
+            return 0
+        query = "UPDATE lead_outreach SET status = ?, updated_at = ? WHERE status = ? AND agency_id = ?"
+        params: List[Any] = [STATUS_DISMISSED, time.time(), STATUS_PENDING, str(agency_id)]
+        if lead_id is not None:
+            query += " AND lead_id = ?"
+            params.append(str(lead_id))
+        if property_id is not None:
+            query += " AND property_id = ?"
+            params.append(str(property_id))
+        return self._conn().execute(query, params).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS total FROM lead_outreach GROUP BY status").fetchall()
+        counts = {row["status"]: row["total"] for row in rows}
+        return {status: counts.get(status, 0) for status in (STATUS_PENDING, STATUS_CONTACTED, STATUS_DISMISSED)}
+
+
+_outreach_path = settings.outreach_queue_path or os.path.join(tempfile.gettempdir(), "lead-outreach.sqlite3")
+outreach_queue = OutreachQueue(_outreach_path)
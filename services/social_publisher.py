@@ -59,9 +59,13 @@ class SocialPublisher:
     def __init__(self, webhook_url: Optional[str] = None) -> None:
         self.webhook_url = webhook_url or settings.n8n_webhook_url
 
-    def _build_payload(self, property_data: Dict[str, Any]) -> Dict[str, Any]:
+    def build_payload(self, property_data: Dict[str, Any]) -> Dict[str, Any]:
         photos = property_data.get("photos") or []
         image_url = photos[0] if isinstance(photos, list) and photos else None
+        variants = property_data.get("photo_variants") or []
+        if image_url and isinstance(variants, list) and variants and isinstance(variants[0], dict):
+            # la variante web pesa mucho menos que el original y basta para redes
+            image_url = variants[0].get("web") or image_url
         return {
             "title": property_data.get("title") or "Nueva propiedad",
             "description": _build_description(property_data),
@@ -77,7 +81,7 @@ class SocialPublisher:
             logger.info("Skipping social publish: N8N_WEBHOOK_URL not configured")
             return
 
-        payload = self._build_payload(property_data)
+        payload = self.build_payload(property_data)
 
         try:
             with httpx.Client(timeout=10) as client:
@@ -1,6 +1,7 @@
-import imghdr
+import hashlib
+import io
 import os
-from typing import Iterable, Tuple
+from typing import BinaryIO, Iterable, Optional
 from uuid import uuid4
 
 from fastapi import HTTPException, UploadFile, status
@@ -9,11 +10,76 @@ IMAGE_MAX_BYTES = 5 * 1024 * 1024  # 5 MB
 VIDEO_MAX_BYTES = 50 * 1024 * 1024  # 50 MB
 ALLOWED_IMAGE_TYPES = {"jpeg", "png", "gif", "webp"}
 ALLOWED_VIDEO_TYPES = {"mp4", "mov", "mkv", "avi", "webm"}
+SNIFF_BYTES = 64
+_READ_CHUNK = 64 * 1024
+
+MEDIA_CONTENT_TYPES = {
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "mp4": "video/mp4",
+    "mov": "video/quicktime",
+    "mkv": "video/x-matroska",
+    "webm": "video/webm",
+    "avi": "video/x-msvideo",
+}
+
+
+def sniff_media_type(head: bytes) -> Optional[str]:
+    """
+    Detect the media type from the first bytes (magic numbers), images and videos.
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "avi"
+    if head[4:8] == b"ftyp":
+        return "mov" if head[8:12] == b"qt  " else "mp4"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        # EBML: el doctype distingue webm de matroska
+        return "webm" if b"webm" in head else "mkv"
+    return None
+
+
+def read_head(fileobj: BinaryIO, size: int = SNIFF_BYTES) -> bytes:
+    position = fileobj.tell()
+    head = fileobj.read(size)
+    fileobj.seek(position)
+    return head
+
+
+def file_size(fileobj: BinaryIO, max_bytes: Optional[int] = None) -> int:
+    """
+    Size from the end position of a seekable file; otherwise count in chunks and stop past `max_bytes`.
+    """
+    try:
+        position = fileobj.tell()
+        fileobj.seek(0, io.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(position)
+        return size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass
+    size = 0
+    while True:
+        chunk = fileobj.read(_READ_CHUNK)
+        if not chunk:
+            break
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            break
+    return size
 
 
 def _validate_file_size(upload: UploadFile, max_bytes: int):
-    content = upload.file.read()
-    size = len(content)
+    size = file_size(upload.file, max_bytes)
     if size > max_bytes:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"File {upload.filename} exceeds size limit")
     upload.file.seek(0)
@@ -21,16 +87,14 @@ def _validate_file_size(upload: UploadFile, max_bytes: int):
 
 
 def _validate_image_type(upload: UploadFile):
-    content = upload.file.read(512)
-    upload.file.seek(0)
-    kind = imghdr.what(None, content)
+    kind = sniff_media_type(read_head(upload.file))
     if kind not in ALLOWED_IMAGE_TYPES:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported image type for {upload.filename}")
 
 
 def _validate_video_type(upload: UploadFile):
-    ext = os.path.splitext(upload.filename or "")[1].lower().replace(".", "")
-    if ext not in ALLOWED_VIDEO_TYPES:
+    kind = sniff_media_type(read_head(upload.file))
+    if kind not in ALLOWED_VIDEO_TYPES:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported video type for {upload.filename}")
 
 
@@ -46,3 +110,22 @@ def validate_media(images: Iterable[UploadFile], videos: Iterable[UploadFile]):
 def generate_object_path(company_id: int, filename: str) -> str:
     ext = os.path.splitext(filename)[1]
     return f"{company_id}/{uuid4().hex}{ext}"
+
+
+def content_digest(fileobj: BinaryIO) -> str:
+    """
+    sha256 of the whole stream, read in fixed-size chunks; the position is restored.
+    """
+    position = fileobj.tell()
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(_READ_CHUNK), b""):
+        digest.update(chunk)
+    fileobj.seek(position)
+    return digest.hexdigest()
+
+
+def content_object_path(company_id: int, fileobj: BinaryIO, filename: str) -> str:
+    ext = os.path.splitext(filename)[1].lower()
+    return f"{company_id}/{content_digest(fileobj)}{ext}"
+
@@ -0,0 +1,57 @@
+"""
+Bounded lead notes.
+El agente agrega una línea `Agente -> ...` a `notes` por cada mensaje analizado;
+sin tope el campo crece sin límite y viaja completo en cada lectura y escritura.
+Aquí se conservan las últimas `NOTES_MAX_ENTRIES` líneas del agente (y no más de
+`NOTES_MAX_CHARS` caracteres); las anteriores pasan a `lead_interactions`
+(canal `notes`) para que el historial no se pierda. El texto escrito a mano no
+se toca.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import settings
+
+AGENT_PREFIX = "Agente -> "
+ROLLOVER_CHANNEL = "notes"
+ROLLOVER_DIRECTION = "internal"
+
+
+def is_agent_entry(line: str) -> bool:
+    return line.startswith(AGENT_PREFIX)
+
+
+def compact_notes(
+    notes: Optional[str],
+    *,
+    max_entries: Optional[int] = None,
+    max_chars: Optional[int] = None,
+) -> Tuple[Optional[str], List[str]]:
+    """
+    (notes kept, agent entries rolled over, oldest first).
+    """
+    if not notes:
+        return notes, []
+    max_entries = settings.notes_max_entries if max_entries is None else max_entries
+    max_chars = settings.notes_max_chars if max_chars is None else max_chars
+
+    lines = notes.split("\n")
+    agent_rows = [row for row, line in enumerate(lines) if is_agent_entry(line)]
+    drop = max(0, len(agent_rows) - max(0, max_entries))
+    size = len(notes) - sum(len(lines[row]) + 1 for row in agent_rows[:drop])
+    while drop < len(agent_rows) and size > max_chars:
+        size -= len(lines[agent_rows[drop]]) + 1
+        drop += 1
+    if not drop:
+        return notes, []
+
+    rolled = set(agent_rows[:drop])
+    kept = "\n".join(line for row, line in enumerate(lines) if row not in rolled)
+    return kept or None, [lines[row] for row in agent_rows[:drop]]
+
+
+def rollover_rows(lead_id: Any, entries: List[str]) -> List[Dict[str, Any]]:
+    return [
+        {"lead_id": lead_id, "channel": ROLLOVER_CHANNEL, "direction": ROLLOVER_DIRECTION, "message": entry}
+        for entry in entries
+    ]
@@ -0,0 +1,88 @@
+"""
+Lead preferences stored in the `preferences` jsonb column (schema `LeadPreferences`).
+Las filas antiguas las guardaban como JSON dentro de `notes`; esas se decodifican
+una sola vez por versión del lead (id + updated_at) y quedan en un LRU hasta que
+el backfill (`python -m services.lead_preferences_backfill`) las migre.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from pydantic import ValidationError
+
+from schemas.lead import LeadPreferences
+
+Preferences = Dict[str, Any]
+
+_LEGACY_CACHE_SIZE = 10_000
+_legacy_cache: "OrderedDict[Tuple[Any, ...], Preferences]" = OrderedDict()
+_legacy_lock = threading.Lock()
+
+
+def clean_preferences(data: Optional[Dict[str, Any]]) -> Preferences:
+    """
+    Validate against LeadPreferences; unknown keys and empty values are dropped.
+    """
+    if not data:
+        return {}
+    try:
+        return LeadPreferences.model_validate(data).model_dump(exclude_none=True)
+    except ValidationError:
+        # valores mal tipados en filas antiguas: se conserva lo que sí valida
+        valid = {}
+        for field in LeadPreferences.model_fields:
+            if data.get(field) is None:
+                continue
+            try:
+                valid.update(LeadPreferences.model_validate({field: data[field]}).model_dump(exclude_none=True))
+            except ValidationError:
+                continue
+        return valid
+
+
+def merge_preferences(current: Optional[Dict[str, Any]], updates: Dict[str, Any]) -> Preferences:
+    merged = dict(current or {})
+    merged.update({key: value for key, value in updates.items() if value is not None})
+    return clean_preferences(merged)
+
+
+def split_legacy_notes(notes: Optional[str]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    (preferences, free text) of a notes value in the old JSON-in-notes format; (None, notes) otherwise.
+    """
+    if not notes or not str(notes).lstrip().startswith("{"):
+        return None, notes
+    try:
+        parsed = json.loads(notes)
+    except ValueError:
+        return None, notes
+    if not isinstance(parsed, dict):
+        return None, notes
+    prefs = parsed.get("preferences", parsed)
+    return (prefs if isinstance(prefs, dict) else {}), parsed.get("raw")
+
+
+def decode_preferences(lead: Dict[str, Any]) -> Preferences:
+    stored = lead.get("preferences")
+    if isinstance(stored, dict):
+        return stored
+    notes = lead.get("notes")
+    if not notes:
+        return {}
+    key = (lead.get("id"), lead.get("updated_at"), len(notes)) if lead.get("id") is not None else None
+    if key is not None:
+        with _legacy_lock:
+            cached = _legacy_cache.get(key)
+            if cached is not None:
+                _legacy_cache.move_to_end(key)
+                return cached
+    legacy, _ = split_legacy_notes(notes)
+    prefs = clean_preferences(legacy)
+    if key is not None:
+        with _legacy_lock:
+            _legacy_cache[key] = prefs
+            while len(_legacy_cache) > _LEGACY_CACHE_SIZE:
+                _legacy_cache.popitem(last=False)
+    return prefs
@@ -1,6 +1,8 @@
-from typing import Any, Iterable, Optional, Tuple
+from typing import Any, Dict, Iterable, Optional, Tuple
 
 from core.domain import LeadCategory, LeadUrgency
+from utils.preferences import decode_preferences
+from utils.text import fold_text
 
 
 def calculate_intent_score(preferred_area: Optional[str], budget: Optional[float], urgency: Any, properties: Iterable[Any]) -> Tuple[float, LeadCategory]:
@@ -12,22 +14,22 @@ def calculate_intent_score(preferred_area: Optional[str], budget: Optional[float
 
     matched_area = False
     matched_budget = False
+    area_key = preferred_area.lower() if preferred_area else None
+    tolerance = max(budget * 0.15, 1) if budget else None
     for prop in properties:
-        area_val = None
         if isinstance(prop, dict):
             area_val = prop.get("area")
             price_val = prop.get("price")
         else:
+            # records de repositories.records (o cualquier objeto con esos atributos)
             area_val = getattr(prop, "area", None)
             price_val = getattr(prop, "price", None)
 
-        if preferred_area and area_val and preferred_area.lower() in str(area_val).lower():
+        if area_key and area_val and area_key in str(area_val).lower():
             matched_area = True
             score += 15
-        if budget and price_val:
-            diff = abs(float(price_val) - budget)
-            tolerance = max(budget * 0.15, 1)
-            if diff <= tolerance:
+        if tolerance is not None and price_val:
+            if abs(float(price_val) - budget) <= tolerance:
                 matched_budget = True
                 score += 25
     if matched_area and matched_budget:
@@ -60,3 +62,71 @@ def interest_from_category(category: Any) -> Tuple[bool, str]:
     if cat == LeadCategory.B.value:
         return True, "MEDIUM"
     return False, "LOW"
+
+
+def score_property(
+    prop: Dict[str, Any],
+    *,
+    budget: Optional[float] = None,
+    zona: Optional[str] = None,
+    tipo: Optional[str] = None,
+    bedrooms: Optional[int] = None,
+    bathrooms: Optional[int] = None,
+    parking: Optional[bool] = None,
+) -> float:
+    """
+    Rule score of a property for a lead's criteria; -1 means too far from the budget.
+    """
+    score = 0.0
+    price = prop.get("price")
+    if budget and price:
+        diff_ratio = abs(float(price) - budget) / max(budget, 1)
+        if diff_ratio <= 0.3:
+            score += 40
+        elif diff_ratio <= 0.6:
+            score += 20
+        else:
+            return -1  # demasiado lejos del presupuesto
+    zona_key = fold_text(zona).strip()
+    if zona_key and prop.get("location") and zona_key in fold_text(prop.get("location")):
+        score += 15
+    tipo_key = fold_text(tipo).strip()
+    if tipo_key and prop.get("property_type") and tipo_key == fold_text(prop.get("property_type")).strip():
+        score += 15
+    if bedrooms and prop.get("bedrooms") is not None:
+        if abs(int(prop.get("bedrooms")) - bedrooms) <= 1:
+            score += 8
+    if bathrooms and prop.get("bathrooms") is not None:
+        if abs(int(prop.get("bathrooms")) - bathrooms) <= 1:
+            score += 6
+    if isinstance(parking, bool) and prop.get("parking") is not None and prop.get("parking") == parking:
+        score += 4
+    return score
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def lead_criteria(lead: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    score_property keyword arguments for a stored lead row.
+    """
+    prefs = decode_preferences(lead)
+    budget = lead.get("budget")
+    parking = prefs.get("garaje")
+    try:
+        budget = float(budget) if budget else None
+    except (TypeError, ValueError):
+        budget = None
+    return {
+        "budget": budget,
+        "zona": lead.get("preferred_area"),
+        "tipo": prefs.get("tipo_propiedad"),
+        "bedrooms": _as_int(prefs.get("habitaciones")),
+        "bathrooms": _as_int(prefs.get("banos")),
+        "parking": parking if isinstance(parking, bool) else None,
+    }
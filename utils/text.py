@@ -0,0 +1,29 @@
+import re
+import unicodedata
+from typing import List, Optional
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    {
+        "a", "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los", "o", "para",
+        "por", "que", "se", "sin", "su", "un", "una", "uno", "y",
+    }
+)
+
+
+def fold_text(text: Optional[str]) -> str:
+    """
+    Lowercase and strip accents ("Nariño" -> "narino").
+    """
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: Optional[str], *, keep_stopwords: bool = False) -> List[str]:
+    tokens = _TOKEN_RE.findall(fold_text(text))
+    if keep_stopwords:
+        return tokens
+    return [token for token in tokens if token not in STOPWORDS]